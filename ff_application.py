@@ -1,38 +1,164 @@
-from flask import Flask, render_template, request
-from ff_datamgmt import player_data_blend as get_data, TEAM_NAMES
+# Run the development server with:  python ff_application.py
+# Under a WSGI server, load the data once before the workers fork so they share it, for example:
+#   gunicorn --preload --workers 4 --threads 8 'ff_application:create_app()'
+import base64
+import functools
+import gc
+import json
+import time
+from urllib.parse import urlencode
+import numpy as np
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, render_template, request
+import ff_datamgmt as dm
+from ff_datamgmt import load_player_data as get_data, TEAM_NAMES
+from ff_dataset import DatasetRefresher, REFRESH_INTERVAL
+import ff_history as history_store
+import ff_lineup as lineup_optimizer
+import ff_metrics as metrics
 import ff_objects as obj
+import ff_query as query_engine
+import ff_simulate as simulator
 
-app = Flask(__name__)
+views = Blueprint('players', __name__)
 
 headings = ("Name", "Position", "Team", "Last Year's Points", "Projected Points",
             "Projected Points Deviation", "Games Played Last Year", "Player Contract",
             "Percent Guaranteed")
+# the PlayerNode attribute shown in each heading's column, also the names the api sorts and filters by
+heading_columns = dict(zip(headings, obj.PlayerSortIndex.columns))
+MAX_PAGE_SIZE = 500
+MAX_SIMULATIONS = 200000
+MAX_LINEUPS = 20
+MAX_LOOKUPS = 1000
+MAX_SLOTS = 5
+MAX_ROLLING_WEEKS = 18
+# query parameter of each position's slot count in /api/lineup
+SLOT_ARGS = {'QB': 'qb', 'RB': 'rb', 'WR': 'wr', 'TE': 'te', 'K': 'k', 'D/ST': 'dst'}
+
+request_seconds = metrics.histogram('ff_http_request_seconds', 'Time to handle each request',
+                                    ('route', 'method', 'status'))
+render_seconds = metrics.histogram('ff_template_render_seconds', 'Time to render each template', ('template',))
+searches = metrics.counter('ff_searches_total', 'Player searches by how the player was found', ('result',))
+dataset_players = metrics.gauge('ff_dataset_players', 'Players in the dataset being served')
+dataset_age = metrics.gauge('ff_dataset_age_seconds', 'Seconds since the dataset being served was built')
+dataset_refreshes = metrics.gauge('ff_dataset_refreshes', 'Datasets built and swapped in by this process')
+dataset_refresh_failures = metrics.gauge('ff_dataset_refresh_failures', 'Background refreshes that failed')
+
+
+class BadRequest(ValueError):
+    """raised when the query string of an api request can't be understood"""
+
+
+def create_app(load=get_data, refresh_interval=REFRESH_INTERVAL):
+    """
+    creates the flask application and loads the player data into it. The data is loaded right away, so a
+    server that imports the application before forking its workers, like gunicorn --preload, loads it once
+    and every worker shares those pages copy on write. The background refresh starts in each process on its
+    first request, so it runs in the workers and not in the process that forked them. With the default load
+    only one worker refreshes the sources and the others reload the snapshot it writes
+    Parameters
+    ----------
+    load: callable
+        returns the player data, ff_datamgmt.load_player_data by default
+    refresh_interval: float
+        seconds between background refreshes of the data
+
+    Returns
+    -------
+    the Flask application
+    """
+    app = Flask(__name__)
+    app.register_blueprint(views)
+    if metrics.registry.enabled or metrics.PROFILE_PATH:
+        app.before_request(start_request_timer)
+        app.after_request(record_request_time)
+    if load is get_data:
+        refresher = DatasetRefresher(load, refresh_interval, dm.read_player_snapshot, dm.PLAYER_SNAPSHOT_FILE)
+    else:
+        refresher = DatasetRefresher(load, refresh_interval)
+    refresher.refresh()
+    app.extensions['player_data'] = refresher
+    # keep the garbage collector from writing to the loaded objects' pages in every forked worker
+    gc.freeze()
+    return app
+
+
+def start_request_timer():
+    # started here rather than in create_app so forked workers each run their own profiler
+    metrics.start_profiler_from_environment()
+    g.request_start = time.perf_counter()
+
+
+def record_request_time(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_seconds.observe(time.perf_counter() - g.request_start, route=route, method=request.method,
+                            status=response.status_code)
+    return response
+
+
+def render_page(template, **context):
+    start = time.perf_counter()
+    page = render_template(template, **context)
+    render_seconds.observe(time.perf_counter() - start, template=template)
+    return page
+
+
+def current_data():
+    """
+    returns the PlayerDataset being served. The first call in a request picks the dataset and every later
+    call in the same request returns that one, so a refresh in the middle of it can't mix two versions of the
+    data
+    """
+    if 'player_data' not in g:
+        refresher = current_app.extensions['player_data']
+        refresher.ensure_started()
+        g.player_data = refresher.current
+    return g.player_data
+
+
+def cached(view):
+    """
+    caches what a view returns for the version of the data being served, keyed by path and query string. The
+    page is rendered and compressed on the first request, later requests get it from memory, or a 304 when
+    their If-None-Match has its ETag. Only successful responses are kept
+    """
+    @functools.wraps(view)
+    def cached_view(*args, **kwargs):
+        data = current_data()
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = data.responses.get(key)
+        if entry is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = data.responses.store(key, response.get_data(), response.mimetype)
+        return entry.respond(request)
+    return cached_view
 
 
 def fill_tree(tree, json):
     """
-    Takes a BST data structure and json payload and iterates through the json data,
-    converting it into PlayerNode objects and thenpopulates the BST in with the json data.
+    Takes an AVLTree data structure and json payload, converts the json data into PlayerNode
+    objects and then builds the tree out of them in one pass.
     Parameters
     ----------
-    tree: BST
-        empty binary tree data structure
+    tree: AVLTree
+        empty search tree data structure
     json: json
         json payload containing nfl fantasy football data
     Returns
     -------
-    tree: BST
-        binary tree data structure that is fill with PlayerNode objects based on their player_uuid
+    tree: AVLTree
+        search tree data structure that is fill with PlayerNode objects based on their player_uuid
     """
-    for player in json:
-        cur_elem = obj.PlayerNode(player_uuid=player, json=json[player])
-        tree.insert(cur_elem)
+    tree.build(list_players(json))
     return tree
 
 
 def list_players(json):
     """
-    takes in json data and converts it into a list of PlayerNode objects
+    takes in json data and converts it into a list of PlayerNode objects, computing the
+    player stats for every player at once through a PlayerTable
     Parameters
     ----------
     json: json
@@ -43,68 +169,436 @@ def list_players(json):
     player_list: list
         list of PlayerNode objects
     """
-    player_list = []
-    for player in json:
-        player_list.append(obj.PlayerNode(player_uuid=player, json=json[player]))
-    return player_list
+    return obj.PlayerTable.from_player_data(json).nodes()
 
 
-def get_risky_players(player_list):
+def get_risky_players(data, query=None):
     """
-    takes in a lit of PlayerNode objects and filters out PlayerNode objects where players
-     played more than 12 games or their projected standard deviation is less than 40
+    runs a risky player query through the query engine. By default a player is risky if they
+    played fewer than 12 games or their projected standard deviation is more than 40
     Parameters
     ----------
-    player_list: list
-        a list of PlayerNode objects
+    data: PlayerDataset
+        the players to query
+    query: RiskQuery
+        which players count as risky, defaults to the thresholds above
 
     Returns
     -------
     player_list: list
-        list of PlayerNode objects
+        list of PlayerNode objects, highest projected points first
+    """
+    rows = data.risky_engine.rows(query or query_engine.RiskQuery())
+    return [data.players[row] for row in rows]
+
+
+def parse_risky_query(args, use_positions=True):
+    try:
+        return query_engine.parse_query(args, use_positions)
+    except ValueError as error:
+        raise BadRequest(str(error))
+
+
+def parse_sort(sort):
+    """
+    reads a sort parameter like "-contract_value,name" into a sort spec for PlayerSortIndex
+    Parameters
+    ----------
+    sort: str
+        comma separated column names, each optionally starting with - to sort it in descending order
+
+    Returns
+    -------
+    tuple of (column, descending) pairs
+    """
+    spec = []
+    for column in filter(None, sort.split(',')):
+        descending = column.startswith('-')
+        column = column.lstrip('-')
+        if column not in obj.PlayerSortIndex.columns:
+            raise BadRequest(f'can not sort by {column}, choose from {", ".join(obj.PlayerSortIndex.columns)}')
+        spec.append((column, descending))
+    return tuple(spec)
+
+
+def parse_filters(args, data):
+    """
+    reads the pos, team and numeric range filters of an api request into a row mask
+    Parameters
+    ----------
+    args: dict
+        the query string, pos and team take comma separated values and every numeric column can be limited
+        with <column>_min and <column>_max, for example proj_ffp_min=200. risky=1 or any risky
+        query criteria, like games_lt=12, limit it to the risky players
+    data: PlayerDataset
+        the players the mask is for
+    Returns
+    -------
+    numpy array of booleans, True for every row that matches
+    """
+    ranges = {}
+    for column in obj.PlayerSortIndex.numeric_columns:
+        try:
+            low, high = (float(args[name]) if name in args else None for name in (f'{column}_min', f'{column}_max'))
+        except ValueError:
+            raise BadRequest(f'{column}_min and {column}_max must be numbers')
+        if low is not None or high is not None:
+            ranges[column] = (low, high)
+    pos = [value for value in args.get('pos', '').split(',') if value]
+    team = [value for value in args.get('team', '').split(',') if value]
+    mask = data.sort_index.mask(pos=pos, team=team, ranges=ranges)
+    if args.get('risky') in ('1', 'true') or query_engine.has_criteria(args):
+        # pos is already applied above, so the risky query only adds its criteria
+        mask = mask & data.risky_engine.mask(parse_risky_query(args, use_positions=False))
+    return mask
+
+
+def suggest_player(data, name, pos, team):
+    """
+    finds the player with the closest name on the same team and position, to forgive typos and suffixes in a
+    search that didn't match a player_uuid exactly. Returns the PlayerNode or None
     """
-    risky_list = []
-    for player in player_list:
-        if player.games_played < 12 or player.st_dev_proj > 40:
-            risky_list.append(player)
-    risky_list.sort(key=lambda x: x.proj_ffp, reverse=True)
-    return risky_list
+    suggestions = data.name_index.suggest(
+        name, 1, lambda player: player.pos.casefold() == pos and player.team.casefold() == team)
+    return suggestions[0][1] if suggestions else None
 
 
-@app.route('/')
+def parse_lookup(item):
+    """
+    reads one item of a /api/players/lookup request, a player_uuid, a [name, pos, team] list or an object with
+    either a player_uuid or name, pos and team
+    Parameters
+    ----------
+    item:
+        the item as decoded from the request's json
+
+    Returns
+    -------
+    (player_uuid, (name, pos, team) or None when the item was a player_uuid)
+    """
+    if isinstance(item, str):
+        return item.casefold(), None
+    if isinstance(item, dict):
+        if isinstance(item.get('player_uuid'), str):
+            return item['player_uuid'].casefold(), None
+        item = [item.get('name'), item.get('pos'), item.get('team')]
+    if isinstance(item, list) and len(item) == 3 and all(isinstance(part, str) for part in item):
+        name, pos, team = (part.casefold() for part in item)
+        return name + pos + team, (name, pos, team)
+    raise BadRequest('expected a player_uuid, a [name, pos, team] list or an object with either')
+
+
+def group_view(data, team=None, pos=None):
+    """
+    collects one team's, position's or team and position's totals, how they break down by position or team,
+    and its players, highest projected points first. Returns None if no player is in the group
+    """
+    totals = data.groups.totals(team, pos)
+    if totals is None:
+        return None
+    breakdown = []
+    if team and not pos:
+        breakdown = data.groups.groups('team_pos', team=team)
+    elif pos and not team:
+        breakdown = data.groups.groups('team_pos', pos=pos)
+    players = [data.players[row] for row in data.groups.rows(team, pos).tolist()]
+    return {'totals': totals, 'breakdown': breakdown, 'players': players}
+
+
+def parse_int(args, name, default, low, high):
+    value = args.get(name, str(default))
+    # isdigit alone also accepts digits like superscripts that int() rejects
+    if not (value.isascii() and value.isdigit()) or not low <= int(value) <= high:
+        raise BadRequest(f'{name} must be a whole number between {low} and {high}')
+    return int(value)
+
+
+def encode_cursor(after, sort):
+    cursor = json.dumps({'after': after, 'sort': sort}).encode('utf-8')
+    return base64.urlsafe_b64encode(cursor).decode('ascii')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        after = int(decoded['after'])
+    except (ValueError, KeyError, TypeError):
+        raise BadRequest('cursor is not valid')
+    if decoded.get('sort') != sort:
+        raise BadRequest('cursor was made for a different sort')
+    return after
+
+
+@views.app_errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({'error': str(error)}), 400
+
+
+@views.route('/')
+@cached
 def homepage():
-    return render_template("ff_home.html", headings=headings, data=list_of_players)
+    return render_page("ff_home.html", headings=heading_columns)
 
-@app.route('/risky')
+@views.route('/risky')
+@cached
 def risky():
-    return render_template("ff_risky_players.html", headings=headings, data=risky_players)
+    risky_query = parse_risky_query(request.args)
+    query_args = risky_query.to_args()
+    players_url = '/api/players?' + urlencode(dict(query_args, sort='-proj_ffp'))
+    return render_page("ff_risky_players.html", headings=heading_columns, players_url=players_url,
+                       criteria=query_args)
 
-@app.route('/salary')
+@views.route('/salary')
+@cached
 def salary():
-    return render_template("ff_salary.html", headings=headings, data=player_data_sorted_salary)
+    return render_page("ff_salary.html", headings=heading_columns)
+
+@views.route('/api/players')
+@cached
+def api_players():
+    data = current_data()
+    sort = request.args.get('sort', '')
+    spec = parse_sort(sort)
+    mask = parse_filters(request.args, data)
+    limit = request.args.get('limit', '50')
+    if not (limit.isascii() and limit.isdigit()) or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        raise BadRequest(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor, sort) if cursor else -1
+    rows, next_after, total = data.sort_index.page(spec, mask, after, int(limit))
+    return jsonify({'players': [data.players[row].get_player_dict() for row in rows],
+                    'total': total,
+                    'next_cursor': encode_cursor(next_after, sort) if next_after is not None else None})
 
-@app.route('/search')
+@views.route('/search')
+@cached
 def search():
-    return render_template("ff_search.html", headings=headings, team_names=TEAM_NAMES)
+    return render_page("ff_search.html", headings=headings, team_names=TEAM_NAMES)
 
-@app.route('/handle_search', methods=['POST'])
+@views.route('/handle_search', methods=['POST'])
 def handle_search():
     player_last_name = str(request.form['name']).casefold()
     player_pos = str(request.form['pos']).casefold()
     player_team = str(request.form['team']).casefold()
     player_id = player_last_name + player_pos + player_team
-    print(player_id)
-    search_results = player_tree.search(player_id)
+    data = current_data()
+    search_results = data.tree.search(player_id)
+    result = 'exact'
+    if search_results is False:
+        result = 'suggestion'
+        player = suggest_player(data, player_last_name, player_pos, player_team)
+        if player is not None:
+            search_results = player.get_player_data()
+    if search_results is False:
+        result = 'miss'
+    searches.inc(result=result)
     if search_results is False:
         return "Player not found, please check spelling or search for a different player <a href='/search'>here</a>"
-    return render_template("ff_search_results.html", headings=headings, player_info=search_results)
+    return render_page("ff_search_results.html", headings=headings, player_info=search_results)
+
+@views.route('/teams')
+@cached
+def teams():
+    return render_page("ff_groups.html", title='Teams', kind='team', base_url='/teams',
+                       groups=current_data().groups.groups('team'))
+
+@views.route('/positions')
+@cached
+def positions():
+    return render_page("ff_groups.html", title='Positions', kind='pos', base_url='/positions',
+                       groups=current_data().groups.groups('pos'))
+
+@views.route('/teams/<team>')
+@cached
+def team_page(team):
+    group = group_view(current_data(), team=team, pos=request.args.get('pos') or None)
+    if group is None:
+        return "Team not found, see every team <a href='/teams'>here</a>", 404
+    return render_page("ff_group.html", headings=headings, kind='team', **group)
+
+@views.route('/positions/<path:pos>')
+@cached
+def position_page(pos):
+    group = group_view(current_data(), team=request.args.get('team') or None, pos=pos)
+    if group is None:
+        return "Position not found, see every position <a href='/positions'>here</a>", 404
+    return render_page("ff_group.html", headings=headings, kind='pos', **group)
+
+@views.route('/api/teams')
+@cached
+def api_teams():
+    return jsonify({'teams': current_data().groups.groups('team')})
+
+@views.route('/api/positions')
+@cached
+def api_positions():
+    return jsonify({'positions': current_data().groups.groups('pos')})
+
+@views.route('/api/teams/<team>')
+@cached
+def api_team(team):
+    """
+    returns a team's totals, its totals at each position and its players. Takes pos to narrow it to one position
+    """
+    group = group_view(current_data(), team=team, pos=request.args.get('pos') or None)
+    if group is None:
+        return jsonify({'error': f'no players on team {team}'}), 404
+    return jsonify(dict(group, players=[player.get_player_dict() for player in group['players']]))
+
+@views.route('/api/positions/<path:pos>')
+@cached
+def api_position(pos):
+    """
+    returns a position's totals, its totals on each team and its players. Takes team to narrow it to one team
+    """
+    group = group_view(current_data(), team=request.args.get('team') or None, pos=pos)
+    if group is None:
+        return jsonify({'error': f'no players at position {pos}'}), 404
+    return jsonify(dict(group, players=[player.get_player_dict() for player in group['players']]))
+
+@views.route('/api/players/lookup', methods=['POST'])
+def api_players_lookup():
+    """
+    looks up many players in one request. The body is a json list, or an object with a players list, of
+    player_uuids, [name, pos, team] lists or objects with either. All the keys are found in one walk of the
+    tree, and each item gets its own result: exact, suggestion when only the closest name on the team and
+    position matched, miss, or invalid with an error
+    """
+    body = request.get_json(silent=True)
+    items = body.get('players') if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise BadRequest('the body must be a json list of players, or an object with a players list')
+    if len(items) > MAX_LOOKUPS:
+        raise BadRequest(f'at most {MAX_LOOKUPS} players can be looked up at once')
+    data = current_data()
+    lookups = []
+    for item in items:
+        try:
+            lookups.append(parse_lookup(item))
+        except BadRequest as error:
+            lookups.append(error)
+    found = data.tree.get_many(lookup[0] for lookup in lookups if not isinstance(lookup, BadRequest))
+    results = []
+    for item, lookup in zip(items, lookups):
+        if isinstance(lookup, BadRequest):
+            results.append({'query': item, 'result': 'invalid', 'error': str(lookup), 'player': None})
+            continue
+        player_uuid, search = lookup
+        player = found.get(player_uuid)
+        result = 'exact'
+        if player is None and search is not None:
+            result = 'suggestion'
+            player = suggest_player(data, *search)
+        if player is None:
+            result = 'miss'
+        searches.inc(result=result)
+        results.append({'query': item, 'result': result,
+                        'player': player.get_player_dict() if player is not None else None})
+    return jsonify({'results': results, 'found': sum(result['player'] is not None for result in results),
+                    'missed': sum(result['player'] is None for result in results)})
+
+@views.route('/search/suggest')
+@cached
+def search_suggest():
+    query = request.args.get('q', '')
+    limit = parse_int(request.args, 'limit', 10, 1, 25)
+    suggestions = [{'player_uuid': player.player_uuid, 'name': player.name, 'pos': player.pos,
+                    'team': player.team, 'score': score}
+                   for score, player in current_data().name_index.suggest(query, limit)]
+    return jsonify(suggestions)
+
+@views.route('/simulate')
+@cached
+def simulate():
+    """
+    simulates seasons for every player and returns each player's simulated points percentiles and chance of
+    finishing in the top at their position, best average first. Takes simulations, seed, top and pos
+    """
+    data = current_data()
+    simulations = parse_int(request.args, 'simulations', 10000, 1, MAX_SIMULATIONS)
+    seed = parse_int(request.args, 'seed', 0, 0, 2 ** 32 - 1)
+    top_n = parse_int(request.args, 'top', 12, 1, 100)
+    result = simulator.simulate_table(data.table, simulations, top_n, seed)
+    percentiles = result.percentiles(simulator.DEFAULT_PERCENTILES)
+    top_probability = result.top_probability()
+    positions = {value.casefold() for value in request.args.get('pos', '').split(',') if value}
+    players = []
+    for row in np.argsort(-result.mean, kind='stable'):
+        player = data.players[row]
+        if positions and player.pos.casefold() not in positions:
+            continue
+        players.append({'player_uuid': player.player_uuid, 'name': player.name, 'pos': player.pos,
+                        'team': player.team, 'proj_ffp': player.proj_ffp, 'st_dev_proj': player.st_dev_proj,
+                        'mean': round(float(result.mean[row]), 2), 'std': round(float(result.std[row]), 2),
+                        'percentiles': {f'p{percent}': round(float(value), 2) for percent, value
+                                        in zip(simulator.DEFAULT_PERCENTILES, percentiles[row])},
+                        'top_probability': round(float(top_probability[row]), 4)})
+    return jsonify({'simulations': simulations, 'seed': seed, 'top': top_n, 'players': players})
+
+@views.route('/api/lineup')
+@cached
+def api_lineup():
+    """
+    returns the best lineups whose contract values fit in a budget. Takes budget, a slot count per position
+    (qb, rb, wr, te, k and dst, the usual lineup if not given), risk, which lowers each player's projection by
+    that many standard deviations of the projections, and top, how many lineups to return
+    """
+    data = current_data()
+    if 'budget' not in request.args:
+        raise BadRequest('budget is required')
+    budget = parse_int(request.args, 'budget', 0, 0, 10 ** 10)
+    slots = {position: parse_int(request.args, name, lineup_optimizer.DEFAULT_SLOTS[position], 0, MAX_SLOTS)
+             for position, name in SLOT_ARGS.items()}
+    try:
+        risk = float(request.args.get('risk', '0'))
+    except ValueError:
+        raise BadRequest('risk must be a number')
+    if not 0 <= risk <= 10:
+        raise BadRequest('risk must be between 0 and 10')
+    top_k = parse_int(request.args, 'top', 1, 1, MAX_LINEUPS)
+    lineups = []
+    for lineup in lineup_optimizer.optimize_table(data.table, budget, slots, top_k, risk):
+        players = [data.players[row] for row in lineup.rows]
+        lineups.append({'score': round(lineup.score, 2), 'contract_value': lineup.cost,
+                        'proj_ffp': round(sum(player.proj_ffp for player in players), 2),
+                        'players': [{'player_uuid': player.player_uuid, 'name': player.name, 'pos': player.pos,
+                                     'team': player.team, 'proj_ffp': player.proj_ffp,
+                                     'st_dev_proj': player.st_dev_proj, 'contract_value': player.contract_value}
+                                    for player in players]})
+    return jsonify({'budget': budget, 'slots': slots, 'risk': risk, 'lineups': lineups})
+
+@views.route('/api/players/<path:player_uuid>/history')
+@cached
+def api_player_history(player_uuid):
+    """
+    returns a player's stored seasons and weeks from the history store, with their points in every game played
+    and the average of the last window games up to it. Takes window, ROLLING_WEEKS games if not given
+    """
+    data = current_data()
+    window = parse_int(request.args, 'window', history_store.ROLLING_WEEKS, 1, MAX_ROLLING_WEEKS)
+    if data.history is None:
+        return jsonify({'error': 'no player history has been synced'}), 404
+    player = data.tree.get(player_uuid.casefold())
+    if player is None:
+        return jsonify({'error': f'no player {player_uuid}'}), 404
+    player_id = data.history.find_player(player.name, player.pos, player.team)
+    if player_id is None:
+        return jsonify({'error': f'no history for {player.name}'}), 404
+    return jsonify({'player': player.get_player_dict(), 'player_id': player_id,
+                    'seasons': data.history.season_history(player_id),
+                    'weeks': data.history.weekly_history(player_id),
+                    'rolling': data.history.rolling_points(player_id, window), 'window': window})
+
+@views.route('/metrics')
+def metrics_endpoint():
+    refresher = current_app.extensions['player_data']
+    if refresher.current is not None:
+        dataset_players.set(len(refresher.current))
+        dataset_age.set(time.time() - refresher.current.built_at)
+    dataset_refreshes.set(refresher.refreshes)
+    dataset_refresh_failures.set(refresher.failures)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == "__main__":
-    player_tree = obj.BinarySearchTree()
-    player_data = get_data()
-    player_tree = fill_tree(player_tree, player_data)
-    list_of_players = list_players(player_data)
-    player_data_sorted_salary = sorted(list_of_players, key=lambda x: x.contract_value, reverse=True)
-    risky_players = get_risky_players(list_of_players)
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
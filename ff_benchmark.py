@@ -0,0 +1,661 @@
+# This module benchmarks the data structures used by the application on synthetic players, so changes
+# can be compared at sizes well beyond the top 300 players in the real data.
+# Run it with:  python ff_benchmark.py trees --sizes 300 10000 1000000
+#               python ff_benchmark.py contracts --sizes 300 10000 [--fixtures saved_page.html]
+#               python ff_benchmark.py pipeline --sizes 300 10000 --output results.json [--compare old.json]
+#               python ff_benchmark.py lineup --sizes 300 1000 5000
+#               python ff_benchmark.py memory --sizes 300 10000 100000
+#               python ff_benchmark.py history --sizes 300 2000
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from itertools import zip_longest
+
+from bs4 import BeautifulSoup
+
+import ff_datamgmt as dm
+import ff_history as history_store
+import ff_lineup as lineup_optimizer
+import ff_objects as obj
+from ff_stubs import (StubServer, synthetic_contracts_html, synthetic_espn_csv, synthetic_player_data,
+                      synthetic_players, synthetic_sportsdata_json)
+
+FIXTURE_DIRECTORY = 'benchmark_fixtures'
+# pages rendered in the template stage, method, path and form
+PAGES = (
+    ('GET', '/', None),
+    ('GET', '/salary', None),
+    ('GET', '/risky', None),
+    ('GET', '/search', None),
+    ('POST', '/handle_search', 'first'),
+    ('GET', '/api/players?sort=-proj_ffp&limit=50', None)
+)
+
+
+class BenchNode:
+    """
+    class BenchNode is a minimal stand in for PlayerNode with only what the search trees use, so building
+    a million of them measures the trees and not the player objects
+
+    Parameters
+    ----------
+    player_uuid: str
+        the key the trees are sorted by
+    """
+    __slots__ = ('player_uuid',)
+
+    def __init__(self, player_uuid):
+        self.player_uuid = player_uuid
+
+    def get_player_data(self):
+        return [self.player_uuid]
+
+
+def synthetic_uuids(size, seed=0):
+    """
+    makes unique keys that look like player_uuids, lastname + position + team
+    Parameters
+    ----------
+    size: int
+        how many keys to make
+    seed: int
+        seed for the random generator so runs are repeatable
+
+    Returns
+    -------
+    list of unique keys in random order
+    """
+    rng = random.Random(seed)
+    positions = ('qb', 'rb', 'wr', 'te', 'k')
+    teams = ('ari', 'atl', 'bal', 'buf', 'car', 'chi', 'cin', 'cle', 'dal', 'den', 'det', 'gb', 'hou', 'ind',
+             'jax', 'kc', 'lac', 'lar', 'lv', 'mia', 'min', 'ne', 'no', 'nyg', 'nyj', 'phi', 'pit', 'sea', 'sf',
+             'tb', 'ten', 'wsh')
+    uuids = [f'player{i:07d}{positions[i % len(positions)]}{teams[i % len(teams)]}' for i in range(size)]
+    rng.shuffle(uuids)
+    return uuids
+
+
+def timed(function, *args):
+    """
+    runs a function once and measures it
+    Parameters
+    ----------
+    function: callable
+        the function to time
+    args:
+        arguments passed to the function
+
+    Returns
+    -------
+    seconds: float
+        wall clock time the call took
+    result:
+        what the function returned
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def build_tree(tree_class, uuids):
+    tree = tree_class()
+    for uuid in uuids:
+        tree.insert(BenchNode(uuid))
+    return tree
+
+
+def bulk_build_tree(tree_class, uuids):
+    tree = tree_class()
+    tree.build([BenchNode(uuid) for uuid in uuids])
+    return tree
+
+
+def search_tree(tree, uuids):
+    for uuid in uuids:
+        tree.search(uuid)
+
+
+def benchmark_trees(sizes, lookups=10000, seed=0):
+    """
+    compares building and searching the BinarySearchTree against the AVLTree, built both by inserting one
+    player at a time and with AVLTree.build. Each size is inserted in random order and in sorted order, which
+    is the worst case for a tree that never rebalances
+    Parameters
+    ----------
+    sizes: list
+        numbers of keys to benchmark
+    lookups: int
+        number of searches timed for each tree
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    results: list
+        one dictionary per tree, size and insertion order with the timings, or the error the tree failed with
+    """
+    results = []
+    for size in sizes:
+        uuids = synthetic_uuids(size, seed)
+        probes = random.Random(seed).choices(uuids, k=lookups)
+        for order, keys in (('random', uuids), ('sorted', sorted(uuids))):
+            for tree_class, build in ((obj.BinarySearchTree, build_tree), (obj.AVLTree, build_tree),
+                                      (obj.AVLTree, bulk_build_tree)):
+                result = {'stage': 'tree', 'tree': tree_class.__name__, 'build': build.__name__, 'size': size,
+                          'order': order}
+                try:
+                    result['build_s'], tree = timed(build, tree_class, keys)
+                    result['height'] = tree.height()
+                    search_s, _ = timed(search_tree, tree, probes)
+                    result['search_us'] = search_s / lookups * 1e6
+                except RecursionError:
+                    result['error'] = 'RecursionError'
+                results.append(result)
+                print(format_result(result))
+    return results
+
+
+def contract_fixtures(sizes, seed=0):
+    """
+    writes a synthetic contracts page for every size to FIXTURE_DIRECTORY, unless it was saved before
+    Parameters
+    ----------
+    sizes: list
+        numbers of contracts
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    list of fixture file paths
+    """
+    os.makedirs(FIXTURE_DIRECTORY, exist_ok=True)
+    paths = []
+    for size in sizes:
+        path = os.path.join(FIXTURE_DIRECTORY, f'overthecap_{size}.html')
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8') as fixture_file:
+                fixture_file.write(synthetic_contracts_html(size, seed))
+        paths.append(path)
+    return paths
+
+
+def legacy_parse_contracts(html):
+    """
+    the contract scraper as it was before parse_contract_table, kept to compare against: the whole page is
+    parsed and every cell of the table is regrouped eight at a time
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    cells = [cell.string for cell in soup.find('table', class_="sortable controls-table").find_all('td')]
+    return [{'Name': player[0], 'Position': player[1], 'Team': dm.TEAM_NAMES[player[2]],
+             'Total Value': player[3], 'APY': player[4], 'Total Guaranteed': player[5],
+             'AVG Annual Guarantee': player[6], 'Percent Guaranteed': player[7]}
+            for player in zip_longest(*[iter(cells)] * 8)]
+
+
+def benchmark_contracts(paths, repeats=3):
+    """
+    compares parsing saved contract pages with the old scraper and with parse_contract_table. The best of a
+    few runs is reported
+    Parameters
+    ----------
+    paths: list
+        saved overthecap pages
+    repeats: int
+        number of times each parse is timed
+
+    Returns
+    -------
+    results: list
+        one dictionary per page and scraper with the timings
+    """
+    results = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as fixture_file:
+            html = fixture_file.read()
+        baseline = None
+        for scraper, parse in (('legacy', legacy_parse_contracts), ('incremental', dm.parse_contract_table)):
+            timings = [timed(parse, html) for _ in range(repeats)]
+            parse_s = min(seconds for seconds, _ in timings)
+            baseline = baseline or parse_s
+            result = {'stage': 'contracts', 'fixture': os.path.basename(path), 'bytes': len(html),
+                      'scraper': scraper, 'rows': len(timings[0][1]), 'parse_s': parse_s,
+                      'speedup': baseline / parse_s}
+            results.append(result)
+            print(format_result(result))
+    return results
+
+
+def benchmark_pipeline(sizes, lookups=10000, seed=0):
+    """
+    times every stage of getting the players onto a page, on synthetic sources of each size served from stub
+    servers: reading the espn csv, parsing the contracts page, fetching all the sources, blending them in
+    player_data_blend, building the PlayerTable and PlayerNodes, building and searching the BinarySearchTree
+    and the AVLTree, rendering the pages of the application from an empty response cache and serving them from
+    a warm one
+    Parameters
+    ----------
+    sizes: list
+        numbers of players
+    lookups: int
+        number of searches timed for each tree
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    results: list
+        one dictionary per size and stage with the seconds the stage took
+    """
+    from ff_application import create_app
+
+    results = []
+    saved = {name: getattr(dm, name) for name in ('SPORTSDATAIO_BASE_URL', 'OVERTHECAP_CONTRACTS_URL',
+                                                  'ESPN_PROJECTIONS_FILE', 'PLAYER_CACHE_FILE',
+                                                  'SOURCE_CACHE_FILE', 'PLAYER_SNAPSHOT_FILE')}
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix='ff_benchmark_')
+
+        def record(stage, seconds, **extra):
+            result = dict({'stage': stage, 'size': size, 'seconds': seconds}, **extra)
+            results.append(result)
+            print(format_result(result))
+
+        try:
+            players = synthetic_players(size, seed)
+            espn_path = os.path.join(directory, 'espn.csv')
+            synthetic_espn_csv(espn_path, players, seed)
+            contracts_html = synthetic_contracts_html(size, seed, players).encode('utf-8')
+            routes = {
+                '/contracts': ('text/html', contracts_html),
+                '/stats/json/PlayerSeasonStats/2021REG': ('application/json', synthetic_sportsdata_json(players, seed)),
+                '/projections/json/PlayerSeasonProjectionStats/2022': ('application/json',
+                                                                      synthetic_sportsdata_json(players, seed + 1))
+            }
+            with StubServer(routes) as stub:
+                dm.SPORTSDATAIO_BASE_URL = stub.url
+                dm.OVERTHECAP_CONTRACTS_URL = stub.url + '/contracts'
+                dm.ESPN_PROJECTIONS_FILE = espn_path
+                dm.PLAYER_CACHE_FILE = os.path.join(directory, 'players.json')
+                dm.SOURCE_CACHE_FILE = os.path.join(directory, 'sources.json')
+                dm.PLAYER_SNAPSHOT_FILE = os.path.join(directory, 'players.ffsnap')
+
+                seconds, espn_rows = timed(dm.get_espn_player_projections)
+                record('csv_ingest', seconds, rows=len(espn_rows))
+                seconds, contract_rows = timed(dm.parse_contract_table, contracts_html.decode('utf-8'))
+                record('scrape_parse', seconds, rows=len(contract_rows))
+                source_cache = {}
+                seconds, _ = timed(dm.refresh_sources, source_cache)
+                record('fetch_sources', seconds, bytes=sum(len(body) for _, body in routes.values()))
+                dm.save_source_cache(source_cache)
+                seconds, player_data = timed(dm.player_data_blend)
+                record('blend', seconds, players=len(player_data))
+
+            seconds, table = timed(obj.PlayerTable.from_player_data, player_data)
+            record('player_table', seconds)
+            seconds, nodes = timed(table.nodes)
+            record('player_nodes', seconds)
+            uuids = [node.player_uuid for node in nodes]
+            probes = random.Random(seed).choices(uuids, k=lookups)
+            for tree_class in (obj.BinarySearchTree, obj.AVLTree):
+                tree = tree_class()
+
+                def insert_all():
+                    for node in nodes:
+                        tree.insert(node)
+
+                try:
+                    seconds, _ = timed(insert_all)
+                    record('tree_build', seconds, tree=tree_class.__name__, height=tree.height())
+                    seconds, _ = timed(search_tree, tree, probes)
+                    record('tree_search', seconds, tree=tree_class.__name__, search_us=seconds / lookups * 1e6)
+                except RecursionError:
+                    record('tree_build', None, tree=tree_class.__name__, error='RecursionError')
+
+            seconds, app = timed(create_app, lambda: player_data, 3600)
+            record('create_app', seconds)
+            client = app.test_client()
+            first = nodes[0]
+            search_form = {'name': first.player_uuid[:-len(first.pos + first.team)], 'pos': first.pos.casefold(),
+                           'team': first.team.casefold()}
+            responses = app.extensions['player_data'].current.responses
+            for method, path, form in PAGES:
+                request = (lambda: client.post(path, data=search_form)) if form else (lambda: client.get(path))
+                repeats = 20
+                # keep anything the pages print out of the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    status = request().status_code
+                    # the pages are cached, so every render starts from an empty cache, and the time a cached
+                    # copy takes is reported on its own
+                    rendered = 0.0
+                    for _ in range(repeats):
+                        responses.clear()
+                        seconds, _ = timed(request)
+                        rendered += seconds
+                    seconds, _ = timed(lambda: [request() for _ in range(repeats)])
+                record('render', rendered / repeats, route=path, status=status)
+                # posted forms aren't cached
+                if not form:
+                    record('cache_hit', seconds / repeats, route=path, status=status)
+        finally:
+            for name, value in saved.items():
+                setattr(dm, name, value)
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+class LegacyPlayerNode:
+    """
+    class LegacyPlayerNode has the shape PlayerNode had before it got __slots__: a __dict__ per player, tree
+    links on every player and both display strings kept as strings, to measure the memory it saves
+    """
+    def __init__(self, player_uuid, name, pos, team, ly_ffp, proj_ffp, games_played, contract_value,
+                 contract_value_str, percent_guaranteed, percent_guaranteed_str, st_dev_proj, row):
+        self.left_child = None
+        self.right_child = None
+        self.row = row
+        self.player_uuid = player_uuid
+        self.name = name
+        self.pos = pos
+        self.team = team
+        self.ly_ffp = ly_ffp
+        self.proj_ffp = proj_ffp
+        self.games_played = games_played
+        self.contract_value = contract_value
+        self.contract_value_str = contract_value_str
+        self.percent_guaranteed = percent_guaranteed
+        self.percent_guaranteed_str = percent_guaranteed_str
+        self.st_dev_proj = st_dev_proj
+
+
+def legacy_nodes(table):
+    columns = zip(table.player_uuid, table.name, table.pos, table.team, table.ly_ffp.tolist(),
+                  table.proj_ffp.tolist(), table.games_played.tolist(), table.contract_value.tolist(),
+                  table.contract_value_str, table.percent_guaranteed.tolist(), table.percent_guaranteed_str,
+                  table.st_dev_proj.tolist())
+    return [LegacyPlayerNode(*values, row) for row, values in enumerate(columns)]
+
+
+def retained_bytes(build):
+    """
+    measures how much memory what a function returns keeps alive, everything it only used while running is
+    freed before measuring
+    Parameters
+    ----------
+    build: callable
+        the function to measure
+
+    Returns
+    -------
+    bytes: int
+        bytes allocated while building that are still in use
+    result:
+        what the function returned
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return retained, result
+
+
+def benchmark_memory(sizes, seed=0):
+    """
+    measures the memory each representation of the players keeps per player: the blended records as they are
+    read from the player cache, the PlayerTable, the PlayerNodes before and after they got __slots__ and lazy
+    display strings, and a whole PlayerDataset built from the json once the records have been released
+    Parameters
+    ----------
+    sizes: list
+        numbers of players
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    results: list
+        one dictionary per size and representation with the bytes it keeps per player
+    """
+    from ff_dataset import PlayerDataset
+
+    results = []
+    for size in sizes:
+        text = json.dumps(synthetic_player_data(synthetic_players(size, seed), seed))
+        records_bytes, records = retained_bytes(lambda: json.loads(text))
+        table_bytes, table = retained_bytes(lambda: obj.PlayerTable.from_player_data(records))
+        parts = [('records', records_bytes), ('player_table', table_bytes),
+                 ('legacy_nodes', retained_bytes(lambda: legacy_nodes(table))[0]),
+                 ('player_nodes', retained_bytes(table.nodes)[0])]
+        del records, table
+        # with the records released, only what was interned or copied out of them stays
+        parts.append(('dataset', retained_bytes(lambda: PlayerDataset(json.loads(text)))[0]))
+        for part, retained in parts:
+            result = {'stage': 'memory', 'size': size, 'part': part, 'bytes': retained,
+                      'bytes_per_player': retained / size}
+            results.append(result)
+            print(format_result(result))
+    return results
+
+
+def benchmark_lineups(sizes, top_ks=(1, 10), budget=100000000, repeats=3, seed=0):
+    """
+    times finding the best lineups under a salary budget in synthetic player pools, with and without a risk
+    penalty. The best of a few runs is reported
+    Parameters
+    ----------
+    sizes: list
+        numbers of players in the pool
+    top_ks: tuple
+        numbers of lineups to find
+    budget: int
+        the salary budget of a lineup
+    repeats: int
+        number of times each search is timed
+    seed: int
+        seed for the random generator so runs are repeatable
+
+    Returns
+    -------
+    results: list
+        one dictionary per size, number of lineups and risk with the seconds the search took
+    """
+    results = []
+    positions = list(lineup_optimizer.DEFAULT_SLOTS)
+    for size in sizes:
+        rng = random.Random(seed)
+        pos = [positions[rng.randrange(len(positions))] for _ in range(size)]
+        proj_ffp = [rng.uniform(20, 400) for _ in range(size)]
+        st_dev_proj = [rng.uniform(0, 60) for _ in range(size)]
+        # salaries grow with the projection, with plenty of noise, like real contracts
+        costs = [round(points * rng.uniform(0, 100000)) for points in proj_ffp]
+        for top_k in top_ks:
+            for risk in (0.0, 1.0):
+                scores = lineup_optimizer.lineup_scores(proj_ffp, st_dev_proj, risk)
+                timings = [timed(lineup_optimizer.optimize, scores, costs, pos, budget, None, top_k)
+                           for _ in range(repeats)]
+                lineups = timings[0][1]
+                result = {'stage': 'lineup', 'size': size, 'top': top_k, 'risk': str(risk),
+                          'seconds': min(seconds for seconds, _ in timings),
+                          'best_score': lineups[0].score if lineups else 0.0}
+                results.append(result)
+                print(format_result(result))
+    return results
+
+
+def benchmark_history(sizes, seasons=(2019, 2020, 2021, 2022), current_week=6, lookups=1000, seed=0):
+    """
+    times the history store on synthetic seasons and weeks served from a stub server: the first sync that
+    fetches everything, a second sync that should only fetch the week in progress and the season it is in,
+    working out every player's averages for the PlayerTable, and the per player history queries
+    Parameters
+    ----------
+    sizes: list
+        numbers of players
+    seasons: tuple
+        the seasons to sync
+    current_week: int
+        the week the latest season is in
+    lookups: int
+        number of players whose history is queried
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    results: list
+        one dictionary per size and stage with the seconds the stage took
+    """
+    results = []
+    saved = dm.SPORTSDATAIO_BASE_URL
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix='ff_benchmark_')
+
+        def record(stage, seconds, **extra):
+            result = dict({'stage': stage, 'size': size, 'seconds': seconds}, **extra)
+            results.append(result)
+            print(format_result(result))
+
+        try:
+            players = synthetic_players(size, seed)
+            routes = {}
+            for season in seasons:
+                routes[f'/stats/json/PlayerSeasonStats/{season}REG'] = (
+                    'application/json', synthetic_sportsdata_json(players, seed + season))
+                for week in range(1, history_store.season_weeks(season) + 1):
+                    routes[f'/stats/json/PlayerGameStatsByWeek/{season}REG/{week}'] = (
+                        'application/json', synthetic_sportsdata_json(players, seed + season * 100 + week))
+            with StubServer(routes) as stub:
+                dm.SPORTSDATAIO_BASE_URL = stub.url
+                store = history_store.HistoryStore(os.path.join(directory, 'history.sqlite'))
+                for stage in ('sync', 'sync_again'):
+                    seconds, summary = timed(store.sync, list(seasons), current_week)
+                    record(stage, seconds, **summary)
+            names = [player['name'] for player in players]
+            positions = [player['pos'] for player in players]
+            teams = [player['abbreviation'] for player in players]
+            seconds, (career_ffp, _) = timed(store.player_trends, names, positions, teams)
+            record('player_trends', seconds, matched=int((career_ffp == career_ffp).sum()))
+            probes = random.Random(seed).choices(players, k=lookups)
+
+            def query_all():
+                for player in probes:
+                    player_id = store.find_player(player['name'], player['pos'], player['abbreviation'])
+                    store.season_history(player_id)
+                    store.weekly_history(player_id)
+                    store.rolling_points(player_id)
+
+            seconds, _ = timed(query_all)
+            record('player_history', seconds, query_us=seconds / lookups * 1e6)
+            store.close()
+        finally:
+            dm.SPORTSDATAIO_BASE_URL = saved
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def environment():
+    """
+    describes where the benchmark ran, so results saved from different versions of the code can be told apart
+    """
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {'revision': revision, 'python': platform.python_version(), 'machine': platform.machine(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+
+def result_key(result):
+    # everything that says what was measured rather than how long it took
+    return tuple(sorted((key, value) for key, value in result.items()
+                        if not isinstance(value, float) and key not in ('height', 'status', 'error')))
+
+
+def compare_results(previous, results, threshold=1.2):
+    """
+    compares results against a saved run and reports every measurement that got slower by more than the
+    threshold
+    Parameters
+    ----------
+    previous: list
+        results loaded from an earlier --output file
+    results: list
+        the results of this run
+    threshold: float
+        how many times slower a measurement can get before it is reported
+
+    Returns
+    -------
+    list of (result, previous seconds, seconds) for every regression
+    """
+    timings = {result_key(result): result.get('seconds') for result in previous}
+    regressions = []
+    for result in results:
+        before, after = timings.get(result_key(result)), result.get('seconds')
+        if before and after and after > before * threshold:
+            regressions.append((result, before, after))
+            print(f'slower: {format_result(result)}  was {before:.4g}s')
+    return regressions
+
+
+def format_result(result):
+    """
+    formats one benchmark result as a line of text
+    Parameters
+    ----------
+    result: dict
+        the benchmark result
+
+    Returns
+    -------
+    str
+    """
+    return '  '.join(f'{key}={value:.4g}' if isinstance(value, float) else f'{key}={value}'
+                     for key, value in result.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the fantasy football application')
+    parser.add_argument('stage', choices=['trees', 'contracts', 'pipeline', 'lineup', 'memory', 'history'],
+                        help='what to benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 10000, 1000000],
+                        help='numbers of players to benchmark with')
+    parser.add_argument('--fixtures', nargs='+', help='saved overthecap pages to parse instead of synthetic ones')
+    parser.add_argument('--output', help='also write the results to this json file')
+    parser.add_argument('--compare', help='report measurements slower than in this earlier --output file')
+    args = parser.parse_args()
+    if args.stage == 'contracts':
+        benchmark_results = benchmark_contracts(args.fixtures or contract_fixtures(args.sizes))
+    elif args.stage == 'pipeline':
+        benchmark_results = benchmark_pipeline(args.sizes)
+    elif args.stage == 'lineup':
+        benchmark_results = benchmark_lineups(args.sizes)
+    elif args.stage == 'memory':
+        benchmark_results = benchmark_memory(args.sizes)
+    elif args.stage == 'history':
+        benchmark_results = benchmark_history(args.sizes)
+    else:
+        benchmark_results = benchmark_trees(args.sizes)
+    if args.compare:
+        with open(args.compare, 'r') as previous_file:
+            regression_count = len(compare_results(json.load(previous_file)['results'], benchmark_results))
+        print(f'{regression_count} measurements got slower')
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'environment': environment(), 'stage': args.stage, 'results': benchmark_results},
+                      output_file, indent=2)
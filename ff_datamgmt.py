@@ -4,11 +4,118 @@
 from typing import Dict, Union, Any
 
 import requests
+import bz2
 import csv
+import gzip
 import json
+import lzma
+import math
+import os
+import re
+import threading
+import time
 import ff_keys as keys
-from bs4 import BeautifulSoup
-from itertools import zip_longest
+import ff_metrics as metrics
+from ff_identity import identity_keys, join_sources, key_rows
+from ff_snapshot import atomic_write, open_snapshot, write_player_snapshot
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from html.parser import HTMLParser
+
+
+SPORTSDATAIO_BASE_URL = 'https://api.sportsdata.io/v3/nfl'
+OVERTHECAP_CONTRACTS_URL = 'https://overthecap.com/contracts'
+OVERTHECAP_POSITION_URL = 'https://overthecap.com/position/{}'
+# extra overthecap pages fetched alongside the contracts page, for example ('quarterback', 'running-back')
+CONTRACT_POSITIONS = ()
+ESPN_PROJECTIONS_FILE = 'Fantasy Football 2022.csv'
+PLAYER_CACHE_FILE = 'Player_Cached_Data.json'
+SOURCE_CACHE_FILE = 'Source_Cached_Data.json'
+PLAYER_SNAPSHOT_FILE = 'Player_Snapshot.ffsnap'
+# the season the historic points come from and the season the projections are for
+STATS_SEASON = 2021
+PROJECTION_SEASON = 2022
+
+# seconds to wait on each upstream before giving up on an attempt
+SOURCE_TIMEOUTS = {
+    'contracts': 20,
+    'season_stats': 10,
+    'projections': 10
+}
+# seconds a cached copy of each source is trusted before it is revalidated. The espn csv is local, so it has
+# no time to live, it is read again whenever its modification time or size changes
+SOURCE_TTLS = {
+    'espn': None,
+    'contracts': 60 * 60 * 24,
+    'season_stats': 60 * 60 * 24,
+    'projections': 60 * 60 * 6
+}
+# seconds before a source whose last refresh failed is tried again, so a source that is down doesn't make every
+# load wait on its retries
+SOURCE_RETRY_INTERVAL = 60 * 60
+# the fields of the source cache entries the player snapshot records, to tell if it is stale without the cache
+SNAPSHOT_SOURCE_FIELDS = ('fetched_at', 'attempted_at', 'file_version')
+# the fields of a blended record that come from each remote source
+SOURCE_FIELDS = {
+    'contracts': ('Total_Salary', 'Annual_Salary', 'Percent_Guaranteed'),
+    'season_stats': ('Games Played', 'Historic Fantasy Points'),
+    'projections': ('Fantasy Projections',)
+}
+# query parameters that hold api keys, taken out of anything that gets printed
+SECRET_PARAMETERS = re.compile(r'((?:api_)?key=)[^&\s\'"]+', re.IGNORECASE)
+# the columns of the espn projections every row needs, and how the numeric ones are typed. Every other
+# column is a float, PASSING_C/A is split into PASSING_CMP and PASSING_ATT
+ESPN_REQUIRED_COLUMNS = ('PLAYER', 'Team', 'Position', 'FFP_TOTAL')
+ESPN_TEXT_COLUMNS = {'PLAYER', 'Team', 'Position'}
+ESPN_INTEGER_COLUMNS = {'RANK', 'ROUND'}
+ESPN_MISSING_VALUES = {'', '--', '#N/A', 'N/A', 'NA'}
+# bumped whenever the typed espn rows change shape, so cached rows in an older shape are parsed again
+ESPN_ROW_FORMAT = 2
+# spreadsheets turn a small completions/attempts value like 2/3 into the date 3-Feb
+spreadsheet_date = re.compile(r'^(\d{1,2})-(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)$')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open
+}
+# normalized overthecap table heading -> contract row field, the first six are needed to blend a player
+CONTRACT_HEADINGS = {
+    'player': 'Name',
+    'pos': 'Position',
+    'team': 'Team',
+    'totalvalue': 'Total Value',
+    'apy': 'APY',
+    'guaranteed': 'Percent Guaranteed',
+    'totalguaranteed': 'Total Guaranteed',
+    'avgguaranteeyear': 'AVG Annual Guarantee',
+    'avgannualguarantee': 'AVG Annual Guarantee'
+}
+CONTRACT_REQUIRED_FIELDS = ('Name', 'Position', 'Team', 'Total Value', 'APY', 'Percent Guaranteed')
+CONTRACT_TABLE_CLASS = 'controls-table'
+contract_table_start = re.compile(r'<table[^>]*\b%s\b' % CONTRACT_TABLE_CLASS, re.IGNORECASE)
+HTML_CHUNK_SIZE = 64 * 1024
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+fetch_seconds = metrics.histogram('ff_source_fetch_seconds', 'Time to fetch a data source url, retries included',
+                                  ('host', 'status'))
+fetch_bytes = metrics.counter('ff_source_fetch_bytes_total', 'Bytes received from each data source host', ('host',))
+fetch_retries = metrics.counter('ff_source_fetch_retries_total', 'Fetch attempts that failed and were retried',
+                                ('host',))
+source_cache_lookups = metrics.counter('ff_source_cache_total',
+                                       'Source cache lookups: hit while fresh, not_modified when revalidated and '
+                                       'unchanged, miss when new data was loaded, error when loading failed',
+                                       ('source', 'result'))
+source_load_seconds = metrics.histogram('ff_source_load_seconds', 'Time to revalidate and parse each data source',
+                                        ('source',))
+blend_seconds = metrics.histogram('ff_blend_seconds', 'Time player_data_blend took, source refreshes included')
+blended_players = metrics.gauge('ff_blended_players', 'Players in the last blend')
 
 
 TEAM_NAMES = {
@@ -47,125 +154,519 @@ TEAM_NAMES = {
 }
 
 
-def grouper(iterable, n, fillvalue=None):
+def redact(text):
     """
-    This is pulled from the recipes of the itertools page
-    https://docs.python.org/3/library/itertools.html#itertools-recipes
-    "Collect data into non-overlapping fixed-length chunks or blocks"
+    takes the api keys out of the query strings in a url or error message so it can be printed
     Parameters
     ----------
-    iterable: list
-        any iterable that you want to group
-    n: int
-        the number you want the elements grouped by
-    fillvalue: str
-        The value you would like to fill in if therea re any empties
+    text: str
+        the url or message
 
     Returns
     -------
-    list that is grouped
+    the text with the value of every key parameter replaced
+    """
+    return SECRET_PARAMETERS.sub(r'\1<redacted>', str(text))
 
+
+def get_session(url):
     """
-    args = [iter(iterable)] * n
-    return zip_longest(*args, fillvalue=fillvalue)
+    returns the shared requests session for the host of the url, creating it the first time the host is seen.
+    Each session keeps its own connection pool so repeated calls to the same host reuse connections
+    Parameters
+    ----------
+    url: str
+        the url that is going to be requested
 
+    Returns
+    -------
+    session: requests.Session
+        the pooled session for the url's host
+    """
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+    return session
 
-def get_player_season_stats():
+
+def fetch(url, timeout=10, retries=None, backoff=None, headers=None):
+    """
+    makes a GET request through the pooled session for the url's host. Connection errors, timeouts,
+    429 and 5xx responses are retried with exponential backoff, any other error status is raised right away
+    Parameters
+    ----------
+    url: str
+        the url to request
+    timeout: float
+        seconds to wait for the server on each attempt
+    retries: int
+        how many times to retry after the first attempt fails, defaults to MAX_RETRIES
+    backoff: float
+        seconds to sleep before the first retry, doubled for every retry after that. Defaults to RETRY_BACKOFF
+    headers: dict
+        optional extra request headers
+
+    Returns
+    -------
+    response: requests.Response
+        the successful response
+    """
+    retries = MAX_RETRIES if retries is None else retries
+    backoff = RETRY_BACKOFF if backoff is None else backoff
+    session = get_session(url)
+    host = urlsplit(url).netloc
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise requests.HTTPError(f'{response.status_code} from {redact(url)}', response=response)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as error:
+            if attempt == retries:
+                status = error.response.status_code if error.response is not None else 'error'
+                fetch_seconds.observe(time.perf_counter() - start, host=host, status=status)
+                raise
+            fetch_retries.inc(host=host)
+            time.sleep(backoff * 2 ** attempt)
+        else:
+            fetch_seconds.observe(time.perf_counter() - start, host=host, status=response.status_code)
+            fetch_bytes.inc(len(response.content), host=host)
+            response.raise_for_status()
+            return response
+
+
+def source_url(source):
+    """
+    builds the url a remote data source is requested from
+    Parameters
+    ----------
+    source: str
+        name of the source, either contracts, season_stats or projections
+
+    Returns
+    -------
+    the url of the source
+    """
+    urls = {
+        'contracts': OVERTHECAP_CONTRACTS_URL,
+        'season_stats': f'{SPORTSDATAIO_BASE_URL}/stats/json/PlayerSeasonStats/{STATS_SEASON}REG?'
+                        f'key={keys.SPORTDATAIO_FANTASY_DATA_KEY}',
+        'projections': f'{SPORTSDATAIO_BASE_URL}/projections/json/PlayerSeasonProjectionStats/{PROJECTION_SEASON}?'
+                       f'key={keys.SPORTDATAIO_FANTASY_DATA_KEY}'
+    }
+    return urls[source]
+
+
+def get_player_season_stats(response=None):
     """
     pulls the season stats of an individual player from the sportsdataio database and formats
-    the data into a dictionary with the unique player key of last name, position, team abbreviation
+    the data into a dictionary keyed by the sportsdata.io PlayerID
+    Parameters
+    ----------
+    response: requests.Response
+        optional response that was already fetched, if it is not given the stats are requested
 
     Returns
     -------
     dictionary containing the player's season stats
     """
     player_season_stats_dict = {}
-    response_sportsdataio_player_season_stats = requests.get(f'https://api.sportsdata.io/v3/nfl/stats/json/'
-                                                             f'PlayerSeasonStats/2021REG?'
-                                                             f'key={keys.SPORTDATAIO_FANTASY_DATA_KEY}')
+    response_sportsdataio_player_season_stats = response
+    if response_sportsdataio_player_season_stats is None:
+        response_sportsdataio_player_season_stats = fetch(source_url('season_stats'),
+                                                          timeout=SOURCE_TIMEOUTS['season_stats'])
     player_season_stats_results = response_sportsdataio_player_season_stats.json()
     for player in player_season_stats_results:
-        player_season_stats_dict[player['Name'].split(".")[1].casefold() + player['Position'].casefold() + player['Team'].casefold()] = player
+        player_season_stats_dict[str(player['PlayerID'])] = player
     return player_season_stats_dict
 
 
-def get_sportio_player_proj():
+def get_sportio_player_proj(response=None):
     """
     pulls the sportsio projections for the players for the upcoming and formats
-    the data into a dictionary with the unique player key of last name, position, team abbreviation
+    the data into a dictionary keyed by the sportsdata.io PlayerID
+    Parameters
+    ----------
+    response: requests.Response
+        optional response that was already fetched, if it is not given the projections are requested
+
     Returns
     -------
     dictionary containing the player's projection stats for the year
     """
     player_proj_stats_dict = {}
-    response_sportsdataio_player_proj_stats = requests.get(f'https://api.sportsdata.io/v3/nfl/projections/json/'
-                                                           f'PlayerSeasonProjectionStats/2022?'
-                                                           f'key={keys.SPORTDATAIO_FANTASY_DATA_KEY}')
+    response_sportsdataio_player_proj_stats = response
+    if response_sportsdataio_player_proj_stats is None:
+        response_sportsdataio_player_proj_stats = fetch(source_url('projections'),
+                                                        timeout=SOURCE_TIMEOUTS['projections'])
     player_proj_stats_results = response_sportsdataio_player_proj_stats.json()
     for player in player_proj_stats_results:
-        player_proj_stats_dict[player['Name'].split(" ")[1].casefold() + player['Position'].casefold() + player['Team'].casefold()] = player
+        player_proj_stats_dict[str(player['PlayerID'])] = player
     return player_proj_stats_dict
 
 
-def get_espn_player_projections():
+def open_text_file(path):
+    """
+    opens a text file for reading, decompressing it on the fly if its name ends in .gz, .bz2, .xz or .lzma
+    Parameters
+    ----------
+    path: str
+        the file to open
+
+    Returns
+    -------
+    the open file object
+    """
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(path)[1].casefold(), open)
+    return opener(path, 'rt', encoding='utf-8-sig', newline='')
+
+
+def parse_espn_value(column, value):
+    """
+    types one value of the espn projections. Placeholders like -- or #N/A become None
+    Parameters
+    ----------
+    column: str
+        the column the value is in
+    value: str
+        the value as it is written in the csv
+
+    Returns
+    -------
+    the value as an int, float or None
+    """
+    value = value.strip()
+    if value in ESPN_MISSING_VALUES:
+        return None
+    if column in ESPN_INTEGER_COLUMNS:
+        return int(value)
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'{column} is {value}')
+    return number
+
+
+def parse_espn_row(row):
     """
-    pulls the csv data containing top 300 players and the espn projection for their stats
+    types and validates one row of the espn projections
+    Parameters
+    ----------
+    row: dict
+        the row as read by csv.DictReader
+
+    Returns
+    -------
+    the typed row, PASSING_C/A is replaced by PASSING_CMP and PASSING_ATT, including values a spreadsheet
+    turned into dates
+
+    Raises
+    ------
+    ValueError
+        if a value can't be parsed or a required column is empty
+    """
+    if None in row:
+        raise ValueError('row has more values than the header')
+    parsed = {}
+    for column, value in row.items():
+        if value is None:
+            raise ValueError('row has fewer values than the header')
+        if column in ESPN_TEXT_COLUMNS:
+            parsed[column] = value.strip()
+        elif column == 'PASSING_C/A':
+            date = spreadsheet_date.match(value.strip())
+            if date is not None:
+                completions, attempts = str(MONTHS.index(date.group(2)) + 1), date.group(1)
+            else:
+                completions, _, attempts = value.partition('/')
+            try:
+                parsed['PASSING_CMP'] = parse_espn_value(column, completions)
+                parsed['PASSING_ATT'] = parse_espn_value(column, attempts)
+            except ValueError:
+                raise ValueError(f'{column} is not completions/attempts: {value!r}')
+        else:
+            try:
+                parsed[column] = parse_espn_value(column, value)
+            except ValueError:
+                raise ValueError(f'{column} is not a number: {value!r}')
+    for column in ESPN_REQUIRED_COLUMNS:
+        if parsed[column] in ('', None):
+            raise ValueError(f'{column} is empty')
+    return parsed
+
+
+def read_espn_rows(path=None, errors=None):
+    """
+    streams the typed rows of an espn projections csv one at a time, so only the row being parsed is held in
+    memory no matter how large the file is. Compressed files are read directly. Rows that fail validation are
+    skipped
+    Parameters
+    ----------
+    path: str
+        the csv file, optionally compressed, defaults to ESPN_PROJECTIONS_FILE
+    errors: list
+        optional list that (line number, message) is appended to for every row that was skipped
+
+    Returns
+    -------
+    a generator of typed row dictionaries
+    """
+    path = ESPN_PROJECTIONS_FILE if path is None else path
+    with open_text_file(path) as projections_file:
+        reader = csv.DictReader(projections_file)
+        missing = [column for column in ESPN_REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f'{path} is missing the columns {", ".join(missing)}')
+        for row in reader:
+            try:
+                yield parse_espn_row(row)
+            except ValueError as error:
+                if errors is not None:
+                    errors.append((reader.line_num, str(error)))
+
+
+def get_espn_player_projections(path=None):
+    """
+    reads the csv data containing the espn projection for each player's stats, parsing, typing, validating and
+    keying the rows in one pass
+    Parameters
+    ----------
+    path: str
+        the csv file, optionally compressed, defaults to ESPN_PROJECTIONS_FILE
+
     Returns
     -------
     a dictionary of dictionary items representing espn player values with the key being
     last name, position, team abbreviation
     """
-    espn_proj_2022 = []
-    espn_proj_2022_dict = {}
-    with open('Fantasy Football 2022.csv', 'r', encoding='utf-8-sig', newline='') as espn_proj_2022_file:
-        reader = csv.DictReader(espn_proj_2022_file)
-        for row in reader:
-            espn_proj_2022.append(row)
-    for player in espn_proj_2022:
-        espn_proj_2022_dict[player['PLAYER'].split(" ")[1].casefold()
-                            + player['Position'].casefold()
-                            + player['Team'].casefold()] = player
-    for player in espn_proj_2022_dict:
-        type_convert = espn_proj_2022_dict[player]['FFP_TOTAL']
-        type_convert = float(type_convert)
-        espn_proj_2022_dict[player]['FFP_TOTAL'] = type_convert
-    return espn_proj_2022_dict
+    path = ESPN_PROJECTIONS_FILE if path is None else path
+    errors = []
+    duplicates = []
+    espn_proj_dict = key_rows(read_espn_rows(path, errors), 'PLAYER', 'Position', 'Team', duplicates)
+    if errors:
+        line, message = errors[0]
+        print(f'Skipped {len(errors)} invalid rows in {path}, the first on line {line}: {message}')
+    if duplicates:
+        print(f'{len(duplicates)} players are in {path} more than once, the last row of each is kept: '
+              f'{", ".join(duplicates)}')
+    return espn_proj_dict
+
+
+class ContractTableParser(HTMLParser):
+    """
+    class ContractTableParser reads the cells of the overthecap contracts table as the page is fed to it,
+    without building a parse tree. Everything outside the table is ignored, and so are the cells of any table
+    nested inside it. Cells and rows that are never closed are ended by the next cell or row like a browser does
+
+    Attributes
+    ----------
+    rows: list
+        the text of each cell of each row, heading rows included
+    done: bool
+        whether the end of the contracts table has been read
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.done = False
+        self.in_table = False
+        self.nested_tables = 0
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            if self.in_table:
+                self.nested_tables += 1
+            elif CONTRACT_TABLE_CLASS in (dict(attrs).get('class') or '').split():
+                self.in_table = True
+        elif self.in_table and not self.nested_tables:
+            if tag in ('td', 'th'):
+                self._end_cell()
+                self.cell = []
+            elif tag == 'tr':
+                self._end_row()
+                self.row = []
+
+    def handle_endtag(self, tag):
+        if not self.in_table:
+            return
+        if tag == 'table':
+            if self.nested_tables:
+                self.nested_tables -= 1
+            else:
+                self._end_row()
+                self.in_table = False
+                self.done = True
+        elif self.nested_tables:
+            return
+        elif tag in ('td', 'th'):
+            self._end_cell()
+        elif tag == 'tr':
+            self._end_row()
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def _end_cell(self):
+        if self.cell is not None and self.row is not None:
+            self.row.append(' '.join(''.join(self.cell).split()))
+        self.cell = None
+
+    def _end_row(self):
+        self._end_cell()
+        if self.row:
+            self.rows.append(self.row)
+        self.row = None
+
 
+def contract_heading(heading):
+    return CONTRACT_HEADINGS.get(''.join(character for character in heading.casefold() if character.isalnum()))
 
-def get_nfl_player_contracts():
+
+def parse_contract_table(html, unknown_teams=None, dropped_rows=None):
+    """
+    reads the player rows of an overthecap contracts table. The page is skipped up to the table and parsing
+    stops at its end, and each cell is matched to its column by the table's headings so a column that is
+    added, removed or moved can't shift the values of the other columns. Rows with a different number of
+    cells than there are headings are dropped instead of being misread, and can be collected to be reported
+    Parameters
+    ----------
+    html: str
+        the overthecap page
+    unknown_teams: set
+        optional set that team names missing from TEAM_NAMES are added to
+    dropped_rows: list
+        optional list that the cells of every dropped row are added to
+
+    Returns
+    -------
+    list of contract row dictionaries
+
+    Raises
+    ------
+    ValueError
+        if the page has no contracts table or the table is missing a column needed to blend players
+    """
+    table_start = contract_table_start.search(html)
+    parser = ContractTableParser()
+    position = table_start.start() if table_start is not None else 0
+    while position < len(html) and not parser.done:
+        parser.feed(html[position:position + HTML_CHUNK_SIZE])
+        position += HTML_CHUNK_SIZE
+    parser.close()
+    if not parser.rows:
+        raise ValueError('the page has no contracts table')
+    fields = [contract_heading(heading) for heading in parser.rows[0]]
+    missing = [field for field in CONTRACT_REQUIRED_FIELDS if field not in fields]
+    if missing:
+        raise ValueError(f'the contracts table has no {", ".join(missing)} column')
+    team_abbreviations = set(TEAM_NAMES.values())
+    rows = []
+    for cells in parser.rows[1:]:
+        if len(cells) != len(fields):
+            if dropped_rows is not None:
+                dropped_rows.append(cells)
+            continue
+        row = {field: cell for field, cell in zip(fields, cells) if field is not None}
+        team = row['Team']
+        if team in TEAM_NAMES:
+            row['Team'] = TEAM_NAMES[team]
+        elif team not in team_abbreviations and unknown_teams is not None:
+            unknown_teams.add(team)
+        rows.append(row)
+    return rows
+
+
+def get_nfl_player_contracts(response=None, positions=None):
     """
     Web-scrapes nfl player contract data from overthecap.com and returns a dictionary with
-    the key of a unique id based on player's last name, position, and team
+    the key of a unique id based on player's last name, position, and team. The contracts page and
+    any position pages are requested at the same time
+    Parameters
+    ----------
+    response: requests.Response
+        optional response that was already fetched, if it is not given the page is requested
+    positions: tuple
+        overthecap position pages to add to the contracts page, CONTRACT_POSITIONS if not given
+
     Returns
     -------
     player_salary_information_dict: dict
         dictionary of player salary information
     """
-    player_salary_information = []
-    player_salary_information_dict = {}
-    nfl_contract_url = 'https://overthecap.com/contracts'
-    response = requests.get(nfl_contract_url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    player_contracts = soup.find('table', class_="sortable controls-table")
-    for x in player_contracts.find_all('td'):
-        player_salary_information.append(x.string)
-    player_salary_list = grouper(player_salary_information, 8, None)
-    for player in player_salary_list:
-        player_salary_information_dict[player[0].split(" ")[1].casefold()
-                                       + player[1].casefold()
-                                       + TEAM_NAMES[player[2]].casefold()] = {
-            'Name': player[0],
-            'Position': player[1],
-            'Team': TEAM_NAMES[player[2]],
-            'Total Value': player[3],
-            'APY': player[4],
-            'Total Guaranteed': player[5],
-            'AVG Annual Guarantee': player[6],
-            'Percent Guaranteed': player[7]
-        }
+    positions = CONTRACT_POSITIONS if positions is None else positions
+    urls = [OVERTHECAP_POSITION_URL.format(position) for position in positions]
+    if response is None:
+        urls.insert(0, source_url('contracts'))
+    pages = [response.text] if response is not None else []
+    if urls:
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            responses = executor.map(lambda url: fetch(url, timeout=SOURCE_TIMEOUTS['contracts']), urls)
+            pages.extend(page_response.text for page_response in responses)
+    unknown_teams = set()
+    dropped_rows = []
+    player_salary_rows = []
+    for page in pages:
+        player_salary_rows.extend(parse_contract_table(page, unknown_teams, dropped_rows))
+    if unknown_teams:
+        print(f'Contracts for unknown teams kept as they are: {", ".join(sorted(unknown_teams))}')
+    if dropped_rows:
+        examples = '; '.join(' | '.join(cells[:3]) for cells in dropped_rows[:3])
+        print(f'Dropped {len(dropped_rows)} contract rows whose cells did not match the table headings, '
+              f'for example: {examples}')
+    player_salary_information_dict = key_rows(player_salary_rows, 'Name', 'Position', 'Team')
     return player_salary_information_dict
 
 
+def read_json_file(path):
+    """
+    reads a json cache file from disk
+    Parameters
+    ----------
+    path: str
+        path to the cache file
+
+    Returns
+    -------
+    the loaded dictionary, or an empty dictionary if the file is missing or not valid json
+    """
+    try:
+        with open(path, 'r') as cache_file:
+            return json.load(cache_file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as error:
+        print(f'Ignoring unreadable cache file {path}: {error}')
+        return {}
+
+
+def write_json_file(path, contents):
+    """
+    atomically writes a dictionary to a json cache file on disk, so a crash part way through
+    leaves the previous file in place instead of a truncated one
+    Parameters
+    ----------
+    path: str
+        path to the cache file
+    contents: dict
+        the dictionary to save
+
+    Returns
+    -------
+    None
+    """
+    atomic_write(path, [json.dumps(contents).encode('utf-8')])
+
+
 def open_cache():
     """
     the cache file if it exists and loads the JSON into
@@ -176,14 +677,7 @@ def open_cache():
     -------
     The opened cache
     """
-    try:
-        cache_file = open('Player_Cached_Data.json', 'r')
-        cache_contents = cache_file.read()
-        cache_dict = json.loads(cache_contents)
-        cache_file.close()
-    except:
-        cache_dict = {}
-    return cache_dict
+    return read_json_file(PLAYER_CACHE_FILE)
 
 
 def save_cache(cache_dict):
@@ -196,63 +690,433 @@ def save_cache(cache_dict):
     -------
     None
     """
-    dumped_json_cache = json.dumps(cache_dict)
-    fw = open('Player_Cached_Data.json', "w")
-    fw.write(dumped_json_cache)
-    fw.close()
+    write_json_file(PLAYER_CACHE_FILE, cache_dict)
+
+
+def open_source_cache():
+    """
+    opens the per-source cache. Every source has its own entry holding the formatted data,
+    when it was fetched, and the ETag / Last-Modified validators needed to revalidate it
+
+    Returns
+    -------
+    dictionary of source name to cache entry
+    """
+    return read_json_file(SOURCE_CACHE_FILE)
+
+
+def save_source_cache(source_cache):
+    """ saves the per-source cache to disk
+    Parameters
+    ----------
+    source_cache: dict
+        dictionary of source name to cache entry
+    Returns
+    -------
+    None
+    """
+    write_json_file(SOURCE_CACHE_FILE, source_cache)
+
+
+def is_stale(entry, ttl, now=None):
+    """
+    checks if a source cache entry is older than its time to live. An entry whose last refresh failed less than
+    SOURCE_RETRY_INTERVAL ago isn't stale yet, its old data is used until the source is tried again
+    Parameters
+    ----------
+    entry: dict
+        the source cache entry, may be empty if the source was never fetched
+    ttl: float
+        seconds the entry is trusted for
+    now: float
+        the current unix time, defaults to time.time()
+
+    Returns
+    -------
+    True if the entry needs to be revalidated
+    """
+    now = time.time() if now is None else now
+    if 'attempted_at' in entry and now - entry['attempted_at'] < SOURCE_RETRY_INTERVAL:
+        return False
+    return 'fetched_at' not in entry or now - entry['fetched_at'] >= ttl
+
+
+def espn_file_version():
+    """
+    identifies the contents of the espn csv without reading it
+    Returns
+    -------
+    list of the row format, the file's modification time in nanoseconds and its size, None if there is no file
+    """
+    try:
+        stat = os.stat(ESPN_PROJECTIONS_FILE)
+    except OSError:
+        return None
+    return [ESPN_ROW_FORMAT, stat.st_mtime_ns, stat.st_size]
+
+
+def source_is_stale(source, entry, now=None):
+    """
+    checks if a source needs to be revalidated, the espn csv when it isn't the file its cache entry was read from
+    and the remote sources when is_stale says their entry is past its time to live
+    Parameters
+    ----------
+    source: str
+        name of the source
+    entry: dict
+        the source's cache entry
+    now: float
+        the current unix time, defaults to time.time()
+
+    Returns
+    -------
+    True if the source needs to be revalidated
+    """
+    if source == 'espn':
+        return entry.get('file_version') != espn_file_version()
+    return is_stale(entry, SOURCE_TTLS[source], now)
+
+
+def conditional_fetch(source, entry):
+    """
+    requests a remote source sending the validators from its cache entry, so an unchanged source
+    only costs a 304 response instead of the full download
+    Parameters
+    ----------
+    source: str
+        name of the remote source
+    entry: dict
+        the source's cache entry
+
+    Returns
+    -------
+    response: requests.Response
+        the response, None if the server said the cached copy is still current
+    """
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    response = fetch(source_url(source), timeout=SOURCE_TIMEOUTS[source], headers=headers)
+    if response.status_code == 304:
+        return None
+    return response
+
+
+def load_source(source, entry):
+    """
+    revalidates one source against its cache entry
+    Parameters
+    ----------
+    source: str
+        name of the source, either espn, contracts, season_stats or projections
+    entry: dict
+        the source's cache entry
+
+    Returns
+    -------
+    new_entry: dict
+        the updated cache entry, with 'data' left as it was if the source has not changed
+    changed: bool
+        whether the source returned new data
+    """
+    start = time.perf_counter()
+    try:
+        return _load_source(source, entry)
+    finally:
+        source_load_seconds.observe(time.perf_counter() - start, source=source)
+
+
+def _load_source(source, entry):
+    new_entry = dict(entry)
+    new_entry['fetched_at'] = time.time()
+    new_entry.pop('attempted_at', None)
+    if source == 'espn':
+        # the csv is local, so its modification time and size stand in for an ETag
+        file_version = espn_file_version()
+        if 'data' in entry and entry.get('file_version') == file_version:
+            return new_entry, False
+        new_entry['data'] = get_espn_player_projections()
+        new_entry['file_version'] = file_version
+        for field in ('last_modified', 'format'):
+            new_entry.pop(field, None)
+        return new_entry, True
+    response = conditional_fetch(source, entry if 'data' in entry else {})
+    if response is None:
+        return new_entry, False
+    formatters = {
+        'contracts': get_nfl_player_contracts,
+        'season_stats': get_player_season_stats,
+        'projections': get_sportio_player_proj
+    }
+    new_entry['data'] = formatters[source](response=response)
+    new_entry['etag'] = response.headers.get('ETag')
+    new_entry['last_modified'] = response.headers.get('Last-Modified')
+    return new_entry, True
+
+
+def refresh_sources(source_cache):
+    """
+    revalidates every stale source at the same time on a thread pool so a cold start only waits on the
+    slowest source instead of all of them added together. A source that still fails after its retries is
+    reported and keeps its old cache entry so the other sources can still be blended, with the time of the failed
+    attempt so it isn't tried again before SOURCE_RETRY_INTERVAL
+    Parameters
+    ----------
+    source_cache: dict
+        dictionary of source name to cache entry, updated in place
+
+    Returns
+    -------
+    changed_players: dict
+        dictionary of source name to the set of player keys whose data changed in that source
+    """
+    stale = [source for source in SOURCE_TTLS if source_is_stale(source, source_cache.get(source, {}))]
+    for source in SOURCE_TTLS:
+        if source not in stale:
+            source_cache_lookups.inc(source=source, result='hit')
+    changed_players = {}
+    if not stale:
+        return changed_players
+    with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+        futures = {source: executor.submit(load_source, source, source_cache.get(source, {})) for source in stale}
+        for source, future in futures.items():
+            try:
+                new_entry, changed = future.result()
+            except Exception as error:
+                source_cache_lookups.inc(source=source, result='error')
+                # only the host is printed, the urls of the sportsdata.io sources have the api key in them
+                origin = ESPN_PROJECTIONS_FILE if source == 'espn' else urlsplit(source_url(source)).netloc
+                print(f'Could not refresh {source} data from {origin}, using what is cached: {redact(repr(error))}')
+                source_cache[source] = dict(source_cache.get(source, {}), attempted_at=time.time())
+                continue
+            source_cache_lookups.inc(source=source, result='miss' if changed else 'not_modified')
+            if changed:
+                old_data = source_cache.get(source, {}).get('data', {})
+                new_data = new_entry['data']
+                changed_players[source] = {player for player in old_data.keys() | new_data.keys()
+                                           if old_data.get(player) != new_data.get(player)}
+            source_cache[source] = new_entry
+    return changed_players
+
+
+def espn_identity(row):
+    return identity_keys(row['PLAYER'], row['Position'], row['Team'])
+
+
+def contract_identity(row):
+    return identity_keys(row['Name'], row['Position'], row['Team'])
+
+
+def sportsdata_identity(row):
+    return identity_keys(row['Name'], row['Position'], row['Team'], row.get('PlayerID'))
+
+
+def join_players(source_cache):
+    """
+    matches every espn projection to its contract, season stats and sportsdata.io projection rows
+    Parameters
+    ----------
+    source_cache: dict
+        dictionary of source name to cache entry
+
+    Returns
+    -------
+    matches: dict
+        dictionary of source name to a dictionary of espn player key to the source key it matched
+    reports: list
+        a JoinReport for every source
+    """
+    # projections go first so the PlayerID they match on can be used to match the season stats
+    sources = {
+        'projections': (source_cache.get('projections', {}).get('data', {}), sportsdata_identity),
+        'season_stats': (source_cache.get('season_stats', {}).get('data', {}), sportsdata_identity),
+        'contracts': (source_cache.get('contracts', {}).get('data', {}), contract_identity)
+    }
+    return join_sources(source_cache.get('espn', {}).get('data', {}), espn_identity, sources)
+
+
+def blend_player(espn_row, salary_row, season_row, sportio_proj_row, source_keys):
+    """
+    creates the blended record of one player from its espn projection row and the rows it matched
+    in the other data sources
+    Parameters
+    ----------
+    espn_row: dict
+        the player's row from the espn projections, it is copied and not changed
+    salary_row: dict
+        the player's contract data, None if there was no match
+    season_row: dict
+        the player's stats from last season, None if there was no match
+    sportio_proj_row: dict
+        the player's sportsdata.io projection, None if there was no match
+    source_keys: dict
+        dictionary of source name to the key of the row that was matched, kept to tell when a match changes
+
+    Returns
+    -------
+    dictionary of the player's espn projection record augmented with the other data sources
+    """
+    record = dict(espn_row)
+    record['Source_Keys'] = source_keys
+    if salary_row is not None:
+        record['Total_Salary'] = salary_row['Total Value']
+        record['Annual_Salary'] = salary_row['APY']
+        record['Percent_Guaranteed'] = salary_row['Percent Guaranteed']
+    else:
+        record['Total_Salary'] = '0'
+        record['Annual_Salary'] = '0'
+        record['Percent_Guaranteed'] = '0'
+    if season_row is not None:
+        record['Games Played'] = season_row['Played']
+        record['Historic Fantasy Points'] = [season_row['FantasyPointsFanDuel'],
+                                             season_row['FantasyPointsDraftKings'],
+                                             season_row['FantasyPointsYahoo'],
+                                             season_row['FantasyPointsFantasyDraft'],
+                                             season_row['FantasyPointsPPR']]
+    else:
+        record['Games Played'] = 0
+        record['Historic Fantasy Points'] = 0
+    if sportio_proj_row is not None:
+        record['Fantasy Projections'] = [record['FFP_TOTAL'],
+                                         sportio_proj_row['FantasyPointsFanDuel'],
+                                         sportio_proj_row['FantasyPointsDraftKings'],
+                                         sportio_proj_row['FantasyPointsYahoo'],
+                                         sportio_proj_row['FantasyPointsFantasyDraft'],
+                                         sportio_proj_row['FantasyPointsPPR']]
+    return record
+
+
+def populated_fields(player_data):
+    """
+    counts the fields from the remote sources that have a value across all the blended records
+    Parameters
+    ----------
+    player_data: dict
+        dictionary of player_uuid to blended player record
+
+    Returns
+    -------
+    the number of populated fields
+    """
+    return sum(1 for record in player_data.values() for fields in SOURCE_FIELDS.values() for field in fields
+               if record.get(field) not in (None, 0, '0'))
 
 
 def player_data_blend():
     """
-    This function calls all the data request functions and creates a dictionary of espn projection
-    records with augmented data from the other data sources to be used to create the player objects
+    This function revalidates the stale data sources and creates a dictionary of espn projection
+    records with augmented data from the other data sources to be used to create the player objects.
+    The sources are matched with join_players, and only the players whose matched rows changed are
+    blended again, everyone else is taken from the blended cache. The result is also written to the
+    player snapshot. A source that has no data, because it was never fetched and is down, keeps its
+    fields from the blended cache, and a blend with fewer populated fields than the cache isn't saved
+    while a source is missing
 
     Returns
     -------
     dictionary of top 300 players with augmented data from all data sources
     """
-    espn_proj_data = open_cache()
-    if espn_proj_data == {}:
-        espn_proj_data = get_espn_player_projections()
-        player_salary_data = get_nfl_player_contracts()
-        player_season_data = get_player_season_stats()
-        sportio_proj_data = get_sportio_player_proj()
-
-        for player in espn_proj_data:
-            if player in player_salary_data:
-                espn_proj_data[player]['Total_Salary'] = player_salary_data[player]['Total Value']
-                espn_proj_data[player]['Annual_Salary'] = player_salary_data[player]['APY']
-                espn_proj_data[player]['Percent_Guaranteed'] = player_salary_data[player]['Percent Guaranteed']
-            else:
-                espn_proj_data[player]['Total_Salary'] = '0'
-                espn_proj_data[player]['Annual_Salary'] = '0'
-                espn_proj_data[player]['Percent_Guaranteed'] = '0'
-            if player in player_season_data:
-                espn_proj_data[player]['Games Played'] = player_season_data[player]['Played']
-                espn_proj_data[player]['Historic Fantasy Points'] = [player_season_data[player]['FantasyPointsFanDuel'],
-                                                                     player_season_data[player]['FantasyPointsDraftKings'],
-                                                                     player_season_data[player]['FantasyPointsYahoo'],
-                                                                     player_season_data[player]['FantasyPointsFantasyDraft'],
-                                                                     player_season_data[player]['FantasyPointsPPR']]
-            else:
-                espn_proj_data[player]['Games Played'] = 0
-                espn_proj_data[player]['Historic Fantasy Points'] = 0
-            if player in sportio_proj_data:
-                espn_proj_data[player]['Fantasy Projections'] = [espn_proj_data[player]['FFP_TOTAL'],
-                                                                 sportio_proj_data[player]['FantasyPointsFanDuel'],
-                                                                 sportio_proj_data[player]['FantasyPointsDraftKings'],
-                                                                 sportio_proj_data[player]['FantasyPointsYahoo'],
-                                                                 sportio_proj_data[player]['FantasyPointsFantasyDraft'],
-                                                                 sportio_proj_data[player]['FantasyPointsPPR']]
-
-        save_cache(espn_proj_data)
-        return espn_proj_data
+    start = time.perf_counter()
+    blended_data = open_cache()
+    source_cache = open_source_cache()
+    changed_players = refresh_sources(source_cache)
+    if not changed_players and blended_data:
+        save_source_cache(source_cache)
+        save_player_snapshot(blended_data, source_cache)
+        blend_seconds.observe(time.perf_counter() - start)
+        blended_players.set(len(blended_data))
+        return blended_data
+
+    espn_proj_data = source_cache.get('espn', {}).get('data', {})
+    missing = [source for source in SOURCE_FIELDS if 'data' not in source_cache.get(source, {})]
+    cached_fields = populated_fields(blended_data)
+    matches, reports = join_players(source_cache)
+    for report in reports:
+        print(report)
+    for player in list(blended_data):
+        if player not in espn_proj_data:
+            del blended_data[player]
+    for player, espn_row in espn_proj_data.items():
+        record = blended_data.get(player)
+        old_keys = (record.get('Source_Keys') or {}) if record is not None else {}
+        source_keys = {source: old_keys.get(source) if source in missing else matches[source].get(player)
+                       for source in matches}
+        if (record is not None and player not in changed_players.get('espn', ())
+                and record.get('Source_Keys') == source_keys
+                and not any(key in changed_players.get(source, ()) for source, key in source_keys.items())):
+            continue
+        rows = {source: source_cache[source]['data'][key] if key is not None and source not in missing else None
+                for source, key in source_keys.items()}
+        new_record = blend_player(espn_row, rows['contracts'], rows['season_stats'], rows['projections'],
+                                  source_keys)
+        for source in missing:
+            for field in SOURCE_FIELDS[source]:
+                if record is not None and field in record:
+                    new_record[field] = record[field]
+        blended_data[player] = new_record
+
+    save_source_cache(source_cache)
+    if missing and populated_fields(blended_data) < cached_fields:
+        print(f'Not saving the blend, {", ".join(missing)} had no data and it would lose fields from the cache')
     else:
-        return espn_proj_data
+        save_cache(blended_data)
+        save_player_snapshot(blended_data, source_cache)
+    blend_seconds.observe(time.perf_counter() - start)
+    blended_players.set(len(blended_data))
+    return blended_data
+
 
+def save_player_snapshot(player_data, source_cache):
+    """
+    writes the blended players to the snapshot file, recording when each source was last fetched, when a
+    failed refresh of it was last attempted and which version of the espn csv was read
+    Parameters
+    ----------
+    player_data: dict
+        dictionary of player_uuid to blended player record
+    source_cache: dict
+        dictionary of source name to cache entry
+
+    Returns
+    -------
+    None
+    """
+    metadata = {field: {source: entry[field] for source, entry in source_cache.items() if field in entry}
+                for field in SNAPSHOT_SOURCE_FIELDS}
+    write_player_snapshot(PLAYER_SNAPSHOT_FILE, player_data, metadata)
 
 
+def read_player_snapshot():
+    """
+    opens the snapshot player_data_blend last wrote without checking if its sources are stale, for the worker
+    processes that leave refreshing to another one
 
+    Returns
+    -------
+    the Snapshot, or None if there is no readable snapshot
+    """
+    return open_snapshot(PLAYER_SNAPSHOT_FILE)
 
 
+def load_player_data():
+    """
+    loads the players for the application. If the snapshot file was built from the espn csv as it is now and
+    from remote sources that are all still within their time to live, or were tried again recently and failed,
+    it is memory mapped and used as is, otherwise the sources are revalidated and blended again with
+    player_data_blend
 
+    Returns
+    -------
+    mapping of player_uuid to blended player record
+    """
+    snapshot = open_snapshot(PLAYER_SNAPSHOT_FILE)
+    if snapshot is not None:
+        recorded = {field: snapshot.metadata.get(field, {}) for field in SNAPSHOT_SOURCE_FIELDS}
+        if not any(source_is_stale(source, {field: values[source] for field, values in recorded.items()
+                                            if source in values})
+                   for source in SOURCE_TTLS):
+            return snapshot
+        snapshot.close()
+    return player_data_blend()
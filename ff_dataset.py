@@ -0,0 +1,259 @@
+# This module bundles everything the application serves from the player data into one immutable
+# PlayerDataset, and keeps the current dataset fresh from a background thread. A refresh builds a whole
+# new dataset next to the one being served and swaps it in with a single assignment, so requests never
+# wait on a refresh and never see half of the old data and half of the new.
+import hashlib
+import os
+import threading
+import time
+
+# fcntl is only on unix, elsewhere every process refreshes on its own
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import ff_history as history_store
+import ff_objects as obj
+import ff_query as query_engine
+from ff_httpcache import ResponseCache
+
+# seconds between checks for new data, the sources' own time to live decides if anything is fetched
+REFRESH_INTERVAL = int(os.environ.get('FF_REFRESH_INTERVAL', 15 * 60))
+
+
+def table_version(table):
+    """
+    fingerprints the contents of a PlayerTable, so two datasets built from the same data have the same version
+    no matter when or in which process they were built
+    Parameters
+    ----------
+    table: PlayerTable
+        the players
+
+    Returns
+    -------
+    str
+        a short hex digest
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for column in (table.player_uuid, table.name, table.pos, table.team, table.contract_value_str,
+                   table.percent_guaranteed_str):
+        digest.update('\0'.join(column).encode('utf-8'))
+        digest.update(b'\1')
+    for column in (table.historic_points, table.projections, table.ffp_total, table.games_played, table.career_ffp,
+                   table.recent_ffp):
+        digest.update(column.tobytes())
+    return digest.hexdigest()
+
+
+class PlayerDataset:
+    """
+    class PlayerDataset is one consistent, read only version of everything built from the player data: the
+    table, the PlayerNode list, the search tree and the indexes. A request takes the current dataset once
+    and uses it to the end, so it keeps working on the same data even if a refresh swaps in a new one
+
+    Parameters
+    ----------
+    player_data: mapping
+        the blended player dictionary or a Snapshot
+    history: HistoryStore
+        where the players' career and recent averages come from, the synced store on disk if not given
+    Attributes
+    ----------
+    table: PlayerTable
+    players: list
+        a PlayerNode per table row
+    tree: AVLTree
+        the players keyed by player_uuid
+    name_index: NameIndex
+    sort_index: PlayerSortIndex
+    risky_engine: QueryEngine
+    groups: GroupIndex
+        the players by team and position with each group's totals
+    history: HistoryStore
+        the store the averages came from, None if there is no store
+    version: str
+        fingerprint of the data, see table_version
+    responses: ResponseCache
+        the pages and api responses rendered from this dataset
+    built_at: float
+        unix time the dataset was built
+    """
+    __slots__ = ('table', 'players', 'tree', 'name_index', 'sort_index', 'risky_engine', 'groups', 'history',
+                 'version', 'responses', 'built_at', 'metadata')
+
+    def __init__(self, player_data, history=None):
+        table = obj.PlayerTable.from_player_data(player_data)
+        history = history_store.open_store() if history is None else history
+        if history is not None:
+            table.add_history(history)
+        players = table.nodes()
+        tree = obj.AVLTree()
+        tree.build(players)
+        version = table_version(table)
+        risky_engine = query_engine.QueryEngine(table)
+        values = {
+            'table': table,
+            'players': players,
+            'tree': tree,
+            'name_index': obj.NameIndex(players, limit=25),
+            'sort_index': obj.PlayerSortIndex(table),
+            'risky_engine': risky_engine,
+            'groups': obj.GroupIndex(table, risky_engine.mask(query_engine.RiskQuery())),
+            'history': history,
+            'version': version,
+            'responses': ResponseCache(version),
+            'built_at': time.time(),
+            'metadata': dict(getattr(player_data, 'metadata', {}))
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('a PlayerDataset can not be changed, build a new one instead')
+
+    def __len__(self):
+        return len(self.players)
+
+
+class DatasetRefresher:
+    """
+    class DatasetRefresher holds the dataset the application is serving and rebuilds it in the background.
+    Reading the current dataset is a plain attribute read and never takes a lock. A new dataset is only
+    swapped in when its version differs, and a refresh that fails keeps serving the old one.
+    With a shared_path, the worker processes of one server take turns through a lock file next to it: the
+    process holding the lock is the only one that calls load, and the others call reload only when the file
+    load saves to has been modified, so the sources aren't refreshed once per worker
+
+    Parameters
+    ----------
+    load: callable
+        returns the player data, like ff_datamgmt.load_player_data
+    interval: float
+        seconds between background refreshes
+    reload: callable
+        returns the data load last saved to shared_path without refreshing anything, or None if there is none
+    shared_path: str
+        the file load saves the data to, like ff_datamgmt.PLAYER_SNAPSHOT_FILE
+    Methods
+    -------
+    refresh()
+        loads and builds a new dataset now and swaps it in if the data changed
+    reload_if_changed()
+        builds a new dataset from reload if the shared file changed since it was last read
+    start()
+        builds the first dataset if there is none and starts the background thread
+    ensure_started()
+        starts the background thread if this process doesn't have one yet, for example after a fork
+    stop()
+        stops the background thread
+    """
+    def __init__(self, load, interval=REFRESH_INTERVAL, reload=None, shared_path=None):
+        self.load = load
+        self.interval = interval
+        self.reload = reload
+        self.shared_path = shared_path
+        self.current = None
+        self.refreshes = 0
+        self.failures = 0
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock_file = None
+        self._shared_stat = None
+
+    def _stat_shared(self):
+        try:
+            stat = os.stat(self.shared_path)
+        except (OSError, TypeError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _swap(self, player_data):
+        dataset = PlayerDataset(player_data)
+        if self.current is not None and dataset.version == self.current.version:
+            return False
+        self.current = dataset
+        self.refreshes += 1
+        return True
+
+    def refresh(self):
+        # only one refresh builds at a time, readers never take this lock
+        with self._refresh_lock:
+            player_data = self.load()
+            self._shared_stat = self._stat_shared()
+            return self._swap(player_data)
+
+    def reload_if_changed(self):
+        with self._refresh_lock:
+            shared_stat = self._stat_shared()
+            if shared_stat is None or shared_stat == self._shared_stat:
+                return False
+            player_data = self.reload()
+            if player_data is None:
+                return False
+            self._shared_stat = shared_stat
+            return self._swap(player_data)
+
+    def is_leader(self):
+        """
+        takes the refresh lock next to shared_path if no other process holds it, and keeps it for as long as this
+        process runs, so a new leader takes over when the old one exits
+        Returns
+        -------
+        True if this process is the one that refreshes
+        """
+        if self.shared_path is None or self.reload is None or fcntl is None:
+            return True
+        if self._lock_file is None:
+            lock_file = open(self.shared_path + '.lock', 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                if self.refresh() if self.is_leader() else self.reload_if_changed():
+                    print(f'Refreshed player data to version {self.current.version}')
+            except Exception as error:
+                self.failures += 1
+                print(f'Could not refresh the player data, still serving version {self.current.version}: '
+                      f'{error!r}')
+
+    def start(self):
+        if self.current is None:
+            self.refresh()
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='dataset-refresher', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        return self
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # threads don't survive a fork, so a forked worker starts its own with fresh locks, and the
+                # refresh lock file is taken again so only one of the workers holds it
+                self._refresh_lock = threading.Lock()
+                self._thread = None
+                self._lock_file = None
+            self.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,339 @@
+# This module keeps the players' stats from every season and week that has been fetched in a local SQLite
+# database, so trends across seasons can be worked out without asking sportsdata.io again. Syncing only
+# fetches the weeks that aren't stored yet, plus the week that is still being played, and the application
+# reads each player's career and recent averages from the store when it builds its data.
+# Run it with:  python ff_history.py --seasons 2019 2020 2021 2022 --week 6
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import ff_datamgmt as dm
+import ff_keys as keys
+from ff_identity import canonical_name, normalize_position, normalize_team
+
+HISTORY_DB_FILE = 'Player_History.sqlite'
+# the stores open_store has opened, by path
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+# weeks averaged for a player's recent points
+ROLLING_WEEKS = 4
+# the stat the career and recent averages are taken of
+TREND_COLUMN = 'ppr'
+# sportsdata.io field stored in each stat column
+STAT_FIELDS = {
+    'games': 'Played',
+    'fantasy_points': 'FantasyPoints',
+    'ppr': 'FantasyPointsPPR',
+    'fanduel': 'FantasyPointsFanDuel',
+    'draftkings': 'FantasyPointsDraftKings',
+    'yahoo': 'FantasyPointsYahoo',
+    'fantasydraft': 'FantasyPointsFantasyDraft'
+}
+STAT_COLUMNS = ', '.join(f'{column} {"INTEGER" if column == "games" else "REAL"}' for column in STAT_FIELDS)
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    pos TEXT NOT NULL,
+    team TEXT NOT NULL,
+    season INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_by_name ON players (name_key, pos);
+CREATE TABLE IF NOT EXISTS season_stats (
+    player_id INTEGER NOT NULL,
+    season INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    {STAT_COLUMNS},
+    PRIMARY KEY (player_id, season)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS weekly_stats (
+    player_id INTEGER NOT NULL,
+    season INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    {STAT_COLUMNS},
+    PRIMARY KEY (player_id, season, week)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS weekly_by_week ON weekly_stats (season, week);
+CREATE TABLE IF NOT EXISTS ingested (
+    season INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    players INTEGER NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (season, week)
+) WITHOUT ROWID;
+"""
+
+
+def season_weeks(season):
+    # the regular season went from 17 to 18 weeks in 2021
+    return 18 if season >= 2021 else 17
+
+
+def season_stats_url(season):
+    return (f'{dm.SPORTSDATAIO_BASE_URL}/stats/json/PlayerSeasonStats/{season}REG?'
+            f'key={keys.SPORTDATAIO_FANTASY_DATA_KEY}')
+
+
+def weekly_stats_url(season, week):
+    return (f'{dm.SPORTSDATAIO_BASE_URL}/stats/json/PlayerGameStatsByWeek/{season}REG/{week}?'
+            f'key={keys.SPORTDATAIO_FANTASY_DATA_KEY}')
+
+
+class HistoryStore:
+    """
+    class HistoryStore is the SQLite database of every stored season and week of player stats. Season totals are
+    stored as week 0 of the ingested log, so what has been fetched is one table, and the log records if each
+    week or season was over when it was fetched so one that was still being played is fetched again. Each thread
+    gets its own connection, and a forked process opens new ones instead of sharing its parent's
+
+    Parameters
+    ----------
+    path: str
+        the database file, created with its tables if it doesn't exist
+    Methods
+    -------
+    store(season, week, rows, complete)
+        replaces the stats of one week, or of the whole season when week is 0, with sportsdata.io rows
+    stored_weeks(season)
+        returns the weeks of a season that are stored and were over when fetched, 0 for the season totals
+    sync(seasons, current_week)
+        fetches every week of the seasons that isn't stored yet
+    find_player(name, pos, team)
+        returns the sportsdata.io PlayerID of a player, or None
+    season_history(player_id), weekly_history(player_id, season)
+        return a player's stored seasons or weeks
+    rolling_points(player_id, window, column)
+        returns a player's points in every week played with the average of the last window weeks played
+    player_trends(names, positions, teams, window)
+        returns the career and recent averages of many players at once
+    """
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as connection:
+            connection.executescript(SCHEMA)
+            # stores made before the log had a complete column don't know, so their weeks are fetched again
+            if 'complete' not in {row['name'] for row in connection.execute('PRAGMA table_info(ingested)')}:
+                connection.execute('ALTER TABLE ingested ADD COLUMN complete INTEGER NOT NULL DEFAULT 0')
+
+    def connection(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # readers don't block the writer or each other
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def close(self):
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.connection.close()
+        self._local = threading.local()
+
+    def store(self, season, week, rows, complete=True):
+        table = 'weekly_stats' if week else 'season_stats'
+        keys_columns = ('player_id', 'season', 'week') if week else ('player_id', 'season')
+        columns = keys_columns + ('team',) + tuple(STAT_FIELDS)
+        stats = []
+        players = []
+        for row in rows:
+            if row.get('PlayerID') is None:
+                continue
+            team = normalize_team(row.get('Team') or '')
+            stats.append((row['PlayerID'], season) + ((week,) if week else ()) + (team,)
+                         + tuple(row.get(field) for field in STAT_FIELDS.values()))
+            players.append((row['PlayerID'], row.get('Name', ''), canonical_name(row.get('Name', '')),
+                            normalize_position(row.get('Position') or ''), team, season))
+        connection = self.connection()
+        # one transaction per week, so a week is either all stored and logged or not at all
+        with connection:
+            connection.execute(f'DELETE FROM {table} WHERE season = ?' + (' AND week = ?' if week else ''),
+                               (season, week) if week else (season,))
+            connection.executemany(f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) '
+                                   f'VALUES ({", ".join("?" * len(columns))})', stats)
+            # players keep the name, position and team of the latest season they were seen in
+            connection.executemany('INSERT INTO players (player_id, name, name_key, pos, team, season) '
+                                   'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (player_id) DO UPDATE SET '
+                                   'name = excluded.name, name_key = excluded.name_key, pos = excluded.pos, '
+                                   'team = excluded.team, season = excluded.season '
+                                   'WHERE excluded.season >= players.season', players)
+            connection.execute('INSERT OR REPLACE INTO ingested (season, week, fetched_at, players, complete) '
+                               'VALUES (?, ?, ?, ?, ?)', (season, week, time.time(), len(stats), int(complete)))
+        return len(stats)
+
+    def stored_weeks(self, season):
+        return {row['week'] for row in
+                self.connection().execute('SELECT week FROM ingested WHERE season = ? AND complete', (season,))}
+
+    def sync(self, seasons, current_week=None, workers=4):
+        """
+        fetches what is missing from the store. Every week of the earlier seasons and the latest season's weeks
+        before current_week are fetched once and never again. current_week itself and the totals of a season that
+        is still going are stored as incomplete and fetched again by every sync, until a sync sees them over.
+        A week that can't be fetched is reported and left for the next sync
+        Parameters
+        ----------
+        seasons: list
+            the seasons to keep, like [2019, 2020, 2021, 2022]
+        current_week: int
+            the week the latest season is in, None if it is over
+        workers: int
+            how many weeks are fetched at the same time
+
+        Returns
+        -------
+        dictionary of the weeks fetched, the weeks that were already stored, the weeks that failed and the rows
+        stored
+        """
+        latest = max(seasons)
+        wanted = []
+        skipped = 0
+        for season in sorted(seasons):
+            in_progress = season == latest and current_week is not None
+            last_week = current_week if in_progress else season_weeks(season)
+            complete = self.stored_weeks(season)
+            weeks = [week for week in range(last_week + 1) if week not in complete]
+            skipped += last_week + 1 - len(weeks)
+            # the week being played and the totals of a season still going will change
+            wanted.extend((season, week, not in_progress or 0 < week < current_week) for week in weeks)
+
+        def download(season, week):
+            url = weekly_stats_url(season, week) if week else season_stats_url(season)
+            return dm.fetch(url, timeout=dm.SOURCE_TIMEOUTS['season_stats']).json()
+
+        stored_rows = 0
+        failed = 0
+        if wanted:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                downloads = [(season, week, over, executor.submit(download, season, week))
+                             for season, week, over in wanted]
+                # sqlite has one writer, so the weeks are stored here as their downloads finish
+                for season, week, over, future in downloads:
+                    try:
+                        rows = future.result()
+                    except Exception as error:
+                        # the url has the api key in it, so only its host and the redacted error are printed
+                        failed += 1
+                        print(f'Could not fetch {season} week {week} from {urlsplit(dm.SPORTSDATAIO_BASE_URL).netloc}: '
+                              f'{dm.redact(repr(error))}')
+                        continue
+                    stored_rows += self.store(season, week, rows, over)
+        return {'fetched': len(wanted) - failed, 'skipped': skipped, 'failed': failed, 'rows': stored_rows}
+
+    def find_player(self, name, pos, team=None):
+        rows = self.connection().execute(
+            'SELECT player_id, team FROM players WHERE name_key = ? AND pos = ? ORDER BY season DESC',
+            (canonical_name(name), normalize_position(pos))).fetchall()
+        team = normalize_team(team) if team else None
+        for row in rows:
+            if row['team'] == team:
+                return row['player_id']
+        # a player who changed teams still matches if no one else has the name at the position
+        return rows[0]['player_id'] if len(rows) == 1 else None
+
+    def season_history(self, player_id):
+        return [dict(row) for row in self.connection().execute(
+            'SELECT * FROM season_stats WHERE player_id = ? ORDER BY season', (player_id,))]
+
+    def weekly_history(self, player_id, season=None):
+        if season is None:
+            rows = self.connection().execute(
+                'SELECT * FROM weekly_stats WHERE player_id = ? ORDER BY season, week', (player_id,))
+        else:
+            rows = self.connection().execute(
+                'SELECT * FROM weekly_stats WHERE player_id = ? AND season = ? ORDER BY week', (player_id, season))
+        return [dict(row) for row in rows]
+
+    def rolling_points(self, player_id, window=ROLLING_WEEKS, column=TREND_COLUMN):
+        if column not in STAT_FIELDS:
+            raise ValueError(f'unknown stat {column}')
+        return [dict(row) for row in self.connection().execute(
+            f'SELECT season, week, {column} AS points, AVG({column}) OVER (ORDER BY season, week ROWS BETWEEN ? '
+            f'PRECEDING AND CURRENT ROW) AS rolling FROM weekly_stats WHERE player_id = ? AND games > 0 '
+            f'ORDER BY season, week', (window - 1, player_id))]
+
+    def player_trends(self, names, positions, teams, window=ROLLING_WEEKS):
+        """
+        works out every player's average points per finished season and per game over their last window games,
+        with three queries however many players there are
+        Parameters
+        ----------
+        names, positions, teams: list
+            the players, like the columns of a PlayerTable
+        window: int
+            games in the recent average
+
+        Returns
+        -------
+        career_ffp, recent_ffp: numpy array
+            the averages, NaN for players that aren't in the store
+        """
+        connection = self.connection()
+        by_name = {}
+        for row in connection.execute('SELECT player_id, name_key, pos, team FROM players'):
+            by_name.setdefault((row['name_key'], row['pos']), []).append((row['team'], row['player_id']))
+        # a season still being played would pull the average down, only finished seasons count
+        career = dict(connection.execute(
+            f'SELECT player_id, AVG({TREND_COLUMN}) FROM season_stats WHERE games > 0 AND season IN '
+            f'(SELECT season FROM ingested WHERE week = 0 AND complete) GROUP BY player_id'))
+        # each player's last games are read backwards along the primary key, which is much faster than
+        # numbering every stored week with a window function
+        recent = {player_id: points for player_id, points in connection.execute(
+            f'SELECT player_id, (SELECT AVG({TREND_COLUMN}) FROM (SELECT {TREND_COLUMN} FROM weekly_stats AS weeks '
+            f'WHERE weeks.player_id = players.player_id AND games > 0 ORDER BY season DESC, week DESC LIMIT ?)) '
+            f'FROM players', (window,)) if points is not None}
+        career_ffp = np.full(len(names), np.nan)
+        recent_ffp = np.full(len(names), np.nan)
+        for row, (name, pos, team) in enumerate(zip(names, positions, teams)):
+            candidates = by_name.get((canonical_name(name), normalize_position(pos)), [])
+            team = normalize_team(team)
+            matches = [player_id for player_team, player_id in candidates if player_team == team]
+            player_id = matches[0] if matches else candidates[0][1] if len(candidates) == 1 else None
+            if player_id is None:
+                continue
+            career_ffp[row] = career.get(player_id, math.nan)
+            recent_ffp[row] = recent.get(player_id, math.nan)
+        return np.round(career_ffp, 2), np.round(recent_ffp, 2)
+
+
+def open_store(path=None):
+    """
+    opens the history store if it has been synced, the application only reads it and never creates it. A store
+    is only opened once per file, every dataset the process builds gets the same one, so rebuilding the dataset
+    doesn't open a new connection in every thread each time
+    Returns
+    -------
+    HistoryStore, or None if the database file doesn't exist
+    """
+    path = HISTORY_DB_FILE if path is None else path
+    if not os.path.exists(path):
+        return None
+    with _open_stores_lock:
+        store = _open_stores.get(path)
+        if store is None:
+            store = _open_stores[path] = HistoryStore(path)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fetch the weeks of player stats the history store is missing')
+    parser.add_argument('--seasons', type=int, nargs='+', required=True, help='the seasons to keep')
+    parser.add_argument('--week', type=int, help='the week the latest season is in, leave out if it is over')
+    parser.add_argument('--db', default=HISTORY_DB_FILE, help='the database file')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    summary = HistoryStore(args.db).sync(args.seasons, args.week)
+    print(f"fetched {summary['fetched']} weeks and stored {summary['rows']} rows, {summary['skipped']} weeks "
+          f"were already stored and {summary['failed']} failed ({time.perf_counter() - start:.1f}s)")
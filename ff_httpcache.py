@@ -0,0 +1,140 @@
+# This module caches finished responses for one version of the player data. A page or api response is
+# rendered once, compressed once with gzip and brotli, and then served from memory with a strong ETag until
+# the data changes, so a repeat visit costs a dictionary lookup, or only a 304 if the browser still has it.
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+import ff_metrics as metrics
+
+# brotli compresses html and json noticeably better than gzip, but it is optional
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+cache_lookups = metrics.counter('ff_response_cache_total',
+                                'Cached response lookups: hit, miss, or not_modified when a 304 was sent',
+                                ('result',))
+
+
+class CachedResponse:
+    """
+    class CachedResponse is one rendered response with its precomputed compressed bodies and ETags. Each
+    encoding gets its own strong ETag, made from the data version and a hash of the body, because a strong
+    ETag promises the exact same bytes
+
+    Parameters
+    ----------
+    version: str
+        version of the data the response was rendered from
+    body: bytes
+        the uncompressed response body
+    mimetype: str
+        the response's content type
+    Methods
+    -------
+    respond(request)
+        returns a 304 if the request already has this response, otherwise the best encoding it accepts
+    """
+    __slots__ = ('bodies', 'etags', 'mimetype', 'size')
+
+    def __init__(self, version, body, mimetype):
+        digest = hashlib.blake2b(body, digest_size=10).hexdigest()
+        self.bodies = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body, quality=11)
+        self.etags = {encoding: f'{version}-{digest}' + ('' if encoding == 'identity' else f'-{encoding}')
+                      for encoding in self.bodies}
+        self.mimetype = mimetype
+        self.size = sum(len(encoded) for encoded in self.bodies.values())
+
+    def choose_encoding(self, accept_encodings):
+        best, best_size = 'identity', len(self.bodies['identity'])
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings[encoding] > 0 and len(self.bodies[encoding]) < best_size:
+                best, best_size = encoding, len(self.bodies[encoding])
+        return best
+
+    def respond(self, request):
+        encoding = self.choose_encoding(request.accept_encodings)
+        if any(request.if_none_match.contains(etag) for etag in self.etags.values()):
+            cache_lookups.inc(result='not_modified')
+            response = Response(status=304)
+        else:
+            response = Response(self.bodies[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(self.etags[encoding])
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class ResponseCache:
+    """
+    class ResponseCache keeps the CachedResponse of each request for one version of the data, up to a number
+    of bytes and a number of responses, dropping the least recently used responses first. Every distinct query
+    string is its own entry, so the entry limit stops searches and cursors from filling it with tiny responses.
+    A new version of the data gets a new cache, so nothing has to be invalidated
+
+    Parameters
+    ----------
+    version: str
+        version of the data the responses are rendered from
+    max_bytes: int
+        how much memory the cached bodies may use
+    max_entries: int
+        how many responses may be cached
+    Methods
+    -------
+    get(key)
+        returns the CachedResponse for a request key, or None
+    store(key, body, mimetype)
+        compresses and caches a response and returns its CachedResponse
+    clear()
+        drops every cached response
+    """
+    def __init__(self, version, max_bytes=32 * 1024 * 1024, max_entries=4096):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        cache_lookups.inc(result='hit' if entry is not None else 'miss')
+        return entry
+
+    def store(self, key, body, mimetype):
+        # compressing happens outside the lock, two requests racing on a new page both compress it once
+        entry = CachedResponse(self.version, body, mimetype)
+        if entry.size > self.max_bytes:
+            return entry
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.cached_bytes -= previous.size
+            self.entries[key] = entry
+            self.cached_bytes += entry.size
+            while self.cached_bytes > self.max_bytes or len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.cached_bytes -= evicted.size
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.cached_bytes = 0
@@ -0,0 +1,294 @@
+# This module decides which records in the different data sources are the same player. Names are
+# normalized and run through an alias table, teams and positions are mapped onto one spelling, and
+# sources are joined on hash tables of match keys so every source is only scanned once.
+import re
+
+name_initials = re.compile(r'\.(?=[^\W\d_]{2,})')
+name_punctuation = re.compile(r"[.'\u2019]")
+name_separators = re.compile(r'[^a-z0-9/]+')
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'v'}
+
+# normalized name -> the name the player is known by in the espn projections
+NAME_ALIASES = {
+    'gabe davis': 'gabriel davis',
+    'hollywood brown': 'marquise brown',
+    'josh palmer': 'joshua palmer',
+    'eli mitchell': 'elijah mitchell',
+    'mitch trubisky': 'mitchell trubisky',
+    'kenneth walker': 'ken walker',
+    'robbie chosen': 'robbie anderson',
+    'william fuller': 'will fuller'
+}
+# team abbreviations used by other sources -> the espn abbreviation, casefolded
+TEAM_ALIASES = {
+    'was': 'wsh',
+    'wft': 'wsh',
+    'jac': 'jax',
+    'la': 'lar',
+    'oak': 'lv',
+    'sd': 'lac',
+    'kan': 'kc',
+    'gnb': 'gb',
+    'nwe': 'ne',
+    'nor': 'no',
+    'sfo': 'sf',
+    'tam': 'tb'
+}
+POSITION_ALIASES = {
+    'dst': 'd/st',
+    'def': 'd/st',
+    'pk': 'k',
+    'fb': 'rb'
+}
+
+
+def normalize_name(name):
+    """
+    normalizes a player name for matching: lower case, without periods and apostrophes, hyphens turned into
+    spaces and generational suffixes like Jr. or III removed, so "Amon-Ra St. Brown" becomes "amon ra st brown".
+    An initial written straight onto the last name, like "J.Taylor", is split off as its own word
+    Parameters
+    ----------
+    name: str
+        the player's name as it appears in a data source
+
+    Returns
+    -------
+    the normalized name
+    """
+    name = name_initials.sub(' ', name.casefold())
+    tokens = name_separators.split(name_punctuation.sub('', name))
+    return ' '.join(token for token in tokens if token and token not in NAME_SUFFIXES)
+
+
+def canonical_name(name):
+    """
+    normalizes a player name and replaces it with its entry in NAME_ALIASES if it has one
+    Parameters
+    ----------
+    name: str
+        the player's name as it appears in a data source
+
+    Returns
+    -------
+    the canonical name
+    """
+    normalized = normalize_name(name)
+    return NAME_ALIASES.get(normalized, normalized)
+
+
+def normalize_team(team):
+    team = team.casefold()
+    return TEAM_ALIASES.get(team, team)
+
+
+def normalize_position(pos):
+    pos = pos.casefold()
+    return POSITION_ALIASES.get(pos, pos)
+
+
+def player_key(name, pos, team):
+    """
+    builds the player_uuid used throughout the application, the player's last name, position and team,
+    for example "kuppwrlar". The last name is the second word of the name as the source writes it, punctuation
+    kept, like the keys the application has always used, so "JuJu Smith-Schuster" is "smith-schusterwrkc" and
+    "Amon-Ra St. Brown" is "st.wrdet"
+    Parameters
+    ----------
+    name: str
+        the player's name as it appears in the source
+    pos: str
+        the player's position
+    team: str
+        the player's team abbreviation
+
+    Returns
+    -------
+    the player key
+    """
+    tokens = name.casefold().split() or ['']
+    return tokens[min(1, len(tokens) - 1)] + normalize_position(pos) + normalize_team(team)
+
+
+def identity_keys(name, pos, team, source_id=None):
+    """
+    lists the keys a record can be matched on, strongest first: a stable source id if the source has one, the
+    full canonical name with position and team, then first initial and last name with position and team which
+    also matches sources that abbreviate first names
+    Parameters
+    ----------
+    name: str
+        the player's name
+    pos: str
+        the player's position
+    team: str
+        the player's team abbreviation
+    source_id: str
+        optional id the source gives the player, like the sportsdata.io PlayerID
+
+    Returns
+    -------
+    list of hashable match keys
+    """
+    tokens = canonical_name(name).split()
+    pos = normalize_position(pos)
+    team = normalize_team(team)
+    keys = []
+    if source_id is not None:
+        keys.append(('id', str(source_id)))
+    if tokens:
+        keys.append(('name', ' '.join(tokens), pos, team))
+        keys.append(('initial', tokens[0][0], tokens[-1], pos, team))
+    return keys
+
+
+def key_rows(rows, name_field, pos_field, team_field, duplicates=None):
+    """
+    puts the rows of a source into a dictionary keyed by player_key without losing any players. When two rows
+    would get the same key, like two players with the same last name on the same team and position, the later
+    one keeps the key, as it always has, and the earlier one moves to its whole name, with a counter if that is
+    still taken. A row that repeats a player already
+    seen, with the same full name, position and team, replaces the earlier row under the same key
+    Parameters
+    ----------
+    rows: iterable
+        the source's records as dictionaries
+    name_field, pos_field, team_field: str
+        the fields of each row holding the player's name, position and team
+    duplicates: list
+        optional list the key of every row that was replaced by a later one is appended to
+
+    Returns
+    -------
+    dictionary of unique key to row
+    """
+    keyed_rows = {}
+    # (name, pos, team) -> the key of the player's row, and the other way around
+    seen_players = {}
+    owners = {}
+    for row in rows:
+        name = canonical_name(row[name_field])
+        pos = normalize_position(row[pos_field])
+        team = normalize_team(row[team_field])
+        if (name, pos, team) in seen_players:
+            key = seen_players[name, pos, team]
+            if duplicates is not None:
+                duplicates.append(key)
+            keyed_rows[key] = row
+            continue
+        key = player_key(row[name_field], pos, team)
+        if key in keyed_rows:
+            moved_player = owners[key]
+            base_key = moved_player[0].replace(' ', '') + moved_player[1] + moved_player[2]
+            moved_key = base_key
+            count = 2
+            while moved_key in keyed_rows:
+                moved_key = f'{base_key}{count}'
+                count += 1
+            keyed_rows[moved_key] = keyed_rows[key]
+            owners[moved_key] = moved_player
+            seen_players[moved_player] = moved_key
+        seen_players[name, pos, team] = key
+        owners[key] = (name, pos, team)
+        keyed_rows[key] = row
+    return keyed_rows
+
+
+class JoinReport:
+    """
+    class JoinReport counts how well one source matched the base source in join_sources
+
+    Parameters
+    ----------
+    source: str
+        name of the source that was joined
+    rows: int
+        number of rows the source has
+    matched: int
+        number of base records that found a row in the source
+    unmatched: int
+        number of base records that found no row
+    conflicts: list
+        (base key, source key, reason) for every match that was ambiguous or claimed a row another
+        base record already matched
+    Methods
+    -------
+    match_rate()
+        the fraction of base records that matched
+    """
+    def __init__(self, source, rows):
+        self.source = source
+        self.rows = rows
+        self.matched = 0
+        self.unmatched = 0
+        self.conflicts = []
+
+    def match_rate(self):
+        total = self.matched + self.unmatched
+        return self.matched / total if total else 0.0
+
+    def __str__(self):
+        return (f'{self.source}: matched {self.matched} of {self.matched + self.unmatched} players '
+                f'({self.match_rate():.1%}) from {self.rows} rows, {len(self.conflicts)} conflicts')
+
+
+def join_sources(base_rows, base_identity, sources):
+    """
+    matches every record of the base source to at most one row of each other source. Each source is indexed once
+    in hash tables of its identity keys, so the join is linear in the number of rows. The keys of every row a
+    base record matches are added to the keys it is matched on afterwards, so a source id picked up from one
+    source can be used to match the next source that shares it
+    Parameters
+    ----------
+    base_rows: dict
+        dictionary of base key to record
+    base_identity: callable
+        takes a base record and returns its identity_keys
+    sources: dict
+        ordered dictionary of source name to (rows, identity) where rows is a dictionary of source key to row
+        and identity takes a row and returns its identity_keys
+
+    Returns
+    -------
+    matches: dict
+        dictionary of source name to a dictionary of base key to the source key it matched
+    reports: list
+        a JoinReport for every source
+    """
+    match_keys = {base_key: base_identity(row) for base_key, row in base_rows.items()}
+    matches = {}
+    reports = []
+    for source, (rows, identity) in sources.items():
+        index = {}
+        row_keys = {}
+        for source_key, row in rows.items():
+            row_keys[source_key] = identity(row)
+            for key in row_keys[source_key]:
+                index.setdefault(key, []).append(source_key)
+        report = JoinReport(source, len(rows))
+        claimed = {}
+        source_matches = {}
+        for base_key, keys in match_keys.items():
+            found = None
+            for key in keys:
+                hits = index.get(key, ())
+                if len(hits) == 1:
+                    found = hits[0]
+                    break
+                if len(hits) > 1:
+                    report.conflicts.append((base_key, hits, f'{len(hits)} rows share {key}'))
+            if found is None:
+                report.unmatched += 1
+                continue
+            if found in claimed:
+                report.conflicts.append((base_key, found, f'row already matched by {claimed[found]}'))
+                report.unmatched += 1
+                continue
+            claimed[found] = base_key
+            source_matches[base_key] = found
+            report.matched += 1
+            keys.extend(key for key in row_keys[found] if key not in keys)
+            keys.sort(key=lambda match_key: match_key[0] != 'id')
+        matches[source] = source_matches
+        reports.append(report)
+    return matches, reports
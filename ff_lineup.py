@@ -0,0 +1,195 @@
+# This module finds the best lineups that fit under a salary budget. A lineup fills a number of slots at
+# each position, and its score is the players' projected points, optionally lowered by how uncertain the
+# projections are. The search keeps, for each position and then for each group of positions, only the
+# combinations of players that could still be part of one of the best lineups, so it stays fast on pools
+# of thousands of players while returning exactly the best lineups.
+import heapq
+
+import numpy as np
+
+DEFAULT_SLOTS = {'QB': 1, 'RB': 2, 'WR': 3, 'TE': 1, 'K': 1, 'D/ST': 1}
+# combinations prune compares with the best scores so far at once, before checking them one by one
+PRUNE_BLOCK = 256
+
+
+class Lineup:
+    """
+    class Lineup is one set of players that fills every slot
+
+    Parameters
+    ----------
+    rows: tuple
+        the players' rows in the PlayerTable, or indexes into the arrays given to optimize
+    score: float
+        the objective the lineup was chosen by
+    cost: float
+        the players' combined salary
+    """
+    __slots__ = ('rows', 'score', 'cost')
+
+    def __init__(self, rows, score, cost):
+        self.rows = rows
+        self.score = score
+        self.cost = cost
+
+    def __repr__(self):
+        return f'Lineup(rows={self.rows!r}, score={self.score:.2f}, cost={self.cost:.0f})'
+
+
+def prune(costs, scores, keep, max_cost):
+    """
+    finds the combinations that cost at most max_cost and that fewer than keep other combinations beat,
+    meaning they cost no more and score no less. A combination that keep others beat can't be part of any of
+    the keep best lineups, because swapping in each of the combinations that beat it gives keep lineups at
+    least as good
+    Parameters
+    ----------
+    costs, scores: numpy array
+        each combination's cost and score
+    keep: int
+        how many of the best lineups have to survive
+    max_cost: float
+        the most a combination can cost and still fit in a lineup
+
+    Returns
+    -------
+    numpy array of the surviving combinations' indexes, cheapest first
+    """
+    order = np.flatnonzero(costs <= max_cost)
+    order = order[np.argsort(costs[order])]
+    ordered_scores = scores[order]
+    survivors = np.zeros(len(order), dtype=bool)
+    # the keep best scores of the survivors so far, lowest first. The lowest only ever rises, so a block can
+    # skip every combination that doesn't beat it before looking at the rest one by one
+    best_scores = []
+    for start in range(0, len(order), PRUNE_BLOCK):
+        block = ordered_scores[start:start + PRUNE_BLOCK]
+        if len(best_scores) == keep:
+            candidates = np.flatnonzero(block > best_scores[0]).tolist()
+        else:
+            candidates = range(len(block))
+        for index in candidates:
+            score = float(block[index])
+            if len(best_scores) < keep or score > best_scores[0]:
+                survivors[start + index] = True
+                heapq.heappush(best_scores, score)
+                if len(best_scores) > keep:
+                    heapq.heappop(best_scores)
+    return order[survivors]
+
+
+def position_combinations(rows, scores, costs, count, keep, max_cost):
+    """
+    finds the combinations of count players from one position that survive prune. Players are added one at a
+    time, and the combinations of each size are pruned after every player, like a knapsack that also counts
+    how many items it holds
+    Parameters
+    ----------
+    rows: numpy array
+        the rows of the position's players
+    scores, costs: numpy array
+        every player's score and salary, indexed by row
+    count: int
+        how many slots the position has
+    keep: int
+        how many of the best lineups have to survive
+    max_cost: float
+        the most the position's players can cost together
+
+    Returns
+    -------
+    (costs, scores, rows) of the combinations, rows has one column per player
+    """
+    # a single player that count + keep - 1 others beat can never be picked, see prune
+    candidates = rows[prune(costs[rows], scores[rows], count + keep - 1, max_cost)]
+    by_size = [(np.zeros(1), np.zeros(1), np.zeros((1, 0), dtype=np.int64))]
+    by_size += [(np.zeros(0), np.zeros(0), np.zeros((0, size), dtype=np.int64)) for size in range(1, count + 1)]
+    for row in candidates:
+        for size in range(count, 0, -1):
+            smaller_costs, smaller_scores, smaller_rows = by_size[size - 1]
+            if not len(smaller_costs):
+                continue
+            sizes_costs, sizes_scores, sizes_rows = by_size[size]
+            combined_costs = np.concatenate((sizes_costs, smaller_costs + costs[row]))
+            combined_scores = np.concatenate((sizes_scores, smaller_scores + scores[row]))
+            combined_rows = np.concatenate((sizes_rows, np.column_stack(
+                (smaller_rows, np.full(len(smaller_rows), row, dtype=np.int64)))))
+            kept = prune(combined_costs, combined_scores, keep, max_cost)
+            by_size[size] = (combined_costs[kept], combined_scores[kept], combined_rows[kept])
+    return by_size[count]
+
+
+def optimize(scores, costs, positions, budget, slots=None, top_k=1):
+    """
+    finds the top_k lineups with the highest combined score whose salaries add up to at most the budget
+    Parameters
+    ----------
+    scores: numpy array
+        what each player adds to a lineup, for example projected points
+    costs: numpy array
+        each player's salary
+    positions: list
+        each player's position
+    budget: float
+        the most a lineup can cost
+    slots: dict
+        dictionary of position to how many players the lineup has at it, DEFAULT_SLOTS if not given
+    top_k: int
+        how many lineups to return
+
+    Returns
+    -------
+    list of up to top_k Lineup objects, best first. Empty if no lineup fits the budget
+    """
+    slots = DEFAULT_SLOTS if slots is None else slots
+    scores = np.asarray(scores, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+    positions = np.array([position.casefold() for position in positions], dtype=str)
+    groups = []
+    for position, count in slots.items():
+        if count <= 0:
+            continue
+        rows = np.flatnonzero(positions == position.casefold())
+        if len(rows) < count:
+            return []
+        # the cheapest way to fill the position, to know how much budget is left for the others
+        cheapest = np.sort(costs[rows])[:count].sum()
+        groups.append((rows, count, cheapest))
+    minimum_cost = sum(cheapest for _, _, cheapest in groups)
+    if minimum_cost > budget:
+        return []
+    lineup_costs, lineup_scores, lineup_rows = np.zeros(1), np.zeros(1), np.zeros((1, 0), dtype=np.int64)
+    filled_cost = 0.0
+    # positions with the fewest combinations first, so the partial lineups stay small
+    for rows, count, cheapest in sorted(groups, key=lambda group: len(group[0]) ** group[1]):
+        position_budget = budget - (minimum_cost - cheapest)
+        combination_costs, combination_scores, combination_rows = position_combinations(
+            rows, scores, costs, count, top_k, position_budget)
+        filled_cost += cheapest
+        remaining = minimum_cost - filled_cost
+        # every partial lineup with every combination, as flat arrays
+        merged_costs = (lineup_costs[:, None] + combination_costs[None, :]).ravel()
+        merged_scores = (lineup_scores[:, None] + combination_scores[None, :]).ravel()
+        kept = prune(merged_costs, merged_scores, top_k, budget - remaining)
+        lineup_index, combination_index = np.divmod(kept, len(combination_costs))
+        lineup_costs, lineup_scores = merged_costs[kept], merged_scores[kept]
+        lineup_rows = np.hstack((lineup_rows[lineup_index], combination_rows[combination_index]))
+    best = np.argsort(-lineup_scores, kind='stable')[:top_k]
+    return [Lineup(tuple(int(row) for row in lineup_rows[index]), float(lineup_scores[index]),
+                   float(lineup_costs[index])) for index in best]
+
+
+def lineup_scores(proj_ffp, st_dev_proj, risk=0.0):
+    """
+    the score each player adds to a lineup, projected points minus risk times the projections' standard
+    deviation, so a risk above 0 prefers players the projections agree on
+    """
+    return np.asarray(proj_ffp, dtype=np.float64) - risk * np.asarray(st_dev_proj, dtype=np.float64)
+
+
+def optimize_table(table, budget, slots=None, top_k=1, risk=0.0):
+    """
+    finds the best lineups from the players of a PlayerTable by their contract value, see optimize
+    """
+    return optimize(lineup_scores(table.proj_ffp, table.st_dev_proj, risk), table.contract_value, table.pos,
+                    budget, slots, top_k)
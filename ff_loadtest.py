@@ -0,0 +1,240 @@
+# This module load tests the application on a local server. The data is loaded once with create_app,
+# then the server forks its worker processes, which all accept connections from the same socket, the same
+# way gunicorn --preload runs it. Each page is requested for a while by a number of concurrent clients and
+# the throughput and latency are reported for every worker count.
+# Run it with:  python ff_loadtest.py --workers 1 2 4 --clients 8 --duration 5
+#         or against a server that is already running:  python ff_loadtest.py --url http://127.0.0.1:8000
+import argparse
+import http.client
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from werkzeug.serving import make_server
+
+from ff_application import create_app
+from ff_datamgmt import read_json_file
+
+# method, path and form body of each page that is load tested
+ROUTES = (
+    ('GET', '/', None),
+    ('GET', '/salary', None),
+    ('GET', '/risky', None),
+    ('POST', '/handle_search', {'name': 'kupp', 'pos': 'wr', 'team': 'lar'})
+)
+
+
+def start_workers(app, workers, host='127.0.0.1'):
+    """
+    forks worker processes that serve the application from one shared listening socket
+    Parameters
+    ----------
+    app: Flask
+        the application, created before forking so the workers share its memory
+    workers: int
+        number of worker processes
+    host: str
+        address to listen on
+
+    Returns
+    -------
+    port: int
+        the port the workers listen on
+    pids: list
+        the worker process ids
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, 0))
+    listener.listen(1024)
+    port = listener.getsockname()[1]
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # keep the request log and anything the workers print out of the report
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, 1)
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    listener.close()
+    return port, pids
+
+
+def stop_workers(pids):
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+
+def private_memory(pid):
+    """
+    reads how much memory a process has written to itself, the part that is not shared with the process it
+    was forked from. Only available on Linux
+    Parameters
+    ----------
+    pid: int
+        the process id
+
+    Returns
+    -------
+    megabytes of private memory, or None where it can't be read
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps if ':' in line)
+    except OSError:
+        return None
+    private_kb = sum(int(fields.get(field, '0 kB').split()[0]) for field in ('Private_Dirty', 'Private_Clean'))
+    return private_kb / 1024
+
+
+def run_clients(host, port, method, path, form, clients, duration):
+    """
+    requests one page from several client threads at once for a fixed time, each over its own keep alive
+    connection
+    Parameters
+    ----------
+    host, port:
+        where the server listens
+    method, path: str
+        the request to send
+    form: dict
+        form fields sent as the body of a POST, None for a GET
+    clients: int
+        number of concurrent clients
+    duration: float
+        seconds to keep requesting
+
+    Returns
+    -------
+    latencies: list
+        seconds each successful request took
+    errors: int
+        requests that failed or did not return 200
+    """
+    body = urlencode(form) if form is not None else None
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        own_latencies = []
+        own_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    own_latencies.append(time.perf_counter() - start)
+                else:
+                    own_errors += 1
+            except (OSError, http.client.HTTPException):
+                own_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+        connection.close()
+        with lock:
+            latencies.extend(own_latencies)
+            errors[0] += own_errors
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load_test(host, port, clients, duration, workers=None, pids=()):
+    """
+    load tests every page in ROUTES against one running server
+    Parameters
+    ----------
+    host, port:
+        where the server listens
+    clients: int
+        number of concurrent clients
+    duration: float
+        seconds each page is requested for
+    workers: int
+        number of worker processes the server has, only used to label the results
+    pids: list
+        the worker process ids, to report their private memory
+
+    Returns
+    -------
+    list of one result dictionary per page
+    """
+    results = []
+    for method, path, form in ROUTES:
+        latencies, errors = run_clients(host, port, method, path, form, clients, duration)
+        result = {'stage': 'load', 'workers': workers, 'clients': clients, 'route': path,
+                  'requests': len(latencies), 'errors': errors, 'requests_per_s': len(latencies) / duration,
+                  'p50_ms': (percentile(latencies, 0.5) or 0) * 1000,
+                  'p99_ms': (percentile(latencies, 0.99) or 0) * 1000}
+        memory = [private_memory(pid) for pid in pids]
+        if memory and None not in memory:
+            result['worker_private_mb'] = max(memory)
+        results.append(result)
+        print(format_result(result))
+    return results
+
+
+def format_result(result):
+    return '  '.join(f'{key}={value:.4g}' if isinstance(value, float) else f'{key}={value}'
+                     for key, value in result.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the fantasy football application')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='numbers of worker processes to test with')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=5, help='seconds each page is requested for')
+    parser.add_argument('--cache', help='load the players from this json cache instead of the data sources')
+    parser.add_argument('--url', help='load test a server that is already running instead of starting one')
+    parser.add_argument('--output', help='also write the results to this json file')
+    args = parser.parse_args()
+    load_results = []
+    if args.url:
+        address = urlsplit(args.url)
+        load_results = load_test(address.hostname, address.port or 80, args.clients, args.duration)
+    else:
+        if args.cache:
+            application = create_app(load=lambda: read_json_file(args.cache))
+        else:
+            application = create_app()
+        for worker_count in args.workers:
+            server_port, worker_pids = start_workers(application, worker_count)
+            try:
+                load_results.extend(load_test('127.0.0.1', server_port, args.clients, args.duration,
+                                              worker_count, worker_pids))
+            finally:
+                stop_workers(worker_pids)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(load_results, output_file, indent=2)
@@ -0,0 +1,268 @@
+# This module collects the application's metrics, counters, gauges and latency histograms, and formats them
+# for the Prometheus /metrics endpoint. It also has a sampling profiler that can be switched on with an
+# environment variable to see where a slow process spends its time.
+#
+#   FF_METRICS=0                  turns every metric into a no-op
+#   FF_PROFILE=profile.folded     samples every thread's stack and writes them as folded stacks on exit
+#   FF_PROFILE_INTERVAL=0.005     seconds between samples, 0.01 by default
+import atexit
+import os
+import sys
+import threading
+from collections import Counter as StackCounter
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    class Metric is the part every kind of metric shares: a name, help text and one value per combination
+    of label values. Updates take a lock so metrics can be changed from any thread
+
+    Parameters
+    ----------
+    registry: Registry
+        the registry the metric is listed in
+    name: str
+        the prometheus metric name
+    documentation: str
+        the help text
+    labels: tuple
+        names of the labels every update has to give a value for
+    """
+    kind = 'untyped'
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.label_names, key), value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {_format_number(value)}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    """
+    class Histogram counts observations into cumulative buckets, like request latencies, and keeps their sum
+    and count so averages and quantiles can be worked out from a scrape
+
+    Parameters
+    ----------
+    buckets: tuple
+        the upper bounds of the buckets in increasing order, +Inf is added
+    """
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts[0]), counts[1], counts[2]) for key, counts in self.values.items()}
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket', _format_labels(self.label_names, key, [('le', _format_number(bound))]),
+                       cumulative)
+            yield f'{self.name}_sum', _format_labels(self.label_names, key), total
+            yield f'{self.name}_count', _format_labels(self.label_names, key), count
+
+
+class Registry:
+    """
+    class Registry holds every metric of the process and renders them in the prometheus text format. Each
+    process has its own, so with several workers a scrape sees the worker that answered it
+
+    Parameters
+    ----------
+    enabled: bool
+        when False every update returns right away
+    Methods
+    -------
+    counter(name, documentation, labels), gauge(...), histogram(..., buckets)
+        create and register a metric
+    render()
+        returns the text of the /metrics endpoint
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(self, name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labels, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+registry = Registry(enabled=os.environ.get('FF_METRICS', '1').casefold() not in ('0', 'false', 'no', 'off'))
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+
+class SamplingProfiler:
+    """
+    class SamplingProfiler records where every thread is at a fixed interval from a background thread, which
+    costs the profiled code nothing between samples. The samples are kept as folded stacks, one line per
+    distinct stack with how many times it was seen, the input flamegraph tools expect
+
+    Parameters
+    ----------
+    interval: float
+        seconds between samples
+    Methods
+    -------
+    start(), stop()
+        start and stop sampling
+    folded()
+        returns the samples as folded stack text
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_thread = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+PROFILE_PATH = os.environ.get('FF_PROFILE')
+profiler = None
+_profiler_pid = None
+
+
+def _write_profile():
+    if profiler is None or _profiler_pid != os.getpid():
+        return
+    profiler.stop()
+    # every process writes its own file, forked workers included
+    with open(f'{PROFILE_PATH}.{os.getpid()}', 'w') as profile_file:
+        profile_file.write(profiler.folded())
+
+
+def start_profiler_from_environment():
+    """
+    starts the sampling profiler if FF_PROFILE names a file to write it to, and writes the folded stacks to
+    that name followed by the process id when the process exits. Threads don't survive a fork, so calling this
+    again in a forked worker starts a profiler for the worker. Does nothing if FF_PROFILE isn't set
+
+    Returns
+    -------
+    the running SamplingProfiler, or None
+    """
+    global profiler, _profiler_pid
+    if not PROFILE_PATH or _profiler_pid == os.getpid():
+        return profiler
+    if _profiler_pid is None:
+        atexit.register(_write_profile)
+    profiler = SamplingProfiler(float(os.environ.get('FF_PROFILE_INTERVAL', 0.01))).start()
+    _profiler_pid = os.getpid()
+    return profiler
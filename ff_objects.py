@@ -1,7 +1,37 @@
+import bisect
 import numpy as np
 import re
+import sys
+import time
+from collections import Counter
+import ff_metrics as metrics
+from ff_identity import normalize_name
+from ff_snapshot import Snapshot, build_columns
 trim = re.compile(r'[^0-9.]')
 
+table_build_seconds = metrics.histogram('ff_player_table_build_seconds', 'Time to build a PlayerTable')
+tree_build_seconds = metrics.histogram('ff_tree_build_seconds', 'Time AVLTree.build took')
+tree_height = metrics.gauge('ff_tree_height', 'Levels in the last AVLTree built')
+tree_size = metrics.gauge('ff_tree_players', 'Players in the last AVLTree built')
+tree_lookup_depth = metrics.histogram('ff_tree_lookup_depth', 'Nodes visited by each AVLTree search',
+                                      buckets=(1, 2, 4, 8, 12, 16, 20, 24, 32, 48, 64))
+
+
+def trigrams(text):
+    """
+    splits text into overlapping three character pieces, padded so the start and end of the text count too
+    Parameters
+    ----------
+    text: str
+        normalized text
+
+    Returns
+    -------
+    set of trigrams
+    """
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
 
 class PlayerNode:
     """
@@ -28,29 +58,44 @@ class PlayerNode:
     contract_value: float
         the total value of the player's contract
     contract_value_str: str
-        A formatted string of the total value of the player's contract used for presentation
+        A formatted string of the total value of the player's contract used for presentation. Formatted from
+        contract_value when it is read unless a string that is formatted differently was given
     percent_guaranteed: float
         The percent of the total contract that is guaranteed money for the player
     percent_guaranteed_str: str
-        A formatted string of the percent guaranteed of the player's contract used for presentation
+        A formatted string of the percent guaranteed of the player's contract used for presentation, formatted
+        from percent_guaranteed the same way
     st_dev_proj: float
         The standard deviation of the projected fantasy football points the player will get this football season
+    career_ffp: float
+        the player's average fantasy football points per season in the history store, None if they aren't in it
+    recent_ffp: float
+        the player's average fantasy football points over their last few games in the history store, or None
+    row: int
+        the player's row in the PlayerTable it was created from, None if it was not created from a table
     Methods
     -------
     get_player_data()
         Returns a list of selected values from the player object that is used for populating the data tables
+    get_player_dict()
+        Returns the player's values as a dictionary keyed by attribute name, used by the json api
     """
+    # slots instead of a __dict__, and no tree links, the trees keep those in their own nodes
+    __slots__ = ('player_uuid', 'name', 'pos', 'team', 'ly_ffp', 'proj_ffp', 'games_played', 'contract_value',
+                 '_contract_value_str', 'percent_guaranteed', '_percent_guaranteed_str', 'st_dev_proj', 'career_ffp',
+                 'recent_ffp', 'row')
+
     def __init__(self, player_uuid='', name='name missing', pos='position missing', team='team missing', ly_ffp=0,
-                 proj_ffp=0, games_played=0, contract_value=0, contract_value_str='', percent_guaranteed=0,
-                 percent_guaranteed_str='', st_dev_proj=0, json=None):
-        self.left_child = None
-        self.right_child = None
+                 proj_ffp=0, games_played=0, contract_value=0, contract_value_str=None, percent_guaranteed=0,
+                 percent_guaranteed_str=None, st_dev_proj=0, career_ffp=None, recent_ffp=None, json=None, row=None):
+        self.row = row
+        self.career_ffp = career_ffp
+        self.recent_ffp = recent_ffp
         if json is None:
-            print('No json')
             self.player_uuid = player_uuid
             self.name = name
-            self.pos = pos
-            self.team = team
+            self.pos = sys.intern(pos)
+            self.team = sys.intern(team)
             self.ly_ffp = ly_ffp
             self.proj_ffp = proj_ffp
             self.games_played = games_played
@@ -62,8 +107,8 @@ class PlayerNode:
         else:
             self.player_uuid = player_uuid
             self.name = json['PLAYER']
-            self.pos = json['Position']
-            self.team = json['Team']
+            self.pos = sys.intern(json['Position'])
+            self.team = sys.intern(json['Team'])
             if 'Historic Fantasy Points' not in json:
                 self.ly_ffp = ly_ffp
             else:
@@ -89,11 +134,405 @@ class PlayerNode:
                 self.percent_guaranteed = float(trim.sub('', json['Percent_Guaranteed']))
                 self.percent_guaranteed_str = json['Percent_Guaranteed']
 
+    @property
+    def contract_value_str(self):
+        if self._contract_value_str is None:
+            return format_money(self.contract_value)
+        return self._contract_value_str
+
+    @contract_value_str.setter
+    def contract_value_str(self, value):
+        self._contract_value_str = value
+
+    @property
+    def percent_guaranteed_str(self):
+        if self._percent_guaranteed_str is None:
+            return format_percent(self.percent_guaranteed)
+        return self._percent_guaranteed_str
+
+    @percent_guaranteed_str.setter
+    def percent_guaranteed_str(self, value):
+        self._percent_guaranteed_str = value
 
     def get_player_data(self):
         return [self.player_uuid, self.name, self.pos, self.team, self.ly_ffp, self.proj_ffp, self.st_dev_proj,
                 self.games_played, self.contract_value_str, self.percent_guaranteed_str]
 
+    def get_player_dict(self):
+        return {'player_uuid': self.player_uuid, 'name': self.name, 'pos': self.pos, 'team': self.team,
+                'ly_ffp': self.ly_ffp, 'proj_ffp': self.proj_ffp, 'st_dev_proj': self.st_dev_proj,
+                'games_played': self.games_played, 'contract_value': self.contract_value,
+                'contract_value_str': self.contract_value_str, 'percent_guaranteed': self.percent_guaranteed,
+                'percent_guaranteed_str': self.percent_guaranteed_str, 'career_ffp': self.career_ffp,
+                'recent_ffp': self.recent_ffp}
+
+
+def format_money(value):
+    return f'${value:,.0f}'
+
+
+def format_percent(value):
+    return f'{value:.1f}%'
+
+
+def nan_to_none(value):
+    return None if value != value else value
+
+
+def display_overrides(strings, values, formatter):
+    """
+    finds the formatted strings that formatting their value again wouldn't give back, like the '0' of a player
+    without a contract, so only those have to be kept
+    Parameters
+    ----------
+    strings: list
+        the formatted strings from the data source
+    values: numpy array
+        the values parsed from them
+    formatter: callable
+        formats a value the usual way, format_money or format_percent
+
+    Returns
+    -------
+    dictionary of row to the string that has to be kept
+    """
+    formatted = {}
+    overrides = {}
+    for row, (string, value) in enumerate(zip(strings, values.tolist())):
+        if value not in formatted:
+            formatted[value] = formatter(value)
+        if string != formatted[value]:
+            overrides[row] = string
+    return overrides
+
+
+def parse_amounts(strings):
+    """
+    turns formatted money and percent strings like '$7,829,154' or '61.7%' into floats. Each distinct string is
+    only parsed once, which matters because values like '0' and common percentages repeat across players
+    Parameters
+    ----------
+    strings: list
+        the formatted strings
+
+    Returns
+    -------
+    numpy array of floats, 0 where a string has no number in it
+    """
+    if len(strings) == 0:
+        return np.zeros(0)
+    distinct, inverse = np.unique(np.asarray(strings, dtype=str), return_inverse=True)
+    parsed = np.array([float(trim.sub('', value) or 0) for value in distinct])
+    return parsed[inverse.reshape(-1)]
+
+
+def _row_mean_std(matrix):
+    # mean and population standard deviation of each row, ignoring the NaN padding of shorter rows
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=1)
+    filled = np.where(present, matrix, 0.0)
+    mean = np.divide(filled.sum(axis=1), counts, out=np.zeros(len(matrix)), where=counts > 0)
+    squares = np.where(present, (matrix - mean[:, None]) ** 2, 0.0)
+    std = np.sqrt(np.divide(squares.sum(axis=1), counts, out=np.zeros(len(matrix)), where=counts > 0))
+    return mean, std, counts > 0
+
+
+class PlayerTable:
+    """
+    class PlayerTable holds every player in contiguous NumPy columns and computes the derived fantasy stats for all
+    of them at once, instead of each PlayerNode calling NumPy on its own handful of numbers. When it is built from
+    a Snapshot the input columns are the snapshot's memory mapped arrays and are not copied
+
+    Parameters
+    ----------
+    player_uuid, name, pos, team: list
+        the string columns, one entry per player
+    historic_points: numpy array
+        players x last season scoring systems matrix, NaN where a player has no value
+    projections: numpy array
+        players x projection sources matrix, NaN where a player has no value
+    ffp_total: numpy array
+        the espn projected fantasy points
+    games_played: numpy array
+        games each player played last season
+    contract_value_str, percent_guaranteed_str: list
+        the formatted contract strings used for presentation. They are formatted from the numbers when asked for,
+        only the strings the source formatted differently are kept, in contract_value_overrides and
+        percent_guaranteed_overrides
+    ly_ffp, proj_ffp, st_dev_proj, contract_value, percent_guaranteed: numpy array
+        the computed columns, the same values PlayerNode has
+    career_ffp, recent_ffp: numpy array
+        the averages from the history store, NaN until add_history fills them and for players it doesn't have
+    Methods
+    -------
+    from_player_data(player_data)
+        builds a table from the blended player dictionary or a Snapshot
+    add_history(store)
+        fills career_ffp and recent_ffp from a HistoryStore
+    nodes()
+        returns a PlayerNode for every row
+    """
+    def __init__(self, columns):
+        start = time.perf_counter()
+        self.player_uuid = list(columns['player_uuid'])
+        self.name = list(columns['name'])
+        # a few distinct teams and positions repeat across every player, so each is kept once
+        self.pos = [sys.intern(pos) for pos in columns['pos']]
+        self.team = [sys.intern(team) for team in columns['team']]
+        self.historic_points = columns['historic_points']
+        self.projections = columns['projections']
+        self.ffp_total = columns['ffp_total']
+        self.games_played = np.nan_to_num(columns['games_played']).astype(np.int64)
+
+        historic_mean, _, _ = _row_mean_std(self.historic_points)
+        self.ly_ffp = np.round(historic_mean, 2)
+        projection_mean, projection_std, has_projections = _row_mean_std(self.projections)
+        self.proj_ffp = np.where(has_projections, np.round(projection_mean, 2), self.ffp_total)
+        self.st_dev_proj = np.where(has_projections, np.round(projection_std, 2), 0.0)
+        self.contract_value = parse_amounts(columns['total_salary'])
+        self.percent_guaranteed = parse_amounts(columns['percent_guaranteed'])
+        self.contract_value_overrides = display_overrides(columns['total_salary'], self.contract_value,
+                                                          format_money)
+        self.percent_guaranteed_overrides = display_overrides(columns['percent_guaranteed'],
+                                                              self.percent_guaranteed, format_percent)
+        self.career_ffp = np.full(len(self.player_uuid), np.nan)
+        self.recent_ffp = np.full(len(self.player_uuid), np.nan)
+        table_build_seconds.observe(time.perf_counter() - start)
+
+    @classmethod
+    def from_player_data(cls, player_data):
+        if isinstance(player_data, Snapshot):
+            return cls({name: player_data.column(name) for name in player_data.columns})
+        return cls(build_columns(player_data))
+
+    def __len__(self):
+        return len(self.player_uuid)
+
+    def add_history(self, store):
+        self.career_ffp, self.recent_ffp = store.player_trends(self.name, self.pos, self.team)
+
+    @property
+    def contract_value_str(self):
+        return [self.contract_value_overrides.get(row, format_money(value))
+                for row, value in enumerate(self.contract_value.tolist())]
+
+    @property
+    def percent_guaranteed_str(self):
+        return [self.percent_guaranteed_overrides.get(row, format_percent(value))
+                for row, value in enumerate(self.percent_guaranteed.tolist())]
+
+    def nodes(self):
+        # convert each column to python values in one call rather than indexing numpy once per player, the
+        # nodes only get the display strings that can't be formatted from the numbers
+        rows = range(len(self))
+        columns = zip(self.player_uuid, self.name, self.pos, self.team, self.ly_ffp.tolist(),
+                      self.proj_ffp.tolist(), self.games_played.tolist(), self.contract_value.tolist(),
+                      map(self.contract_value_overrides.get, rows), self.percent_guaranteed.tolist(),
+                      map(self.percent_guaranteed_overrides.get, rows), self.st_dev_proj.tolist(),
+                      map(nan_to_none, self.career_ffp.tolist()), map(nan_to_none, self.recent_ffp.tolist()))
+        return [PlayerNode(player_uuid=player_uuid, name=name, pos=pos, team=team, ly_ffp=ly_ffp, proj_ffp=proj_ffp,
+                           games_played=games_played, contract_value=contract_value,
+                           contract_value_str=contract_value_str, percent_guaranteed=percent_guaranteed,
+                           percent_guaranteed_str=percent_guaranteed_str, st_dev_proj=st_dev_proj,
+                           career_ffp=career_ffp, recent_ffp=recent_ffp, row=row)
+                for row, (player_uuid, name, pos, team, ly_ffp, proj_ffp, games_played, contract_value,
+                          contract_value_str, percent_guaranteed, percent_guaranteed_str, st_dev_proj, career_ffp,
+                          recent_ffp)
+                in enumerate(columns)]
+
+
+class PlayerSortIndex:
+    """
+    class PlayerSortIndex precomputes the order of the players by every column of the data tables, so a sorted,
+    filtered page of players is read from ready made orders instead of sorting the players on every request.
+    Each column is reduced to dense integer ranks once; single column orders are stored for both directions and
+    multi column orders are built from the ranks and remembered for the sort specs that get asked for
+
+    Parameters
+    ----------
+    table: PlayerTable
+        the players to index
+    Methods
+    -------
+    order(sort)
+        returns the row numbers of every player in the order of the sort spec, a tuple of (column, descending)
+    mask(pos, team, ranges)
+        returns a boolean array of the rows matching the position, team and numeric range filters
+    page(sort, mask, after, limit)
+        returns up to limit rows that match the mask, in sort order, after the position given as a cursor
+    """
+    columns = ('name', 'pos', 'team', 'ly_ffp', 'proj_ffp', 'st_dev_proj', 'games_played', 'contract_value',
+               'percent_guaranteed')
+    numeric_columns = ('ly_ffp', 'proj_ffp', 'st_dev_proj', 'games_played', 'contract_value', 'percent_guaranteed')
+    max_cached_orders = 64
+
+    def __init__(self, table):
+        self.size = len(table)
+        self.values = {}
+        self.ranks = {}
+        self.orders = {}
+        row_numbers = np.arange(self.size)
+        for column in self.columns:
+            values = getattr(table, column)
+            if column in self.numeric_columns:
+                values = np.asarray(values, dtype=np.float64)
+            else:
+                values = np.array([value.casefold() for value in values], dtype=str)
+            self.values[column] = values
+            ranks = np.unique(values, return_inverse=True)[1].reshape(-1) if self.size else row_numbers
+            self.ranks[column] = ranks
+            # ties keep the original row order in both directions
+            self.orders[((column, False),)] = np.lexsort((row_numbers, ranks))
+            self.orders[((column, True),)] = np.lexsort((row_numbers, -ranks))
+
+    def order(self, sort):
+        sort = tuple(sort)
+        if not sort:
+            return np.arange(self.size)
+        order = self.orders.get(sort)
+        if order is None:
+            keys = [np.arange(self.size)]
+            for column, descending in reversed(sort):
+                keys.append(-self.ranks[column] if descending else self.ranks[column])
+            order = np.lexsort(keys)
+            if len(self.orders) >= 2 * len(self.columns) + self.max_cached_orders:
+                self.orders = {key: value for key, value in self.orders.items() if len(key) == 1}
+            self.orders[sort] = order
+        return order
+
+    def mask(self, pos=None, team=None, ranges=None):
+        mask = np.ones(self.size, dtype=bool)
+        if pos:
+            mask &= np.isin(self.values['pos'], [value.casefold() for value in pos])
+        if team:
+            mask &= np.isin(self.values['team'], [value.casefold() for value in team])
+        for column, (low, high) in (ranges or {}).items():
+            if low is not None:
+                mask &= self.values[column] >= low
+            if high is not None:
+                mask &= self.values[column] <= high
+        return mask
+
+    def page(self, sort, mask, after=-1, limit=50):
+        positions = np.flatnonzero(mask[self.order(sort)])
+        start = np.searchsorted(positions, after, side='right')
+        page_positions = positions[start:start + limit]
+        rows = self.order(sort)[page_positions]
+        next_after = int(page_positions[-1]) if start + limit < len(positions) else None
+        return rows.tolist(), next_after, len(positions)
+
+
+class GroupIndex:
+    """
+    class GroupIndex groups the players by team, by position and by team and position together, and adds up each
+    group's totals once when it is built. Listing a group's players then only touches that group and its totals
+    are a dictionary lookup. It is built with the rest of a PlayerDataset, so new data gets new groups and the
+    totals can never go stale
+
+    Parameters
+    ----------
+    table: PlayerTable
+        the players to group
+    risky: numpy array
+        boolean array marking the players the risky players page lists, counted in each group's totals
+    Methods
+    -------
+    rows(team, pos)
+        returns the row numbers of the group's players, highest projected points first
+    totals(team, pos)
+        returns the group's totals as a dictionary, or None if no player is in the group
+    groups(kind, team, pos)
+        returns the totals of every group of a kind, 'team', 'pos' or 'team_pos', highest projected points first.
+        The team and position groups can be narrowed to one team or position
+    """
+    kinds = ('team', 'pos', 'team_pos')
+
+    def __init__(self, table, risky):
+        size = len(table)
+        teams = [team.casefold() for team in table.team]
+        positions = [pos.casefold() for pos in table.pos]
+        labels = {'team': teams, 'pos': positions,
+                  'team_pos': [f'{team}\0{pos}' for team, pos in zip(teams, positions)]}
+        proj_ffp = np.asarray(table.proj_ffp, dtype=np.float64)
+        columns = {'proj_ffp': proj_ffp, 'ly_ffp': np.asarray(table.ly_ffp, dtype=np.float64),
+                   'contract_value': np.asarray(table.contract_value, dtype=np.float64),
+                   'risky': np.asarray(risky, dtype=np.float64)}
+        # every player's row, highest projected points first, ties in row order
+        by_points = np.lexsort((np.arange(size), -proj_ffp))
+        self.size = size
+        self.members = {}
+        self.summaries = {}
+        for kind, values in labels.items():
+            keys, first_rows, codes = np.unique(np.array(values, dtype=str), return_index=True, return_inverse=True)
+            codes = codes.reshape(-1)
+            counts = np.bincount(codes, minlength=len(keys))
+            sums = {column: np.bincount(codes, weights=weights, minlength=len(keys))
+                    for column, weights in columns.items()}
+            # grouping the rows by code keeps each group in projected points order
+            grouped = by_points[np.argsort(codes[by_points], kind='stable')]
+            members = np.split(grouped, np.cumsum(counts)[:-1])
+            summaries = {}
+            for code, key in enumerate(keys.tolist()):
+                first = first_rows[code]
+                summary = {'team': table.team[first] if kind != 'pos' else None,
+                           'pos': table.pos[first] if kind != 'team' else None,
+                           'players': int(counts[code]),
+                           'proj_ffp_total': round(float(sums['proj_ffp'][code]), 2),
+                           'proj_ffp_mean': round(float(sums['proj_ffp'][code] / counts[code]), 2),
+                           'ly_ffp_total': round(float(sums['ly_ffp'][code]), 2),
+                           'contract_value_total': float(sums['contract_value'][code]),
+                           'risky_players': int(sums['risky'][code])}
+                summaries[key] = summary
+                members[code].setflags(write=False)
+            self.members[kind] = dict(zip(keys.tolist(), members))
+            self.summaries[kind] = summaries
+
+    def _key(self, team, pos):
+        if team and pos:
+            return 'team_pos', f'{team.casefold()}\0{pos.casefold()}'
+        if team:
+            return 'team', team.casefold()
+        if pos:
+            return 'pos', pos.casefold()
+        raise ValueError('a group needs a team, a position or both')
+
+    def rows(self, team=None, pos=None):
+        kind, key = self._key(team, pos)
+        return self.members[kind].get(key, np.zeros(0, dtype=np.int64))
+
+    def totals(self, team=None, pos=None):
+        kind, key = self._key(team, pos)
+        return self.summaries[kind].get(key)
+
+    def groups(self, kind, team=None, pos=None):
+        summaries = [summary for summary in self.summaries[kind].values()
+                     if (team is None or (summary['team'] or '').casefold() == team.casefold())
+                     and (pos is None or (summary['pos'] or '').casefold() == pos.casefold())]
+        return sorted(summaries, key=lambda summary: -summary['proj_ffp_total'])
+
+
+class BSTNode:
+    """
+    class BSTNode is one node of a BinarySearchTree, holding the links so the PlayerNode it stores doesn't carry
+    them
+
+    Parameters
+    ----------
+    value: obj
+        the PlayerNode stored at this node
+    player_uuid: str
+        the key the node is sorted by, the value's player_uuid
+    left_child, right_child: BSTNode
+        the subtrees of smaller and larger keys
+    """
+    __slots__ = ('player_uuid', 'value', 'left_child', 'right_child')
+
+    def __init__(self, value):
+        self.player_uuid = value.player_uuid
+        self.value = value
+        self.left_child = None
+        self.right_child = None
+
 
 class BinarySearchTree:
     """
@@ -109,32 +548,32 @@ class BinarySearchTree:
         accessible method used to insert PlayerNode objects into the BST.
          Takes a PlayerNode object from the BST in as an input
     _insert(value, cur_node)
-        hidden method used to insert PlayerNode objects into the BST.
-         Takes two PlayerNode objects from the BST in as input
+        hidden method used to insert BSTNode objects into the BST.
+         Takes two BSTNode objects from the BST in as input
     print_tree()
         accessible method that prints out all the nodes in the tree
     _print_tree(cur_node)
         accessible method that prints out all the nodes in the tree.
-         Takes a PlayerNode object from the BST in as input
+         Takes a BSTNode object from the BST in as input
     height()
         accessible method that returns how many levels there are in the BST data structure
     _height(cur_node, cur_height)
         inaccessible method that returns how many levels there are in the BST data structure.
-         Takes two PlayerNode objects from the BST in as input
+         Takes two BSTNode objects from the BST in as input
     search(value)
         accessible method used to take user input and returns the player data in the BST that the user inputted
     _search(value)
         inaccessible method used to take user input and returns the player data in the BST that the user inputted
-        Takes two PlayerNode objects from the BST in as input
+        Takes two BSTNode objects from the BST in as input
     """
     def __init__(self):
         self.root = None
 
     def insert(self, value):
         if self.root is None:
-            self.root = value
+            self.root = BSTNode(value)
         else:
-            self._insert(value, self.root)
+            self._insert(BSTNode(value), self.root)
 
     def _insert(self, value, cur_node):
         if value.player_uuid < cur_node.player_uuid:
@@ -177,11 +616,11 @@ class BinarySearchTree:
         if self.root is not None:
             return self._search(value, self.root)
         else:
-            return self.value
+            return False
 
     def _search(self, value, cur_node):
         if value == cur_node.player_uuid:
-            return cur_node.get_player_data()
+            return cur_node.value.get_player_data()
         elif value < cur_node.player_uuid and cur_node.left_child is not None:
             return self._search(value, cur_node.left_child)
         elif value > cur_node.player_uuid and cur_node.right_child is not None:
@@ -189,3 +628,347 @@ class BinarySearchTree:
         return False
 
 
+class AVLNode:
+    """
+    class AVLNode is one node of an AVLTree. It holds the tree linkage so the PlayerNode it stores does not need to
+
+    Parameters
+    ----------
+    key: str
+        the player_uuid the node is sorted by
+    value: obj
+        the PlayerNode stored at this node
+    left: AVLNode
+        the subtree of smaller keys
+    right: AVLNode
+        the subtree of larger keys
+    height: int
+        number of levels in the subtree rooted at this node
+    """
+    __slots__ = ('key', 'value', 'left', 'right', 'height')
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.left = None
+        self.right = None
+        self.height = 1
+
+
+def _node_height(node):
+    return node.height if node is not None else 0
+
+
+def _update_height(node):
+    node.height = max(_node_height(node.left), _node_height(node.right)) + 1
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update_height(node)
+    _update_height(pivot)
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update_height(node)
+    _update_height(pivot)
+    return pivot
+
+
+def _rebalance(node):
+    _update_height(node)
+    balance = _node_height(node.left) - _node_height(node.right)
+    if balance > 1:
+        if _node_height(node.left.left) < _node_height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _node_height(node.right.right) < _node_height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+
+class AVLTree:
+    """
+    class AVLTree is a self balancing search tree of PlayerNode objects keyed by player_uuid. It keeps every
+    path within about 1.44 log2(n) levels no matter what order players are inserted in, and every operation
+    walks the tree with a loop instead of recursion so large rosters can't hit the recursion limit.
+    It has the same insert, search, height and print_tree methods as BinarySearchTree
+    Parameters
+    ----------
+    root: AVLNode
+        this represents the root node of the tree
+    Methods
+    -------
+    insert(value)
+        inserts a PlayerNode object into the tree, rebalancing the path it was added on
+    build(values)
+        replaces the contents of the tree with a list of PlayerNode objects, sorting them once and linking
+        them into a perfectly balanced tree instead of inserting them one at a time
+    get(key)
+        returns the PlayerNode with the player_uuid, or None if it isn't in the tree
+    get_many(keys)
+        returns a dictionary of player_uuid to PlayerNode for every one of the keys that is in the tree, found
+        in a single walk down the tree
+    search(value)
+        returns the player data of the player_uuid the user inputted, or False if it isn't in the tree
+    range(low, high)
+        yields the PlayerNode objects with low <= player_uuid < high in order. Either bound can be None
+    prefix(prefix)
+        yields the PlayerNode objects whose player_uuid starts with prefix in order
+    height()
+        returns how many levels there are in the tree
+    print_tree()
+        prints out all the player_uuids in the tree in order
+    """
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return self.range()
+
+    def insert(self, value):
+        key = value.player_uuid
+        path = []
+        cur_node = self.root
+        while cur_node is not None:
+            if key == cur_node.key:
+                print("Value already in tree!")
+                return
+            path.append(cur_node)
+            cur_node = cur_node.left if key < cur_node.key else cur_node.right
+        new_node = AVLNode(key, value)
+        self.size += 1
+        if not path:
+            self.root = new_node
+            return
+        if key < path[-1].key:
+            path[-1].left = new_node
+        else:
+            path[-1].right = new_node
+        # walk back up the path, rebalancing and re-linking each subtree to its parent
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            old_height = node.height
+            subtree = _rebalance(node)
+            if depth == 0:
+                self.root = subtree
+            elif path[depth - 1].left is node:
+                path[depth - 1].left = subtree
+            else:
+                path[depth - 1].right = subtree
+            if subtree is node and node.height == old_height:
+                break
+
+    def build(self, values):
+        start = time.perf_counter()
+        nodes = []
+        for value in sorted(values, key=lambda player: player.player_uuid):
+            if nodes and nodes[-1].key == value.player_uuid:
+                print("Value already in tree!")
+                continue
+            nodes.append(AVLNode(value.player_uuid, value))
+        self.size = len(nodes)
+        self.root = None
+        # each entry is a slice of nodes still to be linked and where its middle node should be attached
+        stack = [(0, len(nodes), None, None)]
+        while stack:
+            low, high, parent, side = stack.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            node = nodes[middle]
+            node.height = (high - low).bit_length()
+            if parent is None:
+                self.root = node
+            elif side == 'left':
+                parent.left = node
+            else:
+                parent.right = node
+            stack.append((low, middle, node, 'left'))
+            stack.append((middle + 1, high, node, 'right'))
+        tree_build_seconds.observe(time.perf_counter() - start)
+        tree_height.set(self.height())
+        tree_size.set(self.size)
+
+    def get(self, key):
+        cur_node = self.root
+        while cur_node is not None:
+            if key == cur_node.key:
+                return cur_node.value
+            cur_node = cur_node.left if key < cur_node.key else cur_node.right
+        return None
+
+    def get_many(self, keys):
+        found = {}
+        keys = sorted(set(keys))
+        # each entry is a subtree and the slice of the sorted keys that can only be in it, so every node is
+        # visited at most once and keys that share a path walk it together
+        stack = [(self.root, 0, len(keys))] if keys and self.root is not None else []
+        while stack:
+            cur_node, low, high = stack.pop()
+            node_key = cur_node.key
+            left_end = bisect.bisect_left(keys, node_key, low, high)
+            right_start = left_end
+            if right_start < high and keys[right_start] == node_key:
+                found[node_key] = cur_node.value
+                right_start += 1
+            if low < left_end and cur_node.left is not None:
+                stack.append((cur_node.left, low, left_end))
+            if right_start < high and cur_node.right is not None:
+                stack.append((cur_node.right, right_start, high))
+        return found
+
+    def search(self, value):
+        cur_node = self.root
+        depth = 0
+        while cur_node is not None:
+            depth += 1
+            if value == cur_node.key:
+                break
+            cur_node = cur_node.left if value < cur_node.key else cur_node.right
+        tree_lookup_depth.observe(depth)
+        if cur_node is None:
+            return False
+        return cur_node.value.get_player_data()
+
+    def range(self, low=None, high=None):
+        stack = []
+        cur_node = self.root
+        # only descend into the parts of the tree that can hold keys >= low
+        while cur_node is not None:
+            if low is None or cur_node.key >= low:
+                stack.append(cur_node)
+                cur_node = cur_node.left
+            else:
+                cur_node = cur_node.right
+        while stack:
+            node = stack.pop()
+            if high is not None and node.key >= high:
+                return
+            yield node.value
+            cur_node = node.right
+            while cur_node is not None:
+                stack.append(cur_node)
+                cur_node = cur_node.left
+
+    def prefix(self, prefix):
+        for value in self.range(low=prefix):
+            if not value.player_uuid.startswith(prefix):
+                return
+            yield value
+
+    def height(self):
+        return _node_height(self.root)
+
+    def print_tree(self):
+        for value in self.range():
+            print(str(value.player_uuid))
+
+
+class NameIndex:
+    """
+    class NameIndex powers the player name suggestions. It is built once from the PlayerNode objects and never
+    changed afterwards, so any number of requests can read it at the same time without locking.
+    A trie answers prefix matches of any word in the name, each trie node keeping the best players below it so
+    a lookup only walks the letters typed. A trigram index answers misspelled names by counting the three letter
+    pieces a name shares with the query
+    Parameters
+    ----------
+    players: list
+        the PlayerNode objects to index
+    limit: int
+        how many players each trie node keeps, the most suggestions a query can return from the trie
+    Methods
+    -------
+    suggest(query, limit, where)
+        returns up to limit (score, PlayerNode) pairs best match first, only of the players where accepts if given
+    """
+    min_similarity = 0.3
+
+    def __init__(self, players, limit=10):
+        self.limit = limit
+        # players are ranked by projected points, so the best known player wins ties
+        self.players = sorted(players, key=lambda player: player.proj_ffp, reverse=True)
+        self.names = [normalize_name(player.name) for player in self.players]
+        self.trie = {}
+        self.postings = {}
+        self.term_ranks = []
+        self.term_trigrams = []
+        for rank, name in enumerate(self.names):
+            tokens = name.split()
+            # every word can start a match, so "mahomes" and "patrick mahomes" both find Patrick Mahomes
+            for start in range(len(tokens)):
+                term = ' '.join(tokens[start:])
+                self._add_to_trie(term, rank)
+                self._add_term(term, rank)
+
+    def _add_term(self, term, rank):
+        grams = trigrams(term)
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(len(self.term_ranks))
+        self.term_ranks.append(rank)
+        self.term_trigrams.append(len(grams))
+
+    def _add_to_trie(self, text, rank):
+        node = self.trie
+        for character in text:
+            node = node.setdefault(character, {})
+            ranks = node.setdefault('', [])
+            if len(ranks) < self.limit and rank not in ranks:
+                ranks.append(rank)
+
+    def _prefix_matches(self, query):
+        node = self.trie
+        for character in query:
+            node = node.get(character)
+            if node is None:
+                return []
+        return node.get('', [])
+
+    def _similar_matches(self, query):
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        best = {}
+        for term, count in shared.items():
+            similarity = count / (len(grams) + self.term_trigrams[term] - count)
+            rank = self.term_ranks[term]
+            if similarity >= self.min_similarity and similarity > best.get(rank, 0):
+                best[rank] = similarity
+        return sorted(((similarity, rank) for rank, similarity in best.items()),
+                      key=lambda match: (-match[0], match[1]))
+
+    def suggest(self, query, limit=None, where=None):
+        limit = self.limit if limit is None else limit
+        query = normalize_name(query)
+        if not query or limit <= 0:
+            return []
+        prefix_ranks = self._prefix_matches(query)
+        if where is not None:
+            if len(prefix_ranks) == self.limit:
+                # the trie only keeps the best players of each prefix, the ones where accepts may be past them
+                prefix_ranks = [rank for rank, name in enumerate(self.names) if ' ' + query in ' ' + name]
+            prefix_ranks = [rank for rank in prefix_ranks if where(self.players[rank])]
+        results = [(1.0, rank) for rank in prefix_ranks[:limit]]
+        if len(results) < limit:
+            found = {rank for _, rank in results}
+            for similarity, rank in self._similar_matches(query):
+                if rank not in found and (where is None or where(self.players[rank])):
+                    results.append((round(similarity, 3), rank))
+                    if len(results) == limit:
+                        break
+        return [(score, self.players[rank]) for score, rank in results]
+
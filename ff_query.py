@@ -0,0 +1,187 @@
+# This module is the query engine behind the risky players page. A query is a set of criteria like
+# "fewer than 12 games played" or "projection spread above 40 points", evaluated as NumPy masks over the
+# PlayerTable columns, and the result of each distinct query is remembered until the data changes.
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# query parameter prefix -> PlayerTable column, spread is the projection deviation relative to the projection
+FIELDS = {
+    'games': 'games_played',
+    'stdev': 'st_dev_proj',
+    'spread': 'spread',
+    'guaranteed': 'percent_guaranteed',
+    'salary': 'contract_value',
+    'proj': 'proj_ffp',
+    'ly': 'ly_ffp'
+}
+OPERATORS = {
+    'lt': np.less,
+    'le': np.less_equal,
+    'gt': np.greater,
+    'ge': np.greater_equal
+}
+# the thresholds the risky players page has always used
+DEFAULT_CRITERIA = (('games', 'lt', 12.0), ('stdev', 'gt', 40.0))
+criterion_pattern = re.compile(r'^(%s)_(%s)$' % ('|'.join(FIELDS), '|'.join(OPERATORS)))
+
+
+class RiskQuery:
+    """
+    class RiskQuery describes which players count as risky. It is immutable and hashable so it can be used as
+    a cache key, and two queries asking the same thing in a different order are equal
+
+    Parameters
+    ----------
+    criteria: tuple
+        (field, operator, value) triples, for example ('games', 'lt', 12.0)
+    match: str
+        'any' if one criterion is enough to make a player risky, 'all' if every criterion has to hold
+    positions: tuple
+        positions the result is limited to, empty for every position
+    """
+    __slots__ = ('criteria', 'match', 'positions')
+
+    def __init__(self, criteria=DEFAULT_CRITERIA, match='any', positions=()):
+        if not criteria:
+            raise ValueError('a query needs at least one criterion')
+        if match not in ('any', 'all'):
+            raise ValueError("match must be 'any' or 'all'")
+        for field, operator, _ in criteria:
+            if field not in FIELDS or operator not in OPERATORS:
+                raise ValueError(f'unknown criterion {field}_{operator}')
+        self.criteria = tuple(sorted(criteria))
+        self.match = match
+        self.positions = tuple(sorted({pos.casefold() for pos in positions}))
+
+    def _key(self):
+        return self.criteria, self.match, self.positions
+
+    def __eq__(self, other):
+        return isinstance(other, RiskQuery) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f'RiskQuery({self.criteria!r}, match={self.match!r}, positions={self.positions!r})'
+
+    def to_args(self):
+        # repr is the shortest text that reads back as the same float, a :g format would round to 6 digits
+        args = {f'{field}_{operator}': str(int(value)) if value.is_integer() else repr(value)
+                for field, operator, value in self.criteria}
+        args['match'] = self.match
+        if self.positions:
+            args['pos'] = ','.join(self.positions)
+        return args
+
+
+def parse_query(args, use_positions=True):
+    """
+    reads a risky player query from request parameters such as games_lt=12&stdev_gt=40&match=any&pos=rb,wr.
+    Every field in FIELDS can be combined with lt, le, gt or ge. Without any criteria the default
+    thresholds are used
+    Parameters
+    ----------
+    args: dict
+        the request parameters
+    use_positions: bool
+        whether the pos parameter limits the query
+
+    Returns
+    -------
+    the RiskQuery
+    """
+    criteria = []
+    for name, value in args.items():
+        found = criterion_pattern.match(name)
+        if found is None:
+            continue
+        try:
+            criteria.append((found.group(1), found.group(2), float(value)))
+        except ValueError:
+            raise ValueError(f'{name} must be a number')
+    positions = [pos for pos in args.get('pos', '').split(',') if pos] if use_positions else ()
+    return RiskQuery(tuple(criteria) or DEFAULT_CRITERIA, args.get('match', 'any'), positions)
+
+
+def has_criteria(args):
+    return any(criterion_pattern.match(name) for name in args)
+
+
+class QueryEngine:
+    """
+    class QueryEngine evaluates RiskQuery objects against one PlayerTable. Each criterion is one vectorized
+    comparison over a column. Results are kept in a least recently used cache bounded by the bytes they take
+    up, and the cache belongs to the table it was built for, so loading new data starts with an empty cache
+
+    Parameters
+    ----------
+    table: PlayerTable
+        the players to query
+    max_bytes: int
+        how much memory the cached results may use
+    Methods
+    -------
+    mask(query)
+        returns a read only boolean array marking the risky players
+    rows(query)
+        returns the row numbers of the risky players, highest projected points first
+    """
+    def __init__(self, table, max_bytes=16 * 1024 * 1024):
+        self.table = table
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        projections = np.asarray(table.proj_ffp, dtype=np.float64)
+        self.columns = {
+            'spread': np.divide(table.st_dev_proj, projections, out=np.zeros(len(table)), where=projections > 0),
+            'pos': np.array([pos.casefold() for pos in table.pos], dtype=str)
+        }
+
+    def column(self, field):
+        name = FIELDS[field]
+        if name not in self.columns:
+            self.columns[name] = np.asarray(getattr(self.table, name), dtype=np.float64)
+        return self.columns[name]
+
+    def _cached(self, key, compute):
+        with self.cache_lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        # computed outside the lock so a slow query doesn't hold up cached ones
+        result = compute()
+        result.setflags(write=False)
+        with self.cache_lock:
+            if key not in self.cache:
+                self.cache[key] = result
+                self.cached_bytes += result.nbytes
+            while self.cached_bytes > self.max_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= evicted.nbytes
+        return result
+
+    def _evaluate(self, query):
+        masks = [OPERATORS[operator](self.column(field), value) for field, operator, value in query.criteria]
+        mask = np.logical_or.reduce(masks) if query.match == 'any' else np.logical_and.reduce(masks)
+        if query.positions:
+            mask &= np.isin(self.columns['pos'], query.positions)
+        return mask
+
+    def mask(self, query):
+        return self._cached(('mask', query), lambda: self._evaluate(query))
+
+    def rows(self, query):
+        def compute():
+            rows = np.flatnonzero(self.mask(query))
+            return rows[np.argsort(-np.asarray(self.table.proj_ffp)[rows], kind='stable')]
+        return self._cached(('rows', query), compute)
@@ -0,0 +1,209 @@
+# This module simulates seasons for every player at once. Each player's season total is drawn from a normal
+# distribution around their projected points, with the spread between the espn and sportsdata.io
+# projections as its standard deviation. Simulations run in chunks of a players x simulations matrix, so
+# memory stays bounded however many seasons are simulated, and the chunks can be spread over processes.
+# Run it with:  python ff_simulate.py --simulations 100000 --workers 4
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# players with a single projection have no spread, so they get at least this fraction of their projection
+MIN_RELATIVE_SPREAD = 0.1
+# bins in each player's histogram of simulated seasons, the percentiles are read from them
+HISTOGRAM_BINS = 1024
+# bytes one chunk of simulated points may take
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class SimulationResult:
+    """
+    class SimulationResult holds what was learned from the simulated seasons of every player
+
+    Parameters
+    ----------
+    simulations: int
+        how many seasons were simulated
+    top_n: int
+        how many players at a position count as finishing in the top
+    mean, std: numpy array
+        the average and standard deviation of each player's simulated points
+    histograms: numpy array
+        players x HISTOGRAM_BINS counts of simulated points
+    bin_width: numpy array
+        the points each histogram bin covers, per player
+    top_counts: numpy array
+        how many simulations each player finished in the top_n of their position
+    Methods
+    -------
+    percentiles(percents)
+        returns a players x percents array of simulated points
+    top_probability()
+        returns each player's chance of finishing in the top_n of their position
+    """
+    def __init__(self, simulations, top_n, mean, std, histograms, bin_width, top_counts):
+        self.simulations = simulations
+        self.top_n = top_n
+        self.mean = mean
+        self.std = std
+        self.histograms = histograms
+        self.bin_width = bin_width
+        self.top_counts = top_counts
+
+    def percentiles(self, percents=DEFAULT_PERCENTILES):
+        cumulative = np.cumsum(self.histograms, axis=1)
+        rows = np.arange(len(cumulative))
+        values = np.empty((len(cumulative), len(percents)))
+        for column, percent in enumerate(percents):
+            target = percent / 100 * self.simulations
+            # first bin whose cumulative count reaches the target, interpolated within the bin
+            bins = np.argmax(cumulative >= target, axis=1)
+            before = np.where(bins > 0, cumulative[rows, bins - 1], 0)
+            in_bin = np.maximum(self.histograms[rows, bins], 1)
+            values[:, column] = (bins + np.clip((target - before) / in_bin, 0, 1)) * self.bin_width
+        return values
+
+    def top_probability(self):
+        return self.top_counts / self.simulations
+
+
+def season_spread(proj_ffp, st_dev_proj):
+    return np.maximum(st_dev_proj, MIN_RELATIVE_SPREAD * np.maximum(proj_ffp, 0))
+
+
+def chunk_sizes(players, simulations, max_chunk_bytes=MAX_CHUNK_BYTES):
+    chunk = max(1, min(simulations, max_chunk_bytes // (8 * max(players, 1))))
+    sizes = [chunk] * (simulations // chunk)
+    if simulations % chunk:
+        sizes.append(simulations % chunk)
+    return sizes
+
+
+# the arrays every chunk needs in a pool worker process, set once per process by _init_worker instead of sent
+# with every chunk. Only the pool's processes use it, a simulation run in this process passes its own inputs so
+# simulations running at the same time in different threads can't see each other's
+_inputs = {}
+
+
+def _init_worker(inputs):
+    _inputs.update(inputs)
+
+
+def _simulate_worker_chunk(size, seed):
+    return _simulate_chunk(size, seed, _inputs)
+
+
+def _simulate_chunk(size, seed, inputs):
+    """
+    simulates one chunk of seasons and reduces it to sums and counts that can be added to other chunks'
+    Parameters
+    ----------
+    size: int
+        number of seasons in the chunk
+    seed: numpy SeedSequence
+        seeds this chunk's generator, so the results don't depend on which process ran it
+    inputs: dict
+        the players' mean, spread, bin_width, position groups and top_n
+
+    Returns
+    -------
+    (sum, sum of squares, histogram counts, top counts) per player
+    """
+    mean, spread, bin_width, groups, top_n = (inputs[name] for name in
+                                              ('mean', 'spread', 'bin_width', 'groups', 'top_n'))
+    rng = np.random.Generator(np.random.PCG64(seed))
+    points = rng.standard_normal((len(mean), size))
+    points *= spread[:, None]
+    points += mean[:, None]
+    np.maximum(points, 0, out=points)
+    total = points.sum(axis=1)
+    squares = np.einsum('ij,ij->i', points, points)
+    bins = np.minimum((points / bin_width[:, None]).astype(np.int64), HISTOGRAM_BINS - 1)
+    bins += (np.arange(len(mean)) * HISTOGRAM_BINS)[:, None]
+    histograms = np.bincount(bins.ravel(), minlength=len(mean) * HISTOGRAM_BINS).reshape(len(mean), -1)
+    top_counts = np.zeros(len(mean), dtype=np.int64)
+    for rows in groups:
+        if len(rows) <= top_n:
+            top_counts[rows] = size
+            continue
+        group_points = points[rows]
+        # the top_n-th best score at the position in each simulated season
+        cutoff = np.partition(group_points, len(rows) - top_n, axis=0)[len(rows) - top_n]
+        top_counts[rows] = (group_points >= cutoff).sum(axis=1)
+    return total, squares, histograms, top_counts
+
+
+def simulate(proj_ffp, st_dev_proj, positions, simulations=10000, top_n=12, seed=0, workers=None,
+             max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    simulates seasons for every player, in chunks that are run in this process or spread over a process pool.
+    The same seed gives the same result no matter how many workers are used
+    Parameters
+    ----------
+    proj_ffp: numpy array
+        each player's projected points
+    st_dev_proj: numpy array
+        the standard deviation of each player's projections
+    positions: list
+        each player's position, players finish in the top against their own position
+    simulations: int
+        number of seasons to simulate
+    top_n: int
+        how many players at a position count as finishing in the top
+    seed: int
+        seed for the random generator
+    workers: int
+        number of processes to use, None to run in this process
+    max_chunk_bytes: int
+        bytes one chunk of simulated points may take
+
+    Returns
+    -------
+    SimulationResult
+    """
+    mean = np.asarray(proj_ffp, dtype=np.float64)
+    spread = season_spread(mean, np.asarray(st_dev_proj, dtype=np.float64))
+    # each histogram covers six standard deviations above the mean, higher draws land in the last bin
+    bin_width = np.maximum(mean + 6 * spread, 1.0) / HISTOGRAM_BINS
+    codes, position_codes = np.unique(np.asarray(positions, dtype=str), return_inverse=True)
+    groups = [np.flatnonzero(position_codes == code) for code in range(len(codes))]
+    inputs = {'mean': mean, 'spread': spread, 'bin_width': bin_width, 'groups': groups, 'top_n': top_n}
+    sizes = chunk_sizes(len(mean), simulations, max_chunk_bytes)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inputs,)) as executor:
+            chunks = list(executor.map(_simulate_worker_chunk, sizes, seeds))
+    else:
+        chunks = [_simulate_chunk(size, chunk_seed, inputs) for size, chunk_seed in zip(sizes, seeds)]
+    total, squares, histograms, top_counts = (sum(parts) for parts in zip(*chunks))
+    simulated_mean = total / simulations
+    simulated_std = np.sqrt(np.maximum(squares / simulations - simulated_mean ** 2, 0))
+    return SimulationResult(simulations, top_n, simulated_mean, simulated_std, histograms, bin_width, top_counts)
+
+
+def simulate_table(table, simulations=10000, top_n=12, seed=0, workers=None):
+    """
+    simulates seasons for the players of a PlayerTable, see simulate
+    """
+    return simulate(table.proj_ffp, table.st_dev_proj, table.pos, simulations, top_n, seed, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the season simulator on synthetic players')
+    parser.add_argument('--players', type=int, default=300, help='number of players')
+    parser.add_argument('--simulations', type=int, default=100000, help='number of seasons to simulate')
+    parser.add_argument('--workers', type=int, help='number of processes, runs in this process if not given')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random generator')
+    args = parser.parse_args()
+    generator = np.random.default_rng(args.seed)
+    synthetic_proj = generator.uniform(20, 400, args.players)
+    synthetic_spread = generator.uniform(0, 60, args.players)
+    synthetic_positions = generator.choice(['QB', 'RB', 'WR', 'TE', 'K', 'D/ST'], args.players)
+    start = time.perf_counter()
+    result = simulate(synthetic_proj, synthetic_spread, synthetic_positions, args.simulations, seed=args.seed,
+                      workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f'simulated {args.simulations} seasons of {args.players} players in {elapsed:.2f}s '
+          f'({args.simulations * args.players / elapsed / 1e6:.1f}M player seasons/s)')
@@ -0,0 +1,344 @@
+# This module stores the blended player data in a compact binary snapshot file. Numbers are kept
+# in columns of fixed width arrays and text is kept once in a shared string table, so a snapshot can
+# be memory mapped and read without parsing the whole file.
+#
+# File layout (every block starts on an 8 byte boundary):
+#   magic b'FFSNAP' | format version (uint16) | header length (uint32) | json header | column blocks
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+MAGIC = b'FFSNAP'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<6sHI')
+ALIGNMENT = 8
+
+# blended record field -> snapshot column, and the kind of column it is stored in. These are every field the
+# PlayerTable, and so the pages and the api, are built from. The rest of a blended record, the other espn
+# columns like RANK and the passing and rushing stats, Annual_Salary and Source_Keys, is only kept in the
+# blended cache and isn't in the snapshot
+STRING_FIELDS = {
+    'player_uuid': None,
+    'name': 'PLAYER',
+    'pos': 'Position',
+    'team': 'Team',
+    'total_salary': 'Total_Salary',
+    'percent_guaranteed': 'Percent_Guaranteed'
+}
+NUMERIC_FIELDS = {
+    'ffp_total': 'FFP_TOTAL',
+    'games_played': 'Games Played'
+}
+MATRIX_FIELDS = {
+    'historic_points': 'Historic Fantasy Points',
+    'projections': 'Fantasy Projections'
+}
+
+
+def atomic_write(path, chunks):
+    """
+    writes a file so that readers only ever see the old or the new contents. The data is written to a
+    temporary file in the same directory, flushed to disk and then renamed over the old file
+    Parameters
+    ----------
+    path: str
+        the file to write
+    chunks: iterable
+        bytes objects that are written one after the other
+
+    Returns
+    -------
+    None
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            for chunk in chunks:
+                temp_file.write(chunk)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _padding(length):
+    return b'\0' * (-length % ALIGNMENT)
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_columns(player_data):
+    """
+    turns the blended player dictionary into snapshot columns, the fields not in STRING_FIELDS, NUMERIC_FIELDS and
+    MATRIX_FIELDS are left out
+    Parameters
+    ----------
+    player_data: dict
+        dictionary of player_uuid to blended player record
+
+    Returns
+    -------
+    columns: dict
+        dictionary of column name to a list of strings or a numpy array, one entry per player
+    """
+    uuids = list(player_data)
+    records = [player_data[uuid] for uuid in uuids]
+    columns = {'player_uuid': uuids}
+    for column, field in STRING_FIELDS.items():
+        if field is not None:
+            columns[column] = [str(record.get(field, '')) for record in records]
+    for column, field in NUMERIC_FIELDS.items():
+        columns[column] = np.array([_as_float(record.get(field)) for record in records], dtype=np.float64)
+    for column, field in MATRIX_FIELDS.items():
+        rows = [record.get(field) if isinstance(record.get(field), list) else [] for record in records]
+        width = max((len(row) for row in rows), default=0)
+        matrix = np.full((len(rows), width), np.nan, dtype=np.float64)
+        for i, row in enumerate(rows):
+            matrix[i, :len(row)] = [_as_float(value) for value in row]
+        columns[column] = matrix
+    return columns
+
+
+def write_snapshot(path, columns, metadata=None):
+    """
+    atomically writes columns to a snapshot file. Numeric columns are stored as raw arrays, string columns
+    are stored as indexes into one string table so repeated values like team and position are kept once
+    Parameters
+    ----------
+    path: str
+        the snapshot file to write
+    columns: dict
+        dictionary of column name to a list of strings or a numpy array, all with the same number of rows
+    metadata: dict
+        optional json serialisable data stored in the header, such as when each source was fetched
+
+    Returns
+    -------
+    None
+    """
+    strings = {}
+    blocks = []
+    header_columns = {}
+    offset = 0
+    rows = None
+
+    def add_block(array):
+        nonlocal offset
+        data = np.ascontiguousarray(array).tobytes()
+        blocks.append(data + _padding(len(data)))
+        start = offset
+        offset += len(data) + len(_padding(len(data)))
+        return start
+
+    for name, values in columns.items():
+        rows = len(values) if rows is None else rows
+        if len(values) != rows:
+            raise ValueError(f'column {name} has {len(values)} rows, expected {rows}')
+        if isinstance(values, np.ndarray):
+            array = np.ascontiguousarray(values)
+            header_columns[name] = {'kind': 'numeric', 'dtype': array.dtype.str, 'shape': list(array.shape),
+                                    'offset': add_block(array)}
+        else:
+            indexes = np.array([strings.setdefault(value, len(strings)) for value in values], dtype=np.uint32)
+            header_columns[name] = {'kind': 'string', 'offset': add_block(indexes)}
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=string_offsets[1:])
+    string_table = {'count': len(encoded), 'offsets': add_block(string_offsets)}
+    string_data = b''.join(encoded)
+    string_table['data'] = offset
+    blocks.append(string_data + _padding(len(string_data)))
+
+    header = json.dumps({'rows': rows or 0, 'columns': header_columns, 'strings': string_table,
+                         'metadata': metadata or {}}).encode('utf-8')
+    header += _padding(PREAMBLE.size + len(header))
+    atomic_write(path, [PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)), header] + blocks)
+
+
+class Snapshot(Mapping):
+    """
+    class Snapshot is a read only view of a snapshot file. The file is memory mapped, so columns are only paged
+    in when they are used and every process that opens the same file shares the same memory. It behaves like the
+    blended player dictionary, mapping player_uuid to a player record, so it can be used anywhere that is used.
+    The records only have the fields the snapshot stores, see STRING_FIELDS, and a missing number of games
+    played reads as 0 like the blend writes it
+
+    Parameters
+    ----------
+    path: str
+        path to the snapshot file
+    Methods
+    -------
+    column(name)
+        returns a numeric column as a read only numpy array, or a string column as a list of strings
+    string(index)
+        returns one entry of the string table
+    close()
+        releases the memory map
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, header_length = PREAMBLE.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a player snapshot')
+            if version != FORMAT_VERSION:
+                raise ValueError(f'{path} is snapshot version {version}, expected {FORMAT_VERSION}')
+            header = json.loads(bytes(self._map[PREAMBLE.size:PREAMBLE.size + header_length]).rstrip(b'\0'))
+        except (struct.error, ValueError):
+            self._map.close()
+            raise
+        self._data_start = PREAMBLE.size + header_length
+        self.rows = header['rows']
+        self.columns = header['columns']
+        self.metadata = header['metadata']
+        self._strings = header['strings']
+        self._string_offsets = self._array(self._strings['offsets'], np.uint64, (self._strings['count'] + 1,))
+        self._string_cache = {}
+        self._index = {uuid: row for row, uuid in enumerate(self.column('player_uuid'))}
+
+    def _array(self, offset, dtype, shape):
+        count = int(np.prod(shape))
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=self._data_start + offset).reshape(shape)
+
+    def string(self, index):
+        value = self._string_cache.get(index)
+        if value is None:
+            start, end = self._string_offsets[index], self._string_offsets[index + 1]
+            data_start = self._data_start + self._strings['data']
+            value = self._map[data_start + int(start):data_start + int(end)].decode('utf-8')
+            self._string_cache[index] = value
+        return value
+
+    def _string_indexes(self, name):
+        return self._array(self.columns[name]['offset'], np.uint32, (self.rows,))
+
+    def column(self, name):
+        column = self.columns[name]
+        if column['kind'] == 'numeric':
+            return self._array(column['offset'], np.dtype(column['dtype']), tuple(column['shape']))
+        return [self.string(int(index)) for index in self._string_indexes(name)]
+
+    def __getitem__(self, player_uuid):
+        row = self._index[player_uuid]
+        record = {}
+        for column, field in STRING_FIELDS.items():
+            if field is not None:
+                record[field] = self.string(int(self._string_indexes(column)[row]))
+        record['FFP_TOTAL'] = float(self.column('ffp_total')[row])
+        games_played = self.column('games_played')[row]
+        record['Games Played'] = 0 if np.isnan(games_played) else int(games_played)
+        historic_points = self.column('historic_points')[row]
+        historic_points = historic_points[~np.isnan(historic_points)].tolist()
+        record['Historic Fantasy Points'] = historic_points if historic_points else 0
+        projections = self.column('projections')[row]
+        projections = projections[~np.isnan(projections)].tolist()
+        if projections:
+            record['Fantasy Projections'] = projections
+        return record
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return self.rows
+
+    def close(self):
+        self._string_offsets = None
+        self._string_cache = {}
+        try:
+            self._map.close()
+        except BufferError:
+            # columns handed out are still using the map, it is released when they are
+            pass
+
+
+def open_snapshot(path):
+    """
+    opens a snapshot file if it exists and is readable
+    Parameters
+    ----------
+    path: str
+        path to the snapshot file
+
+    Returns
+    -------
+    the Snapshot, or None if the file is missing or not a valid snapshot
+    """
+    try:
+        return Snapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, struct.error) as error:
+        print(f'Ignoring unreadable snapshot {path}: {error}')
+        return None
+
+
+def write_player_snapshot(path, player_data, metadata=None):
+    """
+    writes the blended player dictionary to a snapshot file
+    Parameters
+    ----------
+    path: str
+        the snapshot file to write
+    player_data: dict
+        dictionary of player_uuid to blended player record
+    metadata: dict
+        optional json serialisable data stored in the header
+
+    Returns
+    -------
+    None
+    """
+    write_snapshot(path, build_columns(player_data), metadata)
+
+
+def convert_json_cache(json_path, snapshot_path):
+    """
+    converts a json player cache, like Player_Cached_Data.json, into a snapshot file
+    Parameters
+    ----------
+    json_path: str
+        path to the json cache
+    snapshot_path: str
+        path of the snapshot to write
+
+    Returns
+    -------
+    number of players written
+    """
+    with open(json_path, 'r') as json_file:
+        player_data = json.load(json_file)
+    write_player_snapshot(snapshot_path, player_data)
+    return len(player_data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Work with player snapshot files')
+    parser.add_argument('--convert', nargs=2, metavar=('JSON_CACHE', 'SNAPSHOT'), required=True,
+                        help='convert a json player cache into a snapshot')
+    args = parser.parse_args()
+    converted = convert_json_cache(*args.convert)
+    print(f'Wrote {converted} players to {args.convert[1]}')
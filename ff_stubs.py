@@ -0,0 +1,259 @@
+# This module has the stand-ins the tests and benchmarks use instead of the real data sources: a local http
+# server that answers like overthecap and sportsdata.io, and synthetic players with the espn csv, contracts
+# page and sportsdata.io responses made from them, so everything can be run at any size without the network.
+import csv
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import ff_datamgmt as dm
+
+# the columns of the espn projections csv, in order
+ESPN_COLUMNS = ('RANK', 'PLAYER', 'Team', 'Position', 'PASSING_C/A', 'PASSING_YDS', 'PASSING_TD', 'PASSING_INT',
+                'RUSHING_CAR', 'RUSHING_YDS', 'RUSHING_TD', 'RECEIVING_REC', 'RECEIVING_YDS', 'RECEIVING_TD',
+                'RECEIVING_TAR', 'ROST', 'DIFFERENTIAL', 'FFP_TOTAL', 'FFP_AVG', 'ADP', 'ADP_ROUND', 'ROUND')
+SPORTSDATA_POINTS = ('FantasyPointsFanDuel', 'FantasyPointsDraftKings', 'FantasyPointsYahoo',
+                     'FantasyPointsFantasyDraft', 'FantasyPointsPPR')
+FIRST_NAMES = ('Aaron', 'Brandon', 'Chris', 'Derek', 'Elijah', 'Frank', 'Gabriel', 'Hunter', 'Isaiah', 'Jalen',
+               'Kyle', 'Lamar', 'Marcus', 'Nick', 'Odell', 'Patrick', 'Quez', 'Russell', 'Stefon', 'Tyreek')
+LAST_NAMES = ('Adams', 'Brown', 'Cook', 'Davis', 'Evans', 'Fields', 'Green', 'Hill', 'Irving', 'Jones', 'Kelce',
+              'Lockett', 'Mixon', 'Njoku', 'Olave', 'Pitts', 'Quinn', 'Ridley', 'Smith', 'Thomas')
+
+
+class StubServer:
+    """
+    class StubServer serves responses from a local http server on a background thread, standing in for
+    overthecap and sportsdata.io so the pipeline can be timed, and the fetching tested, without the network
+
+    Parameters
+    ----------
+    routes: dict
+        dictionary of url path to (content type, body bytes), the query string is ignored. A route can also be
+        a function that takes the request headers and returns (status, headers dict, body bytes), for responses
+        that change from one request to the next
+    Attributes
+    ----------
+    url: str
+        the base url of the server
+    """
+    def __init__(self, routes):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                route = routes.get(urlsplit(self.path).path, ('text/plain', None))
+                if callable(route):
+                    status, headers, body = route(self.headers)
+                else:
+                    content_type, body = route
+                    status, headers = (200 if body is not None else 404), {'Content-Type': content_type}
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body or b'')))
+                self.end_headers()
+                self.wfile.write(body or b'')
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                # a client that timed out and hung up isn't worth a traceback
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def scripted(statuses, body=b'[]', content_type='application/json'):
+    """
+    makes a route that answers with each status in turn, repeating the last one, with the body on a 200
+    Returns
+    -------
+    route: callable
+        the route to give a StubServer
+    requests_seen: list
+        the headers of every request the route answered
+    """
+    requests_seen = []
+
+    def route(headers):
+        status = statuses[min(len(requests_seen), len(statuses) - 1)]
+        requests_seen.append(dict(headers))
+        return status, {'Content-Type': content_type}, body if status == 200 else b''
+    return route, requests_seen
+
+
+def synthetic_players(size, seed=0):
+    """
+    makes a roster of players for the synthetic data sources, so the espn, overthecap and sportsdata.io data
+    generated from it describe the same players and can be matched like the real sources are
+    Parameters
+    ----------
+    size: int
+        how many players to make
+    seed: int
+        seed for the random generator so runs are repeatable
+
+    Returns
+    -------
+    list of dictionaries with each player's name, position, team nickname, team abbreviation and PlayerID
+    """
+    rng = random.Random(seed)
+    teams = list(dm.TEAM_NAMES.items())
+    positions = ('QB', 'RB', 'WR', 'TE', 'K')
+    players = []
+    for i in range(size):
+        nickname, abbreviation = teams[rng.randrange(len(teams))]
+        players.append({'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{i}',
+                        'pos': positions[rng.randrange(len(positions))], 'team': nickname,
+                        'abbreviation': abbreviation, 'player_id': 10000 + i})
+    return players
+
+
+def synthetic_espn_csv(path, players, seed=0):
+    """
+    writes an espn projections csv for the players, with the same columns and placeholders as the real one
+    Parameters
+    ----------
+    path: str
+        the csv file to write
+    players: list
+        the roster from synthetic_players
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    None
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(ESPN_COLUMNS)
+        for rank, player in enumerate(players, 1):
+            passing = player['pos'] == 'QB'
+            total = round(rng.uniform(20, 400), 1)
+            writer.writerow([rank, player['name'], player['abbreviation'], player['pos'],
+                             f'{rng.randrange(200, 450)}/{rng.randrange(450, 650)}' if passing else '0/0',
+                             rng.randrange(2500, 5000) if passing else '--', rng.randrange(10, 40) if passing else 0,
+                             rng.randrange(5, 15) if passing else 0, rng.randrange(0, 300), rng.randrange(0, 1500),
+                             rng.randrange(0, 15), rng.randrange(0, 120), rng.randrange(0, 1600), rng.randrange(0, 12),
+                             rng.randrange(0, 160), round(rng.uniform(0, 100), 1), round(rng.uniform(-5, 5), 1),
+                             total, round(total / 17, 1), round(rng.uniform(1, 200), 1) if rank < 200 else '#N/A',
+                             round(rng.uniform(1, 20), 1) if rank < 200 else '#N/A', rank // 12 + 1])
+
+
+def synthetic_sportsdata_json(players, seed=0):
+    """
+    makes a sportsdata.io response for the players, usable as both the season stats and the projections
+    Parameters
+    ----------
+    players: list
+        the roster from synthetic_players
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    bytes of the json list
+    """
+    rng = random.Random(seed)
+    rows = []
+    for player in players:
+        row = {'PlayerID': player['player_id'], 'Name': player['name'], 'Position': player['pos'],
+               'Team': player['abbreviation'].upper(), 'Played': rng.randrange(0, 18)}
+        for field in SPORTSDATA_POINTS:
+            row[field] = round(rng.uniform(0, 400), 2)
+        rows.append(row)
+    return json.dumps(rows).encode('utf-8')
+
+
+def synthetic_player_data(players, seed=0):
+    """
+    makes blended player records for the players shaped like the ones player_data_blend makes, with every espn
+    column as a string, the contract strings, and the historic points and projections lists. About a third of
+    the players have no contract, like in the real data
+    Parameters
+    ----------
+    players: list
+        the roster from synthetic_players
+    seed: int
+        seed for the random generator
+
+    Returns
+    -------
+    dictionary of player_uuid to blended player record
+    """
+    rng = random.Random(seed)
+    player_data = {}
+    for rank, player in enumerate(players, start=1):
+        record = {column: str(rng.randrange(0, 2000)) for column in ESPN_COLUMNS}
+        points = round(rng.uniform(20, 400), 1)
+        record.update({'RANK': str(rank), 'PLAYER': player['name'], 'Team': player['abbreviation'],
+                       'Position': player['pos'], 'FFP_TOTAL': points})
+        if rng.random() < 2 / 3:
+            total = rng.randrange(750000, 250000000)
+            record.update({'Total_Salary': f'${total:,}', 'Annual Salary': f'${total // 4:,}',
+                           'Percent_Guaranteed': f'{rng.uniform(0, 100):.1f}%'})
+        else:
+            record.update({'Total_Salary': '0', 'Annual Salary': '0', 'Percent_Guaranteed': '0'})
+        record['Games Played'] = rng.randrange(0, 18)
+        record['Historic Fantasy Points'] = [round(rng.uniform(0, 400), 1) for _ in range(5)]
+        record['Fantasy Projections'] = [points] + [round(rng.uniform(0, 450), 1) for _ in range(5)]
+        uuid = (player['name'].split()[-1] + player['pos'] + player['abbreviation']).casefold()
+        player_data[uuid] = record
+    return player_data
+
+
+def synthetic_contracts_html(size, seed=0, players=None):
+    """
+    makes a page shaped like the overthecap contracts page, with navigation, scripts and a second table around
+    the contracts table so a parser that builds the whole page pays for them like it does on the real site
+    Parameters
+    ----------
+    size: int
+        how many contracts the table has
+    seed: int
+        seed for the random generator so runs are repeatable
+    players: list
+        optional roster from synthetic_players, made from size and seed if not given
+
+    Returns
+    -------
+    str
+    """
+    rng = random.Random(seed)
+    players = synthetic_players(size, seed) if players is None else players
+    teams = list(dm.TEAM_NAMES)
+    navigation = ''.join(f'<li><a href="/team/{team.lower()}">{team}</a></li>' for team in teams)
+    rows = []
+    for player in players:
+        total = rng.randrange(750000, 250000000)
+        years = rng.randrange(1, 6)
+        guaranteed = rng.randrange(0, total)
+        rows.append(f'<tr><td><a href="/player/{player["player_id"]}">{player["name"]}</a></td>'
+                    f'<td>{player["pos"]}</td><td>{player["team"]}</td><td>${total:,}</td>'
+                    f'<td>${total // years:,}</td><td>${guaranteed:,}</td><td>${guaranteed // years:,}</td>'
+                    f'<td>{guaranteed / total:.1%}</td></tr>')
+    sidebar = ''.join(f'<tr><td>{team}</td><td>${rng.randrange(10 ** 8):,}</td></tr>' for team in teams) * 20
+    return ('<!DOCTYPE html><html><head><title>Contracts</title>'
+            + '<script>var tracking = {};</script>' * 50 + '</head><body>'
+            + f'<nav><ul>{navigation}</ul></nav>' * 10
+            + '<table class="sortable controls-table"><thead><tr><th>Player</th><th>Pos.</th><th>Team</th>'
+            '<th>Total Value</th><th>APY</th><th>Total Guaranteed</th><th>Avg. Guarantee/Year</th>'
+            '<th>% Guaranteed</th></tr></thead><tbody>' + ''.join(rows) + '</tbody></table>'
+            + f'<table class="cap-space"><tbody>{sidebar}</tbody></table>'
+            + '<footer>' + '<p>Over the Cap</p>' * 200 + '</footer></body></html>')
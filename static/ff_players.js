@@ -0,0 +1,44 @@
+// Fills the player tables one page at a time from /api/players. Clicking a column heading sorts the
+// table by that column, clicking it again reverses the order.
+const displayColumns = {contract_value: "contract_value_str", percent_guaranteed: "percent_guaranteed_str"};
+
+document.querySelectorAll("table[data-players]").forEach(table => {
+    const moreButton = table.parentElement.querySelector(".table__more");
+    const baseUrl = new URL(table.dataset.players, window.location.origin);
+    let nextCursor = null;
+
+    async function loadPage(reset) {
+        const url = new URL(baseUrl);
+        if (!reset && nextCursor) {
+            url.searchParams.set("cursor", nextCursor);
+        }
+        const response = await fetch(url);
+        const page = await response.json();
+        if (reset) {
+            table.querySelectorAll(".table__row").forEach(row => row.remove());
+        }
+        const columns = [...table.querySelectorAll("th[data-column]")].map(cell => cell.dataset.column);
+        for (const player of page.players) {
+            const row = table.insertRow();
+            row.className = "table__row";
+            for (const column of columns) {
+                const cell = row.insertCell();
+                cell.className = "table__cell";
+                cell.textContent = player[displayColumns[column] || column];
+            }
+        }
+        nextCursor = page.next_cursor;
+        moreButton.hidden = nextCursor === null;
+    }
+
+    table.querySelectorAll("th[data-column]").forEach(heading => {
+        heading.addEventListener("click", () => {
+            const column = heading.dataset.column;
+            const current = baseUrl.searchParams.get("sort");
+            baseUrl.searchParams.set("sort", current === column ? "-" + column : column);
+            loadPage(true);
+        });
+    });
+    moreButton.addEventListener("click", () => loadPage(false));
+    loadPage(true);
+});
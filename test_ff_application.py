@@ -0,0 +1,47 @@
+# Tests of the flask application's routes on synthetic player data.
+# Run them with:  python -m pytest -q
+from types import SimpleNamespace
+
+import pytest
+
+import ff_objects as obj
+from ff_application import create_app, suggest_player
+from ff_stubs import synthetic_player_data, synthetic_players
+
+
+@pytest.fixture
+def client():
+    player_data = synthetic_player_data(synthetic_players(60))
+    app = create_app(load=lambda: player_data, refresh_interval=3600)
+    yield app.test_client()
+    app.extensions['player_data'].stop()
+
+
+def test_suggest_checks_its_limit(client):
+    assert client.get('/search/suggest?q=a&limit=5').status_code == 200
+    assert len(client.get('/search/suggest?q=a&limit=5').get_json()) <= 5
+    for limit in ('0', '26', 'ten', '²', '-1'):
+        response = client.get(f'/search/suggest?q=a&limit={limit}')
+        assert response.status_code == 400, limit
+        assert 'limit' in response.get_json()['error']
+
+
+def test_suggest_player_filters_before_taking_the_best_matches():
+    # more players share the last name than the name index keeps for a prefix
+    players = [obj.PlayerNode(player_uuid=f'smithwrt{i}', name=f'Player{i} Smith', pos='WR', team=f'T{i}',
+                              proj_ffp=300 - i) for i in range(40)]
+    data = SimpleNamespace(name_index=obj.NameIndex(players, limit=25))
+    assert suggest_player(data, 'smith', 'wr', 't35').player_uuid == 'smithwrt35'
+    assert suggest_player(data, 'smiht', 'wr', 't38').player_uuid == 'smithwrt38'
+    assert suggest_player(data, 'smith', 'qb', 't35') is None
+
+
+def test_simulate_filters_positions_and_checks_its_arguments(client):
+    response = client.get('/simulate?simulations=2000&seed=3&top=5&pos=qb,rb')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['simulations'], result['seed'], result['top']) == (2000, 3, 5)
+    assert result['players'] and {player['pos'] for player in result['players']} <= {'QB', 'RB'}
+    assert client.get('/simulate?simulations=2000&seed=3&top=5&pos=qb,rb').get_json() == result
+    for args in ('simulations=0', 'simulations=1000000', 'seed=-1', 'top=abc'):
+        assert client.get(f'/simulate?{args}').status_code == 400, args
@@ -0,0 +1,187 @@
+# Tests of fetching the data sources against local stub servers, so retries, timeouts, revalidation and a
+# source being down can be checked without the network.
+# Run them with:  python -m pytest -q
+import json
+import time
+
+import pytest
+import requests
+
+import ff_datamgmt as dm
+from ff_stubs import (StubServer, scripted, synthetic_contracts_html, synthetic_espn_csv, synthetic_players,
+                      synthetic_sportsdata_json)
+
+SEASON_STATS_PATH = f'/stats/json/PlayerSeasonStats/{dm.STATS_SEASON}REG'
+PROJECTIONS_PATH = f'/projections/json/PlayerSeasonProjectionStats/{dm.PROJECTION_SEASON}'
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # the backoff is recorded instead of slept
+    slept = []
+    monkeypatch.setattr(dm.time, 'sleep', slept.append)
+    return slept
+
+
+@pytest.mark.parametrize('status', [500, 503, 429])
+def test_fetch_retries_server_errors(status, sleeps):
+    route, seen = scripted([status, status, 200], b'{"ok": true}')
+    with StubServer({'/source': route}) as stub:
+        response = dm.fetch(stub.url + '/source', retries=3, backoff=0.5)
+    assert response.json() == {'ok': True}
+    assert len(seen) == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_fetch_gives_up_after_its_retries(sleeps):
+    route, seen = scripted([502])
+    with StubServer({'/source': route}) as stub:
+        with pytest.raises(requests.HTTPError):
+            dm.fetch(stub.url + '/source', retries=2, backoff=0.25)
+    assert len(seen) == 3
+    assert sleeps == [0.25, 0.5]
+
+
+def test_fetch_does_not_retry_client_errors(sleeps):
+    route, seen = scripted([404])
+    with StubServer({'/source': route}) as stub:
+        with pytest.raises(requests.HTTPError):
+            dm.fetch(stub.url + '/source', retries=3)
+    assert len(seen) == 1
+    assert sleeps == []
+
+
+def test_fetch_retries_timeouts():
+    seen = []
+
+    def slow(headers):
+        seen.append(headers)
+        time.sleep(0.5)
+        return 200, {}, b''
+
+    with StubServer({'/slow': slow}) as stub:
+        with pytest.raises(requests.Timeout):
+            dm.fetch(stub.url + '/slow', timeout=0.1, retries=1, backoff=0)
+    assert len(seen) == 2
+
+
+def test_load_source_revalidates_with_a_304(monkeypatch):
+    body = synthetic_sportsdata_json(synthetic_players(5))
+    seen = []
+
+    def season_stats(headers):
+        seen.append(headers.get('If-None-Match'))
+        if headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'Content-Type': 'application/json', 'ETag': '"v1"'}, body
+
+    with StubServer({SEASON_STATS_PATH: season_stats}) as stub:
+        monkeypatch.setattr(dm, 'SPORTSDATAIO_BASE_URL', stub.url)
+        entry, changed = dm.load_source('season_stats', {})
+        assert changed
+        assert entry['etag'] == '"v1"'
+        assert len(entry['data']) == 5
+        revalidated, changed = dm.load_source('season_stats', entry)
+    assert not changed
+    assert revalidated['data'] == entry['data']
+    assert revalidated['fetched_at'] >= entry['fetched_at']
+    assert seen == [None, '"v1"']
+
+
+def stub_sources(monkeypatch, tmp_path, stub):
+    """
+    points every source and cache file of ff_datamgmt at the stub server and tmp_path
+    """
+    for name, value in {'SPORTSDATAIO_BASE_URL': stub.url, 'OVERTHECAP_CONTRACTS_URL': stub.url + '/contracts',
+                        'ESPN_PROJECTIONS_FILE': str(tmp_path / 'espn.csv'),
+                        'PLAYER_CACHE_FILE': str(tmp_path / 'players.json'),
+                        'SOURCE_CACHE_FILE': str(tmp_path / 'sources.json'),
+                        'PLAYER_SNAPSHOT_FILE': str(tmp_path / 'players.ffsnap'), 'MAX_RETRIES': 1}.items():
+        monkeypatch.setattr(dm, name, value)
+
+
+def test_blend_keeps_going_when_a_source_is_down(monkeypatch, tmp_path, sleeps):
+    players = synthetic_players(20)
+    synthetic_espn_csv(tmp_path / 'espn.csv', players)
+    projections, projection_requests = scripted([503])
+    routes = {
+        '/contracts': ('text/html', synthetic_contracts_html(20, players=players).encode('utf-8')),
+        SEASON_STATS_PATH: ('application/json', synthetic_sportsdata_json(players)),
+        PROJECTIONS_PATH: projections
+    }
+    with StubServer(routes) as stub:
+        stub_sources(monkeypatch, tmp_path, stub)
+        blended = dm.player_data_blend()
+        assert len(projection_requests) == 2
+        assert len(blended) == 20
+        assert all(record['Historic Fantasy Points'] != 0 for record in blended.values())
+        assert all(record['Total_Salary'] != '0' for record in blended.values())
+        assert not any('Fantasy Projections' in record for record in blended.values())
+
+        with open(tmp_path / 'sources.json') as source_file:
+            source_cache = json.load(source_file)
+        assert 'attempted_at' in source_cache['projections']
+        # the source that is down isn't tried again until SOURCE_RETRY_INTERVAL has passed, so the snapshot is
+        # served as it is
+        snapshot = dm.load_player_data()
+        assert len(projection_requests) == 2
+        assert len(snapshot) == 20
+        snapshot.close()
+
+
+def test_blend_keeps_the_cached_fields_when_the_sources_have_no_data(monkeypatch, tmp_path, sleeps, capsys):
+    players = synthetic_players(20)
+    synthetic_espn_csv(tmp_path / 'espn.csv', players)
+    routes = {
+        '/contracts': ('text/html', synthetic_contracts_html(20, players=players).encode('utf-8')),
+        SEASON_STATS_PATH: ('application/json', synthetic_sportsdata_json(players)),
+        PROJECTIONS_PATH: ('application/json', synthetic_sportsdata_json(players, seed=1))
+    }
+    with StubServer(routes) as stub:
+        stub_sources(monkeypatch, tmp_path, stub)
+        blended = dm.player_data_blend()
+    with open(tmp_path / 'players.json') as player_file:
+        saved = player_file.read()
+
+    # a fresh checkout has the blended cache but no source cache, and here every remote source is down
+    (tmp_path / 'sources.json').unlink()
+    monkeypatch.setattr(dm.keys, 'SPORTDATAIO_FANTASY_DATA_KEY', 'not-a-real-key')
+    down, _ = scripted([404])
+    with StubServer({'/contracts': down, SEASON_STATS_PATH: down, PROJECTIONS_PATH: down}) as stub:
+        stub_sources(monkeypatch, tmp_path, stub)
+        reblended = dm.player_data_blend()
+    for fields in dm.SOURCE_FIELDS.values():
+        for field in fields:
+            assert all(reblended[player][field] == record[field] for player, record in blended.items())
+    with open(tmp_path / 'players.json') as player_file:
+        assert player_file.read() == saved
+    output = capsys.readouterr().out
+    assert 'Could not refresh projections data' in output
+    assert 'not-a-real-key' not in output
+
+
+def test_the_espn_csv_is_read_again_when_it_changes(monkeypatch, tmp_path, sleeps):
+    players = synthetic_players(10)
+    synthetic_espn_csv(tmp_path / 'espn.csv', players)
+    routes = {
+        '/contracts': ('text/html', synthetic_contracts_html(10, players=players).encode('utf-8')),
+        SEASON_STATS_PATH: ('application/json', synthetic_sportsdata_json(players)),
+        PROJECTIONS_PATH: ('application/json', synthetic_sportsdata_json(players, seed=1))
+    }
+    reads = []
+    read_csv = dm.get_espn_player_projections
+    monkeypatch.setattr(dm, 'get_espn_player_projections', lambda: reads.append(1) or read_csv())
+    with StubServer(routes) as stub:
+        stub_sources(monkeypatch, tmp_path, stub)
+        snapshot = dm.load_player_data()
+        assert len(reads) == 1
+        snapshot = dm.load_player_data()
+        assert len(reads) == 1
+        assert len(snapshot) == 10
+        snapshot.close()
+
+        # a new csv is picked up right away, not only after a time to live
+        synthetic_espn_csv(tmp_path / 'espn.csv', players[:8], seed=1)
+        blended = dm.load_player_data()
+        assert len(reads) == 2
+        assert len(blended) == 8
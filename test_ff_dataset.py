@@ -0,0 +1,75 @@
+# Tests of the PlayerDataset and of the DatasetRefresher keeping it fresh across worker processes.
+# Run them with:  python -m pytest -q
+import os
+
+import ff_history as history_store
+from ff_dataset import DatasetRefresher, PlayerDataset
+from ff_stubs import synthetic_player_data, synthetic_players
+
+
+class Loads:
+    """counts the calls of a load or reload that returns the player data made from a seed"""
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return synthetic_player_data(synthetic_players(12, self.seed), self.seed)
+
+
+def test_only_one_refresher_holds_the_lock(tmp_path):
+    shared_path = str(tmp_path / 'players.ffsnap')
+    leader = DatasetRefresher(Loads(), reload=Loads(), shared_path=shared_path)
+    follower = DatasetRefresher(Loads(), reload=Loads(), shared_path=shared_path)
+    assert leader.is_leader()
+    assert not follower.is_leader()
+    assert leader.is_leader()
+    # the lock is let go when the leader's process exits, which closing its lock file stands in for
+    leader._lock_file.close()
+    assert follower.is_leader()
+
+
+def test_a_follower_only_reloads_when_the_shared_file_changes(tmp_path):
+    shared_path = tmp_path / 'players.ffsnap'
+    reload = Loads()
+    follower = DatasetRefresher(Loads(), reload=reload, shared_path=str(shared_path))
+    assert not follower.reload_if_changed()
+    assert reload.calls == 0
+
+    shared_path.write_bytes(b'version 1')
+    assert follower.reload_if_changed()
+    assert follower.reload_if_changed() is False
+    assert reload.calls == 1
+    first = follower.current
+
+    reload.seed = 1
+    shared_path.write_bytes(b'version 2, a different size')
+    assert follower.reload_if_changed()
+    assert reload.calls == 2
+    assert follower.current.version != first.version
+
+
+def test_a_follower_keeps_its_dataset_when_the_file_is_rewritten_with_the_same_data(tmp_path):
+    shared_path = tmp_path / 'players.ffsnap'
+    shared_path.write_bytes(b'version 1')
+    follower = DatasetRefresher(Loads(), reload=Loads(), shared_path=str(shared_path))
+    follower.refresh()
+    first = follower.current
+    os.utime(shared_path, ns=(0, 0))
+    assert not follower.reload_if_changed()
+    assert follower.current is first
+    assert follower.refreshes == 1
+
+
+def test_datasets_share_one_history_store(monkeypatch, tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    history_store.HistoryStore(path).close()
+    monkeypatch.setattr(history_store, 'HISTORY_DB_FILE', path)
+    player_data = Loads()()
+    first = PlayerDataset(player_data)
+    second = PlayerDataset(player_data)
+    assert first.history is not None
+    assert second.history is first.history
+    assert history_store.open_store(path) is first.history
+    assert history_store.open_store(str(tmp_path / 'missing.sqlite')) is None
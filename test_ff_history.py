@@ -0,0 +1,118 @@
+# Tests of the SQLite history store: storing weeks, syncing only what is missing from a stub sportsdata.io, and
+# the career and recent averages.
+# Run them with:  python -m pytest -q
+import json
+
+import numpy as np
+import pytest
+
+import ff_datamgmt as dm
+import ff_history as history_store
+from ff_stubs import StubServer
+
+PLAYERS = [(1, 'Cooper Kupp', 'WR', 'LAR'), (2, 'Davante Adams', 'WR', 'LV'), (3, 'Josh Allen', 'QB', 'BUF')]
+
+
+def stat_rows(season, week, players=PLAYERS):
+    # the points are made up so every player, season and week is different
+    return [{'PlayerID': player_id, 'Name': name, 'Position': pos, 'Team': team, 'Played': 1 if week else 17,
+             'FantasyPoints': float(player_id * 10 + week),
+             'FantasyPointsPPR': float(player_id * 10 + week + season % 10)}
+            for player_id, name, pos, team in players]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = history_store.HistoryStore(str(tmp_path / 'history.sqlite'))
+    yield store
+    store.close()
+
+
+def test_store_replaces_a_week_and_logs_it(store):
+    assert store.store(2021, 1, stat_rows(2021, 1)) == 3
+    assert store.store(2021, 1, stat_rows(2021, 1, PLAYERS[:2])) == 2
+    assert store.store(2021, 2, stat_rows(2021, 2), complete=False) == 3
+    assert store.store(2021, 0, stat_rows(2021, 0) + [{'Name': 'No Id'}]) == 3
+    assert store.stored_weeks(2021) == {0, 1}
+    assert [week['week'] for week in store.weekly_history(1)] == [1, 2]
+    assert [week['week'] for week in store.weekly_history(3)] == [2]
+    assert store.season_history(3)[0]['games'] == 17
+
+
+def test_find_player_follows_a_player_who_changed_teams(store):
+    store.store(2020, 1, [dict(stat_rows(2020, 1)[1], Team='GB')])
+    store.store(2021, 1, stat_rows(2021, 1))
+    assert store.find_player('Davante Adams', 'WR', 'LV') == 2
+    assert store.find_player('Davante Adams', 'WR', 'GB') == 2
+    assert store.find_player('Cooper Kupp', 'QB', 'LAR') is None
+    # two players with the same name and position are only told apart by their team
+    store.store(2021, 2, [{'PlayerID': 9, 'Name': 'Josh Allen', 'Position': 'QB', 'Team': 'NYJ'}])
+    assert store.find_player('Josh Allen', 'QB', 'NYJ') == 9
+    assert store.find_player('Josh Allen', 'QB', 'MIA') is None
+
+
+def test_sync_only_fetches_what_is_missing(monkeypatch, tmp_path, capsys):
+    requested = []
+
+    def route(path, rows):
+        def respond(headers):
+            requested.append(path)
+            return 200, {'Content-Type': 'application/json'}, json.dumps(rows).encode('utf-8')
+        return respond
+
+    routes = {f'/stats/json/PlayerSeasonStats/{season}REG': route((season, 0), stat_rows(season, 0))
+              for season in (2020, 2021)}
+    routes.update({f'/stats/json/PlayerGameStatsByWeek/{season}REG/{week}': route((season, week),
+                                                                                  stat_rows(season, week))
+                   for season in (2020, 2021) for week in range(1, 19)})
+    # week 2 of 2020 is down
+    del routes['/stats/json/PlayerGameStatsByWeek/2020REG/2']
+    monkeypatch.setattr(dm, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(history_store.keys, 'SPORTDATAIO_FANTASY_DATA_KEY', 'not-a-real-key')
+    store = history_store.HistoryStore(str(tmp_path / 'history.sqlite'))
+    with StubServer(routes) as stub:
+        monkeypatch.setattr(dm, 'SPORTSDATAIO_BASE_URL', stub.url)
+        summary = store.sync([2020, 2021], current_week=3)
+        assert summary == {'fetched': 21, 'skipped': 0, 'failed': 1, 'rows': 63}
+        output = capsys.readouterr().out
+        assert 'Could not fetch 2020 week 2' in output
+        assert 'not-a-real-key' not in output
+        # 2021 is still going, so its totals and its current week are fetched again, and so is the failed week
+        requested.clear()
+        summary = store.sync([2020, 2021], current_week=3)
+        assert sorted(requested) == [(2021, 0), (2021, 3)]
+        assert summary['failed'] == 1
+        # once the season is over everything left is fetched, and nothing after that
+        requested.clear()
+        store.sync([2020, 2021])
+        assert sorted(requested) == [(2021, 0)] + [(2021, week) for week in range(3, 19)]
+        requested.clear()
+        assert store.sync([2020, 2021])['fetched'] == 0
+        assert requested == []
+    store.close()
+
+
+def test_trends_match_the_stored_weeks(store):
+    for week in range(1, 7):
+        store.store(2021, week, stat_rows(2021, week) if week != 4 else
+                    [dict(row, Played=0, FantasyPointsPPR=0.0) for row in stat_rows(2021, week)])
+    store.store(2020, 0, stat_rows(2020, 0))
+    store.store(2021, 0, stat_rows(2021, 0), complete=False)
+    career, recent = store.player_trends(['Cooper Kupp', 'Josh Allen', 'Nobody'], ['WR', 'QB', 'RB'],
+                                         ['LAR', 'BUF', 'NE'], window=3)
+    # only the finished 2020 season counts for the career average, and week 4 wasn't played
+    assert career[:2].tolist() == [10.0, 30.0]
+    # the last three weeks played are 3, 5 and 6
+    assert recent[:2].tolist() == [round(np.mean([14, 16, 17]), 2), round(np.mean([34, 36, 37]), 2)]
+    assert np.isnan(career[2]) and np.isnan(recent[2])
+
+    points = store.rolling_points(1, window=2)
+    assert [(week['week'], week['points']) for week in points] == [(1, 12.0), (2, 13.0), (3, 14.0), (5, 16.0),
+                                                                   (6, 17.0)]
+    assert points[-1]['rolling'] == 16.5
+    with pytest.raises(ValueError):
+        store.rolling_points(1, column='points; DROP TABLE players')
+
+
+def test_open_store_needs_a_synced_file(tmp_path):
+    assert history_store.open_store(str(tmp_path / 'missing.sqlite')) is None
@@ -0,0 +1,93 @@
+# Tests of the per version response cache: compression, ETags and 304s, and its limits.
+# Run them with:  python -m pytest -q
+import gzip
+
+import pytest
+from flask import Flask, request
+
+from ff_application import create_app
+from ff_httpcache import MIN_COMPRESS_SIZE, CachedResponse, ResponseCache
+from ff_stubs import synthetic_player_data, synthetic_players
+
+BODY = b'{"players": [' + b', '.join(b'"player %d"' % i for i in range(200)) + b']}'
+
+
+def respond(entry, **headers):
+    with Flask(__name__).test_request_context(headers=headers):
+        return entry.respond(request)
+
+
+def test_a_response_is_sent_in_the_encoding_the_client_accepts():
+    entry = CachedResponse('v1', BODY, 'application/json')
+    plain = respond(entry)
+    assert plain.get_data() == BODY
+    assert 'Content-Encoding' not in plain.headers
+    compressed = respond(entry, **{'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()) == BODY
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert compressed.headers['Cache-Control'] == 'no-cache'
+    # a strong etag promises the same bytes, so every encoding has its own
+    assert plain.get_etag() != compressed.get_etag()
+    assert plain.get_etag()[0].startswith('v1-')
+
+
+def test_small_bodies_are_not_compressed():
+    entry = CachedResponse('v1', b'[]', 'application/json')
+    assert set(entry.bodies) == {'identity'}
+    assert 'Content-Encoding' not in respond(entry, **{'Accept-Encoding': 'gzip, br'}).headers
+    assert len(BODY) >= MIN_COMPRESS_SIZE
+
+
+def test_a_client_with_the_response_gets_a_304():
+    entry = CachedResponse('v1', BODY, 'application/json')
+    etag = respond(entry, **{'Accept-Encoding': 'gzip'}).headers['ETag']
+    not_modified = respond(entry, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b''
+    assert not_modified.headers['ETag'] == etag
+    # the etag of another encoding of the same body is just as current
+    assert respond(entry, **{'If-None-Match': etag}).status_code == 304
+    other_version = CachedResponse('v2', BODY, 'application/json')
+    assert respond(other_version, **{'If-None-Match': etag}).status_code == 200
+
+
+def test_the_cache_drops_the_least_recently_used_responses():
+    cache = ResponseCache('v1', max_entries=2)
+    for key in 'abc':
+        cache.store(key, BODY, 'application/json')
+        if key == 'b':
+            assert cache.get('a') is not None
+    assert list(cache.entries) == ['a', 'c']
+
+    entry_size = CachedResponse('v1', BODY, 'application/json').size
+    cache = ResponseCache('v1', max_bytes=2 * entry_size)
+    for key in 'abc':
+        cache.store(key, BODY, 'application/json')
+    assert list(cache.entries) == ['b', 'c']
+    assert cache.cached_bytes == 2 * entry_size
+    # a response bigger than the whole cache is served but not kept
+    assert cache.store('big', BODY * 10, 'application/json') is not None
+    assert cache.get('big') is None
+    cache.clear()
+    assert (len(cache.entries), cache.cached_bytes) == (0, 0)
+
+
+@pytest.fixture
+def client():
+    player_data = synthetic_player_data(synthetic_players(60))
+    app = create_app(load=lambda: player_data, refresh_interval=3600)
+    yield app.test_client()
+    app.extensions['player_data'].stop()
+
+
+def test_pages_are_cached_per_data_version(client):
+    first = client.get('/api/players?limit=20', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    assert first.headers['Content-Encoding'] == 'gzip'
+    etag = first.headers['ETag']
+    again = client.get('/api/players?limit=20', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
+    # errors are not cached
+    assert client.get('/api/players?limit=nope').status_code == 400
+    assert client.get('/api/players?limit=20', headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,90 @@
+# Tests of matching players across the data sources: name normalization, the player_uuid keys and the join.
+# Run them with:  python -m pytest -q
+import csv
+
+import ff_datamgmt as dm
+from ff_identity import identity_keys, join_sources, key_rows, normalize_name, player_key
+
+
+def row(name, pos, team, **fields):
+    return dict(fields, Name=name, Position=pos, Team=team)
+
+
+def name_identity(source_row):
+    return identity_keys(source_row['Name'], source_row['Position'], source_row['Team'])
+
+
+def test_normalize_name():
+    assert normalize_name('Amon-Ra St. Brown') == 'amon ra st brown'
+    assert normalize_name("Ja'Marr Chase") == 'jamarr chase'
+    assert normalize_name('Kenneth Walker III') == 'kenneth walker'
+    assert normalize_name('J.Taylor') == 'j taylor'
+
+
+def test_player_key_is_the_second_word_of_the_name():
+    assert player_key('Cooper Kupp', 'WR', 'LAR') == 'kuppwrlar'
+    assert player_key('JuJu Smith-Schuster', 'WR', 'KC') == 'smith-schusterwrkc'
+    assert player_key('Amon-Ra St. Brown', 'WR', 'Det') == 'st.wrdet'
+    assert player_key('Patrick Mahomes II', 'QB', 'KC') == 'mahomesqbkc'
+
+
+def test_key_rows_gives_the_key_to_the_later_of_two_players():
+    keyed = key_rows([row('Marvin Jones Jr.', 'WR', 'Jax'), row('Zay Jones', 'WR', 'Jax')],
+                     'Name', 'Position', 'Team')
+    assert keyed['joneswrjax']['Name'] == 'Zay Jones'
+    assert keyed['marvinjoneswrjax']['Name'] == 'Marvin Jones Jr.'
+
+
+def test_key_rows_keeps_the_last_row_of_a_repeated_player():
+    duplicates = []
+    keyed = key_rows([row('Tua Tagovailoa', 'QB', 'Mia', rank=1), row('Cooper Kupp', 'WR', 'LAR', rank=2),
+                      row('Tua Tagovailoa', 'QB', 'Mia', rank=3)], 'Name', 'Position', 'Team', duplicates)
+    assert len(keyed) == 2
+    assert keyed['tagovailoaqbmia']['rank'] == 3
+    assert duplicates == ['tagovailoaqbmia']
+
+
+def test_espn_keys_match_the_keys_the_application_has_always_used():
+    # the uuids were the second word of the name, position and team, with a later row overwriting an earlier one
+    with open(dm.ESPN_PROJECTIONS_FILE, encoding='utf-8-sig') as espn_file:
+        expected = {}
+        for espn_row in csv.DictReader(espn_file):
+            key = espn_row['PLAYER'].split(' ')[1].casefold() + espn_row['Position'].casefold() \
+                + espn_row['Team'].casefold()
+            expected[key] = espn_row['PLAYER']
+    keyed = dm.get_espn_player_projections()
+    assert {key: keyed[key]['PLAYER'] for key in expected} == expected
+    assert set(keyed) - set(expected) == {'marvinjoneswrjax'}
+
+
+def test_join_sources_matches_aliases_and_initials():
+    base = {'davisewrbuf': row('Gabriel Davis', 'WR', 'Buf'), 'taylorrbind': row('Jonathan Taylor', 'RB', 'Ind'),
+            'kuppwrlar': row('Cooper Kupp', 'WR', 'LAR')}
+    stats = {1: row('Gabe Davis', 'WR', 'BUF'), 2: row('J.Taylor', 'RB', 'IND'), 3: row('Davante Adams', 'WR', 'LV')}
+    matches, [report] = join_sources(base, name_identity, {'stats': (stats, name_identity)})
+    assert matches['stats'] == {'davisewrbuf': 1, 'taylorrbind': 2}
+    assert (report.matched, report.unmatched, report.rows) == (2, 1, 3)
+    assert report.conflicts == []
+
+
+def test_join_sources_reuses_ids_from_an_earlier_source():
+    base = {'taylorrbind': row('Jonathan Taylor', 'RB', 'Ind')}
+
+    def id_identity(source_row):
+        return identity_keys(source_row['Name'], source_row['Position'], source_row['Team'], source_row['PlayerID'])
+
+    projections = {19: row('Jonathan Taylor', 'RB', 'IND', PlayerID=19)}
+    # a name that only the id can match, like after a trade or a name change
+    stats = {19: row('Jonathan Taylor Sr.', 'RB', 'NYJ', PlayerID=19)}
+    matches, _ = join_sources(base, name_identity, {'projections': (projections, id_identity),
+                                                    'stats': (stats, id_identity)})
+    assert matches == {'projections': {'taylorrbind': 19}, 'stats': {'taylorrbind': 19}}
+
+
+def test_join_sources_reports_conflicts():
+    base = {'allenqbbuf': row('Josh Allen', 'QB', 'Buf'), 'allen2qbbuf': row('Josh Allen', 'QB', 'Buf')}
+    source = {1: row('Josh Allen', 'QB', 'BUF')}
+    matches, [report] = join_sources(base, name_identity, {'source': (source, name_identity)})
+    assert list(matches['source'].values()) == [1]
+    assert report.matched == 1 and report.unmatched == 1
+    assert len(report.conflicts) == 1
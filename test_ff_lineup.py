@@ -0,0 +1,62 @@
+# Tests of the lineup optimizer against trying every lineup on small pools of players.
+# Run them with:  python -m pytest -q
+import itertools
+
+import numpy as np
+import pytest
+
+import ff_lineup as lineup_optimizer
+
+SLOTS = {'QB': 1, 'RB': 2, 'WR': 2, 'K': 0}
+
+
+def random_pool(seed, per_position=7):
+    rng = np.random.default_rng(seed)
+    positions = [position for position in ('QB', 'RB', 'WR', 'K') for _ in range(per_position)]
+    scores = rng.uniform(0, 300, len(positions)).round(1)
+    costs = rng.integers(1, 40, len(positions)) * 1000000.0
+    return scores, costs, positions
+
+
+def brute_force(scores, costs, positions, budget, slots, top_k):
+    choices = [itertools.combinations([row for row, pos in enumerate(positions) if pos == position], count)
+               for position, count in slots.items() if count]
+    lineups = []
+    for combination in itertools.product(*choices):
+        rows = [row for group in combination for row in group]
+        cost = costs[rows].sum()
+        if cost <= budget:
+            lineups.append(scores[rows].sum())
+    return sorted(lineups, reverse=True)[:top_k]
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('budget', [30e6, 60e6, 120e6])
+def test_optimize_matches_brute_force(seed, budget):
+    scores, costs, positions = random_pool(seed)
+    lineups = lineup_optimizer.optimize(scores, costs, positions, budget, SLOTS, top_k=5)
+    expected = brute_force(scores, costs, positions, budget, SLOTS, 5)
+    assert [lineup.score for lineup in lineups] == pytest.approx(expected)
+    for lineup in lineups:
+        assert len(set(lineup.rows)) == len(lineup.rows) == 5
+        assert lineup.cost == costs[list(lineup.rows)].sum() <= budget
+        assert lineup.score == pytest.approx(scores[list(lineup.rows)].sum())
+        picked = [positions[row] for row in lineup.rows]
+        assert {position: picked.count(position) for position in SLOTS if SLOTS[position]} == \
+            {position: count for position, count in SLOTS.items() if count}
+
+
+def test_optimize_returns_nothing_when_no_lineup_fits():
+    scores, costs, positions = random_pool(0)
+    assert lineup_optimizer.optimize(scores, costs, positions, 1e6, SLOTS) == []
+    assert lineup_optimizer.optimize(scores, costs, positions, 1e9, {'QB': 8}) == []
+
+
+def test_risk_prefers_players_the_projections_agree_on():
+    positions = ['QB', 'QB']
+    costs = [1.0, 1.0]
+    scores = lineup_optimizer.lineup_scores([200, 210], [2, 30], risk=1.0)
+    assert scores[0] > scores[1]
+    assert lineup_optimizer.optimize(scores, costs, positions, 10, {'QB': 1})[0].rows == (0,)
+    scores = lineup_optimizer.lineup_scores([200, 210], [2, 30])
+    assert lineup_optimizer.optimize(scores, costs, positions, 10, {'QB': 1})[0].rows == (1,)
@@ -0,0 +1,79 @@
+# Tests of the player search trees and indexes built from PlayerNode objects.
+# Run them with:  python -m pytest -q
+import math
+import random
+
+import pytest
+
+import ff_objects as obj
+
+
+def players(count, seed=0):
+    keys = [f'player{i:04d}' for i in range(count)]
+    random.Random(seed).shuffle(keys)
+    return [obj.PlayerNode(player_uuid=key, name=key, pos='WR', team='KC', proj_ffp=i) for i, key in enumerate(keys)]
+
+
+def check_balanced(node):
+    """returns the height of the subtree after checking its order, stored heights and balance"""
+    if node is None:
+        return 0
+    left, right = check_balanced(node.left), check_balanced(node.right)
+    assert node.left is None or node.left.key < node.key
+    assert node.right is None or node.right.key > node.key
+    assert node.height == max(left, right) + 1
+    assert abs(left - right) <= 1
+    return node.height
+
+
+@pytest.mark.parametrize('order', ['random', 'sorted', 'reversed'])
+def test_insert_keeps_the_tree_balanced(order):
+    values = players(500)
+    if order != 'random':
+        values.sort(key=lambda player: player.player_uuid, reverse=order == 'reversed')
+    tree = obj.AVLTree()
+    for value in values:
+        tree.insert(value)
+    assert len(tree) == 500
+    check_balanced(tree.root)
+    assert tree.height() <= 1.44 * math.log2(500 + 2)
+    assert [value.player_uuid for value in tree] == sorted(value.player_uuid for value in values)
+
+
+def test_build_makes_a_balanced_tree_and_skips_repeated_keys(capsys):
+    values = players(1000)
+    tree = obj.AVLTree()
+    tree.build(values + values[:3])
+    assert len(tree) == 1000
+    assert check_balanced(tree.root) == tree.height() == math.ceil(math.log2(1001))
+    assert capsys.readouterr().out.count('Value already in tree!') == 3
+    # inserting after a build keeps it balanced
+    tree.insert(obj.PlayerNode(player_uuid='player9999'))
+    check_balanced(tree.root)
+
+
+def test_lookups():
+    values = players(200)
+    tree = obj.AVLTree()
+    tree.build(values)
+    by_key = {value.player_uuid: value for value in values}
+    assert tree.get('player0042') is by_key['player0042']
+    assert tree.get('missing') is None
+    assert tree.search('player0042') == by_key['player0042'].get_player_data()
+    assert tree.search('missing') is False
+    wanted = ['player0000', 'player0199', 'player0100', 'missing', 'player0100']
+    assert tree.get_many(wanted) == {key: by_key[key] for key in wanted if key in by_key}
+    assert tree.get_many([]) == {}
+    assert obj.AVLTree().get_many(['player0001']) == {}
+
+
+def test_range_and_prefix():
+    tree = obj.AVLTree()
+    tree.build(players(200))
+    assert [value.player_uuid for value in tree.range('player0010', 'player0015')] == \
+        [f'player{i:04d}' for i in range(10, 15)]
+    assert [value.player_uuid for value in tree.range(high='player0002')] == ['player0000', 'player0001']
+    assert [value.player_uuid for value in tree.range('player0198')] == ['player0198', 'player0199']
+    assert [value.player_uuid for value in tree.prefix('player010')] == [f'player{i:04d}' for i in range(100, 110)]
+    assert list(tree.prefix('nobody')) == []
+    assert list(obj.AVLTree()) == []
@@ -0,0 +1,78 @@
+# Tests of the risky player query engine against checking every player one at a time.
+# Run them with:  python -m pytest -q
+import operator
+
+import numpy as np
+import pytest
+
+import ff_objects as obj
+import ff_query as query_engine
+from ff_query import QueryEngine, RiskQuery, parse_query
+from ff_stubs import synthetic_player_data, synthetic_players
+
+COMPARISONS = {'lt': operator.lt, 'le': operator.le, 'gt': operator.gt, 'ge': operator.ge}
+
+
+@pytest.fixture(scope='module')
+def table():
+    return obj.PlayerTable.from_player_data(synthetic_player_data(synthetic_players(200)))
+
+
+def is_risky(player, query):
+    values = {'games': player.games_played, 'stdev': player.st_dev_proj, 'guaranteed': player.percent_guaranteed,
+              'salary': player.contract_value, 'proj': player.proj_ffp, 'ly': player.ly_ffp,
+              'spread': player.st_dev_proj / player.proj_ffp if player.proj_ffp > 0 else 0.0}
+    results = [COMPARISONS[comparison](values[field], value) for field, comparison, value in query.criteria]
+    matched = any(results) if query.match == 'any' else all(results)
+    return matched and (not query.positions or player.pos.casefold() in query.positions)
+
+
+@pytest.mark.parametrize('query', [
+    RiskQuery(),
+    RiskQuery((('games', 'lt', 12.0), ('stdev', 'gt', 40.0)), 'all'),
+    RiskQuery((('spread', 'ge', 0.5),), positions=('RB', 'wr')),
+    RiskQuery((('salary', 'le', 0.0), ('ly', 'gt', 200.0), ('guaranteed', 'lt', 50.0)), 'all'),
+    RiskQuery((('proj', 'gt', 1e9),))
+])
+def test_queries_match_checking_every_player(table, query):
+    engine = QueryEngine(table)
+    players = table.nodes()
+    expected = [player.row for player in players if is_risky(player, query)]
+    assert np.flatnonzero(engine.mask(query)).tolist() == expected
+    rows = engine.rows(query).tolist()
+    assert sorted(rows) == expected
+    assert [players[row].proj_ffp for row in rows] == sorted((players[row].proj_ffp for row in rows), reverse=True)
+
+
+def test_results_are_cached_and_read_only(table):
+    engine = QueryEngine(table)
+    first = engine.mask(RiskQuery((('games', 'lt', 12.0), ('stdev', 'gt', 40.0))))
+    # the same query with its criteria in another order is the same cache entry
+    assert engine.mask(RiskQuery((('stdev', 'gt', 40.0), ('games', 'lt', 12.0)))) is first
+    assert (engine.hits, engine.misses) == (1, 1)
+    with pytest.raises(ValueError):
+        first[0] = True
+
+
+def test_the_cache_is_bounded_by_bytes(table):
+    engine = QueryEngine(table, max_bytes=3 * len(table))
+    for games in range(10):
+        engine.mask(RiskQuery((('games', 'lt', float(games)),)))
+    assert engine.cached_bytes <= 3 * len(table)
+    assert len(engine.cache) == 3
+
+
+def test_parse_query_round_trips_through_to_args():
+    args = {'games_lt': '12', 'spread_ge': '0.123456789', 'match': 'all', 'pos': 'wr,rb', 'page': '2'}
+    query = parse_query(args)
+    assert query == RiskQuery((('games', 'lt', 12.0), ('spread', 'ge', 0.123456789)), 'all', ('rb', 'wr'))
+    assert parse_query(query.to_args()) == query
+    assert query.to_args()['spread_ge'] == '0.123456789'
+    assert parse_query({'pos': 'qb'}, use_positions=False) == RiskQuery()
+    assert query_engine.has_criteria(args) and not query_engine.has_criteria({'pos': 'qb'})
+
+
+@pytest.mark.parametrize('args', [{'games_lt': 'twelve'}, {'match': 'some'}])
+def test_parse_query_rejects_bad_arguments(args):
+    with pytest.raises(ValueError):
+        parse_query(args)
@@ -0,0 +1,78 @@
+# Tests of the season simulator's statistics, its seeding and running it in threads and processes.
+# Run them with:  python -m pytest -q
+import threading
+
+import numpy as np
+import pytest
+
+import ff_simulate as simulator
+
+PROJECTIONS = np.array([300.0, 250.0, 200.0, 180.0, 120.0, 100.0])
+SPREADS = np.array([30.0, 50.0, 0.0, 20.0, 10.0, 25.0])
+POSITIONS = ['QB', 'QB', 'QB', 'WR', 'WR', 'K']
+# the 5th, 50th and 95th percentiles of a standard normal distribution
+NORMAL_PERCENTILES = np.array([-1.6448536, 0.0, 1.6448536])
+
+
+def test_chunk_sizes_cover_every_simulation():
+    assert simulator.chunk_sizes(10, 1000, max_chunk_bytes=8 * 10 * 300) == [300, 300, 300, 100]
+    assert simulator.chunk_sizes(10, 50) == [50]
+    assert sum(simulator.chunk_sizes(7, 12345, max_chunk_bytes=4096)) == 12345
+
+
+def test_simulated_seasons_follow_the_projections():
+    result = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, simulations=40000, top_n=1, seed=3)
+    spread = simulator.season_spread(PROJECTIONS, SPREADS)
+    # the QB with no spread between projections still gets MIN_RELATIVE_SPREAD of their projection
+    assert spread[2] == 20.0
+    assert result.mean == pytest.approx(PROJECTIONS, rel=0.01)
+    assert result.std == pytest.approx(spread, rel=0.03)
+    percentiles = result.percentiles((5, 50, 95))
+    expected = PROJECTIONS[:, None] + spread[:, None] * NORMAL_PERCENTILES[None, :]
+    assert percentiles == pytest.approx(expected, rel=0.02)
+
+
+def test_top_probabilities_add_up_per_position():
+    result = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, simulations=20000, top_n=1, seed=1)
+    top = result.top_probability()
+    assert top[:3].sum() == pytest.approx(1.0)
+    assert top[3:5].sum() == pytest.approx(1.0)
+    # a position with no more players than top_n always finishes in the top
+    assert top[5] == 1.0
+    assert top[0] > top[1] > top[2]
+    assert top[3] > 0.99
+
+
+def test_the_seed_decides_the_result():
+    first = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, simulations=5000, seed=7)
+    again = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, simulations=5000, seed=7)
+    other = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, simulations=5000, seed=8)
+    assert np.array_equal(first.histograms, again.histograms)
+    assert not np.array_equal(first.histograms, other.histograms)
+
+
+def test_workers_give_the_same_result_as_one_process():
+    kwargs = dict(simulations=6000, top_n=1, seed=11, max_chunk_bytes=8 * len(PROJECTIONS) * 1000)
+    in_process = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, **kwargs)
+    pooled = simulator.simulate(PROJECTIONS, SPREADS, POSITIONS, workers=2, **kwargs)
+    assert np.array_equal(in_process.histograms, pooled.histograms)
+    assert np.array_equal(in_process.top_counts, pooled.top_counts)
+    assert np.allclose(in_process.mean, pooled.mean)
+
+
+def test_simulations_in_threads_keep_their_own_players():
+    # two different sets of players simulated at the same time can't see each other's inputs
+    runs = {'small': (PROJECTIONS[:3], SPREADS[:3], POSITIONS[:3]), 'large': (PROJECTIONS * 2, SPREADS, POSITIONS)}
+    expected = {name: simulator.simulate(*run, simulations=3000, seed=5).mean for name, run in runs.items()}
+    results = {}
+
+    def run_many(name):
+        results[name] = [simulator.simulate(*runs[name], simulations=3000, seed=5).mean for _ in range(20)]
+
+    threads = [threading.Thread(target=run_many, args=(name,)) for name in runs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for name, means in results.items():
+        assert all(np.array_equal(mean, expected[name]) for mean in means)
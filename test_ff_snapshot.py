@@ -0,0 +1,65 @@
+# Tests of writing the blended players to a snapshot file and reading them back through the memory map.
+# Run them with:  python -m pytest -q
+import numpy as np
+
+from ff_snapshot import build_columns, open_snapshot, write_player_snapshot
+from ff_stubs import synthetic_player_data, synthetic_players
+
+
+def test_snapshot_round_trip(tmp_path):
+    player_data = synthetic_player_data(synthetic_players(30))
+    path = tmp_path / 'players.ffsnap'
+    write_player_snapshot(path, player_data, {'fetched_at': {'espn': 1.5}})
+    snapshot = open_snapshot(path)
+    assert len(snapshot) == 30
+    assert list(snapshot) == list(player_data)
+    assert snapshot.metadata == {'fetched_at': {'espn': 1.5}}
+    for uuid, record in player_data.items():
+        read = snapshot[uuid]
+        for field in ('PLAYER', 'Position', 'Team', 'Total_Salary', 'Percent_Guaranteed', 'Games Played',
+                      'Historic Fantasy Points', 'Fantasy Projections'):
+            assert read[field] == record[field], field
+        assert read['FFP_TOTAL'] == record['FFP_TOTAL']
+    snapshot.close()
+
+
+def test_snapshot_reads_missing_games_played_as_zero(tmp_path):
+    player_data = synthetic_player_data(synthetic_players(3))
+    uuid = next(iter(player_data))
+    del player_data[uuid]['Games Played']
+    player_data[uuid]['Historic Fantasy Points'] = 0
+    del player_data[uuid]['Fantasy Projections']
+    path = tmp_path / 'players.ffsnap'
+    write_player_snapshot(path, player_data)
+    snapshot = open_snapshot(path)
+    assert np.isnan(snapshot.column('games_played')[0])
+    record = snapshot[uuid]
+    assert record['Games Played'] == 0
+    assert record['Historic Fantasy Points'] == 0
+    assert 'Fantasy Projections' not in record
+    snapshot.close()
+
+
+def test_build_columns_only_keeps_the_snapshot_fields():
+    player_data = synthetic_player_data(synthetic_players(2))
+    columns = build_columns(player_data)
+    assert set(columns) == {'player_uuid', 'name', 'pos', 'team', 'total_salary', 'percent_guaranteed',
+                            'ffp_total', 'games_played', 'historic_points', 'projections'}
+    assert columns['historic_points'].shape == (2, 5)
+
+
+def test_an_unreadable_snapshot_is_ignored(tmp_path, capsys):
+    assert open_snapshot(tmp_path / 'missing.ffsnap') is None
+    path = tmp_path / 'broken.ffsnap'
+    path.write_bytes(b'not a snapshot at all')
+    assert open_snapshot(path) is None
+    assert 'Ignoring unreadable snapshot' in capsys.readouterr().out
+
+
+def test_columns_stay_readable_after_close(tmp_path):
+    path = tmp_path / 'players.ffsnap'
+    write_player_snapshot(path, synthetic_player_data(synthetic_players(5)))
+    snapshot = open_snapshot(path)
+    points = snapshot.column('ffp_total')
+    snapshot.close()
+    assert len(points) == 5